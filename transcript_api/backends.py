@@ -0,0 +1,69 @@
+"""
+This module defines the interface of the search backends and creates the backend of the instance.
+
+Every search of `search.py` goes through the backend in `search.TYPESENSE_CLIENT`, which answers in the
+response shape of Typesense whichever backend it is. Typesense is the default. The in-process engine of
+`local_search.py` serves small deployments and test rigs from a snapshot of the collection, with no cluster.
+
+Classes:
+- SearchBackend: The interface of a search backend.
+- SearchBackendConfigError: Raised when `SEARCH_BACKEND` names no known backend.
+
+Functions:
+- create_backend(name: str) -> SearchBackend: Creates a backend by name.
+
+Dependencies:
+- typesense_gateway.TypesenseGateway: The Typesense backend, imported only when created.
+- local_search.LocalSearchEngine: The in-process backend, imported only when created.
+- settings.SEARCH_BACKEND: The name of the backend of the instance.
+- settings.TYPESENSE_NODES, TYPESENSE_NEAREST_NODE, TYPESENSE_API_KEY: The Typesense nodes and their API key.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from typing import Protocol
+
+# File System Imports
+from settings import SEARCH_BACKEND, TYPESENSE_NODES, TYPESENSE_NEAREST_NODE, TYPESENSE_API_KEY
+
+BACKEND_NAMES = ("typesense", "local")
+
+class SearchBackend(Protocol):
+    """The interface of a search backend, the part of the Typesense API this service uses."""
+
+    def search(self, query_params: dict[str, object], collection: str = "transcripts") -> dict:
+        """Searches a collection, answering as Typesense does."""
+
+    def multi_search(self, search_requests: dict[str, list[dict]], common_params: dict[str, object]) -> dict:
+        """Runs several searches, with the result or error of each one under `results`."""
+
+    def is_healthy(self) -> bool:
+        """Checks the backend is ready to search."""
+
+class SearchBackendConfigError(RuntimeError):
+    """Raised when `SEARCH_BACKEND` names no known backend.
+
+    It is not a `ValueError`, so a deployment error reaches the user as a 500 rather than a 400.
+    """
+
+def create_backend(name: str = SEARCH_BACKEND) -> SearchBackend:
+    """Creates a search backend.
+
+    Args:
+        name (str): `typesense` for the Typesense nodes, or `local` for the in-process engine.
+
+    Returns:
+        SearchBackend: The backend.
+
+    Raises:
+        SearchBackendConfigError: If the name is not a known backend.
+    """
+    # pylint: disable=import-outside-toplevel
+    if name == "typesense":
+        from typesense_gateway import TypesenseGateway
+        return TypesenseGateway(TYPESENSE_NODES, TYPESENSE_API_KEY, TYPESENSE_NEAREST_NODE)
+    if name == "local":
+        from local_search import LocalSearchEngine
+        return LocalSearchEngine()
+    raise SearchBackendConfigError(f"Unknown search backend {name!r}, expected one of {', '.join(BACKEND_NAMES)}")
@@ -0,0 +1,134 @@
+"""
+This module matches a query against every hit of a search at once using NumPy.
+
+The word hashes of every hit are concatenated into one contiguous buffer, with offset arrays marking
+where each sentence and each transcript starts. The query is located over the whole buffer with
+vectorized hash comparisons, and the matches are mapped back to their transcript and sentence with
+`np.searchsorted`. The results are identical to running `matcher.match_sentences` on every hit.
+
+Functions:
+- batch_match_sentences(transcripts: list[NormalizedTranscript], query: str) -> list[list[tuple[int, int]]]:
+  Finds the matching sentences of every transcript in one pass.
+
+Dependencies:
+- numpy: Vectorized comparisons over the concatenated buffers
+- matcher.resolve_spans: Turns the sentences holding a match into the reported snippets
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from typing import TYPE_CHECKING
+
+# Third-Party Imports
+import numpy as np
+
+# File System Imports
+from matcher import resolve_spans
+
+if TYPE_CHECKING:
+    from search import NormalizedTranscript
+
+def word_mask(hashes: np.ndarray, words: list[list[str]], word_bases: np.ndarray, predicate) -> np.ndarray:
+    """Marks every position whose word satisfies the predicate, checking each distinct word once.
+
+    Args:
+        hashes (np.ndarray): The concatenated word hashes of every transcript
+        words (list[list[str]]): The word list of every transcript
+        word_bases (np.ndarray): The index in `hashes` where each transcript starts
+        predicate (Callable[[str], bool]): The check to run on each distinct word
+
+    Returns:
+        np.ndarray: A boolean array with the same length as `hashes`
+    """
+    unique_hashes, first_positions = np.unique(hashes, return_index=True)
+    owners = np.searchsorted(word_bases, first_positions, side="right") - 1
+    bases = word_bases.tolist()
+    accepted = [predicate(words[owner][position - bases[owner]])
+                for owner, position in zip(owners.tolist(), first_positions.tolist())]
+    return np.isin(hashes, unique_hashes[np.array(accepted, dtype=bool)])
+
+def batch_match_sentences(transcripts: list[NormalizedTranscript], query: str) -> list[list[tuple[int, int]]]:
+    """Finds the sentences matching the query in every transcript in one pass.
+
+    Args:
+        transcripts (list[NormalizedTranscript]): The normalized transcripts of the hits
+        query (str): The cleaned, canonical query
+
+    Returns:
+        list[list[tuple[int, int]]]: For every transcript, the index of each matching sentence
+        and whether it spans 1 or 2 sentences
+    """
+    results: list[list[tuple[int, int]]] = [[] for _ in transcripts]
+    if not transcripts:
+        return results
+
+    query_words = query.split(" ")
+    length = len(query_words)
+
+    word_counts = np.array([len(transcript.words) for transcript in transcripts], dtype=np.int64)
+    sentence_counts = np.array([len(transcript.sentences) for transcript in transcripts], dtype=np.int64)
+    word_bases = np.concatenate(([0], np.cumsum(word_counts)[:-1]))
+    sentence_bases = np.concatenate(([0], np.cumsum(sentence_counts)[:-1]))
+
+    hashes = np.concatenate([np.frombuffer(transcript.hashes, dtype=np.int64) for transcript in transcripts])
+    sentence_starts = np.concatenate(
+        [np.frombuffer(transcript.offsets[:-1], dtype=np.int64) + base
+         for transcript, base in zip(transcripts, word_bases.tolist())])
+    words = [transcript.words for transcript in transcripts]
+    if len(hashes) < length:
+        return results
+
+    if length == 1:
+        mask = hashes == hash(query_words[0])
+    else:
+        first, last = query_words[0], query_words[-1]
+        mask = word_mask(hashes, words, word_bases, lambda word: word.endswith(first))[:len(hashes) - length + 1]
+        for shift, middle in enumerate(query_words[1:-1], start=1):
+            mask &= (hashes == hash(middle))[shift:shift + len(mask)]
+        mask &= word_mask(hashes, words, word_bases, lambda word: word.startswith(last))[length - 1:]
+
+    starts = np.flatnonzero(mask)
+    if not starts.size:
+        return results
+
+    owners = np.searchsorted(word_bases, starts, side="right") - 1
+    in_bounds = starts + length - 1 < word_bases[owners] + word_counts[owners]
+    starts, owners = starts[in_bounds], owners[in_bounds]
+
+    first_sentences = np.searchsorted(sentence_starts, starts, side="right") - 1
+    last_sentences = np.searchsorted(sentence_starts, starts + length - 1, side="right") - 1
+    local_sentences = first_sentences - sentence_bases[owners]
+
+    within: list[set[int]] = [set() for _ in transcripts]
+    crossing: list[set[int]] = [set() for _ in transcripts]
+    spans = (last_sentences - first_sentences).tolist()
+    for owner, sentence, span, start in zip(owners.tolist(), local_sentences.tolist(), spans, starts.tolist()):
+        if not phrase_at(words[owner], start - int(word_bases[owner]), query_words):
+            continue
+        if span == 0:
+            within[owner].add(sentence)
+        elif span == 1:
+            crossing[owner].add(sentence)
+
+    for owner, transcript in enumerate(transcripts):
+        if within[owner] or crossing[owner]:
+            results[owner] = resolve_spans(transcript.sentences, within[owner], crossing[owner], length)
+    return results
+
+def phrase_at(words: list[str], start: int, query_words: list[str]) -> bool:
+    """Checks a candidate found by hash against the actual words, guarding against hash collisions.
+
+    Args:
+        words (list[str]): The word list of the transcript
+        start (int): The index of the first word of the candidate
+        query_words (list[str]): The words of the query
+
+    Returns:
+        bool: True if the phrase starts at the index
+    """
+    length = len(query_words)
+    if length == 1:
+        return words[start] == query_words[0]
+    return (words[start].endswith(query_words[0]) and words[start + length - 1].startswith(query_words[-1])
+            and words[start + 1:start + length - 1] == query_words[1:-1])
@@ -0,0 +1,281 @@
+"""
+This module benchmarks the search post-processing hot path offline.
+
+Synthetic Typesense responses are generated from a fixed seed and served by a stub in place of
+`search.TYPESENSE_CLIENT`, so nothing touches the network. Each case is timed over several iterations
+and reports its throughput, p50/p99 latency and peak allocations. The results can be saved as a JSON
+baseline, and later runs compared against it to catch regressions.
+
+Usage:
+    python bench.py [--hits 100] [--sentences 400] [--query-words 1,2,5] [--iterations 20]
+                    [--baseline bench_baseline.json] [--save] [--tolerance 0.25] [--warm]
+
+Functions:
+- synthetic_response(rng: Random, hits: int, sentences: int, query: str) -> dict: Generates a Typesense response.
+- run_benchmarks(hits: int, sentences: int, query_words: list[int], iterations: int, seed: int, warm: bool) -> dict:
+  Times every case and returns the results.
+- compare(results: dict, baseline: dict, tolerance: float) -> list[str]: Lists the cases slower than the baseline.
+
+Dependencies:
+- tracemalloc: Measures the peak allocations of each case
+- search: The post-processing functions being measured
+- settings.MAX_QUERY_WORD_LIMIT: The longest query benchmarked
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from argparse import ArgumentParser
+from collections.abc import Callable
+from json import dump, load
+from logging import getLogger
+from os import path
+from random import Random
+from statistics import mean, quantiles
+from sys import exit as sys_exit
+from time import perf_counter
+from types import SimpleNamespace
+import tracemalloc
+
+# File System Imports
+import search
+from helpers import distribute
+from query import compile_query
+from search import (TRANSCRIPT_CACHE, mark_word, normalize_transcript, process_hit, search_playlist,
+                    search_typesense, sentence_search)
+from settings import MAX_QUERY_WORD_LIMIT, TYPESENSE_SEARCH_PARAMS
+
+VOCABULARY = ("the game is on and we play a round of chess with my friend who likes music more than "
+              "science but history keeps coming back to every story we tell about the old city").split()
+
+def synthetic_sentence(rng: Random) -> str:
+    """Generates a sentence of 5 to 12 words.
+
+    Args:
+        rng (Random): The seeded random generator.
+
+    Returns:
+        str: The sentence, capitalized and punctuated like a transcript line.
+    """
+    words = rng.choices(VOCABULARY, k=rng.randint(5, 12))
+    return " ".join(words).capitalize() + rng.choice((".", ",", "?", ""))
+
+def synthetic_response(rng: Random, hits: int, sentences: int, query: str) -> dict:
+    """Generates a Typesense response whose transcripts hold the query in about one sentence in twenty.
+
+    Args:
+        rng (Random): The seeded random generator.
+        hits (int): The number of hits.
+        sentences (int): The number of sentences per transcript.
+        query (str): The query planted in the transcripts.
+
+    Returns:
+        dict: The response, shaped like the one returned by Typesense.
+    """
+    documents = []
+    for number in range(hits):
+        transcript = [synthetic_sentence(rng) for _ in range(sentences)]
+        for index in rng.sample(range(sentences), k=max(1, sentences // 20)):
+            words = transcript[index].split(" ")
+            position = rng.randint(0, len(words))
+            transcript[index] = " ".join(words[:position] + [query] + words[position:])
+        documents.append({"document": {
+            "id": f"video{number:07d}",
+            "title": f"Video {number}",
+            "channel_id": "channel",
+            "channel_name": "Channel",
+            "duration": sentences * 4,
+            "upload_date": 20240101 - number,
+            "transcript": transcript,
+            "timestamps": [index * 4 for index in range(sentences)],
+        }})
+    return {"found": hits, "hits": documents}
+
+def stub_client(response: dict, shards: int) -> SimpleNamespace:
+    """Builds a stand-in for the Typesense client that serves a fixed response.
+
+    Args:
+        response (dict): The response of a single search.
+        shards (int): The number of playlist shards the hits are split between.
+
+    Returns:
+        SimpleNamespace: An object with the `search` and `multi_search` methods of the Typesense gateway.
+    """
+    shard_of = {f"video_id:[{shard}]": {"found": len(hits), "hits": hits}
+                for shard, hits in enumerate(distribute(response["hits"], shards))}
+
+    return SimpleNamespace(
+        search=lambda query_params, collection="transcripts": response,
+        multi_search=lambda search_requests, common_params: {
+            "results": [shard_of[search_requests["searches"][0]["filter_by"]]]},
+    )
+
+def measure(function: Callable[[], object], iterations: int, items: int, reset: Callable[[], None]) -> dict[str, float]:
+    """Times a case and measures its peak allocations.
+
+    Allocations are measured on a separate run, since tracing slows every allocation down.
+
+    Args:
+        function (Callable[[], object]): The case to run.
+        iterations (int): The number of timed runs.
+        items (int): The number of items processed per run, for the throughput.
+        reset (Callable[[], None]): Called before every run, to clear caches for cold runs.
+
+    Returns:
+        dict[str, float]: The throughput, mean, p50 and p99 in milliseconds, and peak allocations in KiB.
+    """
+    reset()
+    function()  # Warm up imports and compiled patterns
+
+    timings = []
+    for _ in range(iterations):
+        reset()
+        start = perf_counter()
+        function()
+        timings.append(perf_counter() - start)
+
+    reset()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    percentiles = quantiles(timings, n=100, method="inclusive") if len(timings) > 1 else timings * 99
+    return {
+        "iterations": iterations,
+        "throughput_per_second": items / mean(timings),
+        "mean_ms": mean(timings) * 1000,
+        "p50_ms": percentiles[49] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+        "peak_kib": peak / 1024,
+    }
+
+def run_benchmarks(hits: int, sentences: int, query_words: list[int], iterations: int,
+                   seed: int = 0, warm: bool = False) -> dict:
+    """Times every case for every query length.
+
+    Args:
+        hits (int): The number of hits per search.
+        sentences (int): The number of sentences per transcript.
+        query_words (list[int]): The query lengths to benchmark, in words.
+        iterations (int): The number of timed runs per case.
+        seed (int): The seed of the synthetic data.
+        warm (bool): Whether the normalized transcript cache is kept between runs.
+
+    Returns:
+        dict: The configuration and the results of every case.
+    """
+    logger = getLogger("scriptsearch")
+    logger_disabled, logger.disabled = logger.disabled, True
+    reset = (lambda: None) if warm else TRANSCRIPT_CACHE.clear
+    original_client = search.TYPESENSE_CLIENT
+
+    results = {}
+    try:
+        for words in query_words:
+            rng = Random(seed + words)
+            query = " ".join(rng.choices(VOCABULARY, k=words))
+            response = synthetic_response(rng, hits, sentences, query)
+            shards = min(4, hits) or 1
+            search.TYPESENSE_CLIENT = stub_client(response, shards)
+
+            params = {**TYPESENSE_SEARCH_PARAMS, "q": query}
+            searches = {"searches": [{"collection": "transcripts", "q": query, "filter_by": f"video_id:[{shard}]"}
+                                     for shard in range(shards)]}
+            compiled = compile_query(query)
+            cleaned, pattern = compiled.canonical, compiled.pattern
+            first = response["hits"][0]
+            transcript = first["document"]["transcript"]
+            normalized = normalize_transcript(transcript).sentences
+
+            cases = {
+                "search_typesense": (lambda: search_typesense(params), hits),
+                "search_playlist": (lambda: search_playlist(searches, params), hits),
+                "process_hit": (lambda: process_hit(first, cleaned, pattern), 1),
+                "sentence_search": (lambda: list(sentence_search(transcript, normalized, cleaned, pattern)), 1),
+                "mark_word": (lambda: [mark_word(sentence, pattern) for sentence in transcript], len(transcript)),
+            }
+            for name, (function, items) in cases.items():
+                results[f"{name}[{words}w]"] = measure(function, iterations, items, reset)
+    finally:
+        search.TYPESENSE_CLIENT = original_client
+        logger.disabled = logger_disabled
+
+    return {
+        "config": {"hits": hits, "sentences": sentences, "query_words": query_words, "seed": seed, "warm": warm},
+        "results": results,
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Lists the cases whose p50 is slower than the baseline by more than the tolerance.
+
+    Args:
+        results (dict): The results of this run.
+        baseline (dict): The saved baseline.
+        tolerance (float): The allowed slowdown, as a fraction of the baseline p50.
+
+    Returns:
+        list[str]: A description of every regression.
+    """
+    if results["config"] != baseline["config"]:
+        raise ValueError("The baseline was recorded with a different configuration.")
+
+    regressions = []
+    for name, stats in results["results"].items():
+        before = baseline["results"].get(name)
+        if before and stats["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {stats['p50_ms']:.3f}ms vs baseline {before['p50_ms']:.3f}ms")
+    return regressions
+
+def print_results(results: dict) -> None:
+    """Prints the results as a table.
+
+    Args:
+        results (dict): The results of the run.
+    """
+    print(f"{'case':<24}{'per second':>14}{'p50 ms':>12}{'p99 ms':>12}{'peak KiB':>12}")
+    for name, stats in results["results"].items():
+        print(f"{name:<24}{stats['throughput_per_second']:>14.1f}{stats['p50_ms']:>12.3f}"
+              f"{stats['p99_ms']:>12.3f}{stats['peak_kib']:>12.1f}")
+
+def main() -> int:
+    """Runs the benchmarks from the command line.
+
+    Returns:
+        int: The exit code, 1 when a case regressed against the baseline.
+    """
+    parser = ArgumentParser(description="Benchmark the search post-processing hot path offline.")
+    parser.add_argument("--hits", type=int, default=100, help="hits per search")
+    parser.add_argument("--sentences", type=int, default=400, help="sentences per transcript")
+    parser.add_argument("--query-words", default=f"1,2,{MAX_QUERY_WORD_LIMIT}", help="comma separated query lengths")
+    parser.add_argument("--iterations", type=int, default=20, help="timed runs per case")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument("--warm", action="store_true", help="keep the transcript cache between runs")
+    parser.add_argument("--baseline", default="bench_baseline.json", help="path of the baseline JSON")
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown against the baseline")
+    args = parser.parse_args()
+
+    query_words = [int(words) for words in args.query_words.split(",")]
+    if any(not 1 <= words <= MAX_QUERY_WORD_LIMIT for words in query_words):
+        parser.error(f"query lengths must be between 1 and {MAX_QUERY_WORD_LIMIT} words")
+
+    results = run_benchmarks(args.hits, args.sentences, query_words, args.iterations, args.seed, args.warm)
+    print_results(results)
+
+    if args.save:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            dump(results, file, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys_exit(main())
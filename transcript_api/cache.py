@@ -0,0 +1,379 @@
+"""
+This module holds the in-process caches used by the transcript api.
+
+The caches are bounded by an estimate of the bytes they hold rather than by the number of
+entries, because a three hour lecture and a thirty second short should not cost the same.
+
+Classes:
+- LRUCache: Thread-safe least-recently-used cache bounded by bytes with hit/miss counters.
+- CacheBackend: Interface for a cache shared between instances, sitting behind the local result cache.
+- ResultCache: Cache of final search results with a TTL and per-channel invalidation.
+
+Functions:
+- sizeof_strings(strings: Iterable[str]) -> int: Estimate the bytes held by a collection of strings.
+- sizeof_json(value: object) -> int: Estimate the bytes held by a JSON serializable value.
+- result_cache_key(query: str|CompiledQuery, channel_id: str|None, video_ids: list[str]|None, page: int) -> str:
+  Build the result cache key of a search.
+
+Global Variables:
+- RESULT_CACHE: The result cache shared by every request on the instance.
+
+Dependencies:
+- collections.OrderedDict: Keeps the recency order of the cache entries.
+- threading.Lock: Guards the cache against concurrent requests on the same instance.
+- query.compile_query: The canonical form of the query in the cache key.
+- settings: The byte budgets, TTL and ingest grace period of the result cache.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from hashlib import sha1
+from json import dumps
+from sys import getsizeof
+from threading import Lock
+from time import monotonic
+from typing import Protocol
+
+# File System Imports
+from query import CompiledQuery, compile_query
+from settings import RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_INGEST_GRACE_SECONDS
+
+def sizeof_strings(strings: Iterable[str]) -> int:
+    """Estimate the bytes held by a collection of strings.
+
+    Args:
+        strings (Iterable[str]): The strings to measure.
+
+    Returns:
+        int: The approximate number of bytes held by the strings.
+    """
+    return sum(getsizeof(string) for string in strings)
+
+def sizeof_json(value: object) -> int:
+    """Estimate the bytes held by a JSON serializable value.
+
+    Args:
+        value (object): The value to measure.
+
+    Returns:
+        int: The length of the value serialized as JSON.
+    """
+    return len(dumps(value))
+
+def result_cache_key(query: str|CompiledQuery, channel_id: str|None, video_ids: list[str]|None, page: int,
+                     page_size: int|None = None, max_snippets: int|None = None, snippet_format: str = "marked",
+                     approximate_counts: bool = False) -> str:
+    """Build the result cache key of a search.
+
+    The filter comes first so a shared backend can drop every entry of a channel by prefix, and the query is
+    identified by the digest of its canonical form, quoting included.
+
+    Args:
+        query (str|CompiledQuery): The query as sent by the user, or compiled.
+        channel_id (str|None): The channel the search is filtered to.
+        video_ids (list[str]|None): The videos the search is filtered to.
+        page (int): The page of results.
+        page_size (int|None): The number of videos per page, or None for the unpaginated response.
+        max_snippets (int|None): The maximum number of snippets per video, or None for all of them.
+        snippet_format (str): How the matches within each snippet are shown.
+        approximate_counts (bool): Whether the snippet counts may be lower bounds.
+
+    Returns:
+        str: The cache key.
+    """
+    compiled = query if isinstance(query, CompiledQuery) else compile_query(query)
+    if channel_id:
+        search_filter = f"channel:{channel_id}"
+    elif video_ids:
+        ids = sorted(video_ids) if isinstance(video_ids, list) else [str(video_ids)]
+        search_filter = "videos:" + sha1(",".join(ids).encode("utf-8")).hexdigest()
+    else:
+        search_filter = "all"
+    accuracy = ":approximate" if approximate_counts else ""
+    return f"{search_filter}|{page}:{page_size or ''}:{max_snippets or ''}:{snippet_format}{accuracy}|{compiled.key}"
+
+class LRUCache:
+    """Least-recently-used cache bounded by the estimated bytes of its values.
+
+    Args:
+        max_bytes (int): The maximum number of bytes the cache may hold before evicting.
+        sizeof (Callable[[object], int]): Function estimating the bytes held by a value.
+        on_evict (Callable[[Hashable], None]|None): Called with the key of every value evicted to stay
+            within the budget, after the cache is unlocked.
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[object], int] = getsizeof,
+                 on_evict: Callable[[Hashable], None]|None = None) -> None:
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[object, int]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: object = None) -> object:
+        """Get a value from the cache and mark it as recently used.
+
+        Args:
+            key (Hashable): The key of the value.
+            default (object): The value returned when the key is not cached.
+
+        Returns:
+            object: The cached value, or the default if the key is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: object) -> None:
+        """Put a value in the cache, evicting the least recently used values if over budget.
+
+        Values larger than the whole budget are not cached.
+
+        Args:
+            key (Hashable): The key of the value.
+            value (object): The value to cache.
+        """
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        evicted = []
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                evicted_key, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+                evicted.append(evicted_key)
+
+        if self.on_evict is not None:
+            for evicted_key in evicted:
+                self.on_evict(evicted_key)
+
+    def pop(self, key: Hashable) -> object:
+        """Remove a value from the cache.
+
+        Args:
+            key (Hashable): The key of the value.
+
+        Returns:
+            object: The removed value, or None if the key was not cached.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self.current_bytes -= entry[1]
+            return entry[0]
+
+    def clear(self) -> None:
+        """Remove every value from the cache and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict[str, int|float]:
+        """Get the counters of the cache.
+
+        Returns:
+            dict[str, int|float]: The hits, misses, evictions, hit ratio, entries and bytes of the cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+class CacheBackend(Protocol):
+    """Interface for a cache shared between instances, such as Redis or Memcached.
+
+    Keys are the strings built by `result_cache_key`, which start with `channel:<channel_id>|`
+    for searches filtered to a channel.
+    """
+
+    def get(self, key: str) -> object:
+        """Get a value, returning None when it is missing or expired."""
+
+    def set(self, key: str, value: object, ttl: float) -> None:
+        """Set a value that expires after `ttl` seconds."""
+
+    def delete(self, keys: list[str]) -> None:
+        """Delete values by key."""
+
+    def delete_channel(self, channel_id: str) -> None:
+        """Delete every value of searches filtered to the channel."""
+
+class ResultCache:
+    """Cache of final search results with a TTL and per-channel invalidation.
+
+    Results are held in a local LRU cache and, when a backend is set, in a cache shared between instances.
+    Each entry is indexed by the channel it is filtered to and the channels of its hits, so an ingest for a
+    channel only evicts the entries that channel can change. Searches without a filter rely on the TTL.
+
+    Ingested videos reach Typesense some time after the ingest request, so results touching a channel are
+    not cached again until its grace period has passed.
+
+    A key leaves the channel index when its entry is evicted, expires or is invalidated, and a grace period
+    is forgotten once it has passed, so neither outgrows the entries actually cached.
+
+    Args:
+        max_bytes (int): The byte budget of the local cache.
+        ttl (float): The number of seconds a result stays valid.
+        ingest_grace (float): The number of seconds after an ingest during which a channel is not cached.
+        backend (CacheBackend|None): The cache shared between instances.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, ingest_grace: float, backend: CacheBackend|None = None) -> None:
+        self.ttl = ttl
+        self.ingest_grace = ingest_grace
+        self.backend = backend
+        self._local = LRUCache(max_bytes, lambda entry: sizeof_json(entry[1]), self._forget)
+        self._channel_keys: dict[str, set[str]] = {}
+        self._key_channels: dict[str, set[str]] = {}
+        self._ingesting: dict[str, float] = {}
+        self._lock = Lock()
+
+    def get(self, key: str) -> object:
+        """Get the results of a search.
+
+        Args:
+            key (str): The result cache key of the search.
+
+        Returns:
+            object: The cached results, or None if they are missing or expired.
+        """
+        entry = self._local.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > monotonic():
+                return value
+            self._local.pop(key)
+            self._forget(key)
+
+        if self.backend is not None:
+            return self.backend.get(key)
+        return None
+
+    def put(self, key: str, value: list[dict]|dict[str, object], channel_id: str|None = None) -> None:
+        """Cache the results of a search.
+
+        Args:
+            key (str): The result cache key of the search.
+            value (list[dict]|dict[str, object]): The search results, or a payload holding them under `hits`.
+            channel_id (str|None): The channel the search is filtered to.
+        """
+        hits = value["hits"] if isinstance(value, dict) else value
+        channels = {hit["channel_id"] for hit in hits if hit.get("channel_id")}
+        if channel_id:
+            channels.add(channel_id)
+
+        now = monotonic()
+        with self._lock:
+            self._prune_ingesting(now)
+            if any(channel in self._ingesting for channel in channels):
+                return
+
+        self._local.put(key, (now + self.ttl, value))
+        with self._lock:
+            # Indexed once cached, so an entry evicted in between, or never cached, leaves nothing behind
+            if key not in self._local:
+                return
+            if any(channel in self._ingesting for channel in channels):
+                self._local.pop(key)
+                return
+            for channel in channels:
+                self._channel_keys.setdefault(channel, set()).add(key)
+            self._key_channels.setdefault(key, set()).update(channels)
+        if self.backend is not None:
+            self.backend.set(key, value, self.ttl)
+
+    def invalidate_channel(self, channel_id: str) -> None:
+        """Evict every cached search a new ingest for the channel can change.
+
+        Args:
+            channel_id (str): The channel being ingested.
+        """
+        with self._lock:
+            keys = self._channel_keys.pop(channel_id, set())
+            for key in keys:
+                self._unindex(key)
+            now = monotonic()
+            self._prune_ingesting(now)
+            self._ingesting[channel_id] = now + self.ingest_grace
+
+        for key in keys:
+            self._local.pop(key)
+        if self.backend is not None:
+            self.backend.delete(list(keys))
+            self.backend.delete_channel(channel_id)
+
+    def clear(self) -> None:
+        """Remove every locally cached search."""
+        with self._lock:
+            self._channel_keys.clear()
+            self._key_channels.clear()
+            self._ingesting.clear()
+        self._local.clear()
+
+    def _forget(self, key: Hashable) -> None:
+        """Removes a key that left the local cache from the channel index, unless it has been cached again."""
+        with self._lock:
+            if key not in self._local:
+                self._unindex(key)
+
+    def _unindex(self, key: Hashable) -> None:
+        """Removes a key from the sets of its channels, dropping the sets left empty. Called with the lock held."""
+        for channel in self._key_channels.pop(key, ()):
+            keys = self._channel_keys.get(channel)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._channel_keys[channel]
+
+    def _prune_ingesting(self, now: float) -> None:
+        """Forgets the grace periods that have passed. Called with the lock held."""
+        for channel in [channel for channel, deadline in self._ingesting.items() if deadline <= now]:
+            del self._ingesting[channel]
+
+    def stats(self) -> dict[str, int|float]:
+        """Get the counters of the local cache.
+
+        Returns:
+            dict[str, int|float]: The hits, misses, evictions, hit ratio, entries and bytes of the cache.
+        """
+        return self._local.stats()
+
+RESULT_CACHE = ResultCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_INGEST_GRACE_SECONDS)
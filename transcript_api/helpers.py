@@ -3,6 +3,8 @@ This script holds helper functions for our cloud function.
 These functions are meant to be imported into other files.
 
 Functions:
+- distribute(items: list, n: int) -> list[list]: Distribute items into n groups.
+- shard_count(video_ids: list[str]) -> int: Pick the number of concurrent shards for a playlist search.
 - debug(message: str) -> None: Print a debug message.
 
 Global Variables:
@@ -11,6 +13,7 @@ Global Variables:
 Dependencies:
 - logging: Provides logging functionality.
 - settings.DEBUG_FLAG: Flag indicating whether debug messages should be printed.
+- settings.PLAYLIST_VIDEOS_PER_SHARD, PLAYLIST_MAX_SHARDS, TYPESENSE_MAX_FILTER_LENGTH: Playlist shard sizing.
 
 Note:
 Ensure that the settings module is properly configured before using this module.
@@ -18,9 +21,10 @@ Ensure that the settings module is properly configured before using this module.
 
 # Standard Library Imports
 from logging import DEBUG, getLogger, StreamHandler, Formatter
+from math import ceil
 
 # File System Imports
-from settings import DEBUG_FLAG
+from settings import DEBUG_FLAG, PLAYLIST_VIDEOS_PER_SHARD, PLAYLIST_MAX_SHARDS, TYPESENSE_MAX_FILTER_LENGTH
 
 LOGGER_CONSOLE = None
 
@@ -46,6 +50,22 @@ def distribute(items: list, n: int) -> list[list]:
 
     return sublists
 
+def shard_count(video_ids: list[str]) -> int:
+    """Pick the number of concurrent shards for a playlist search.
+
+    Larger playlists get more shards so each Typesense request stays small, and long filter strings are
+    split further so no shard goes over the filter length limit.
+
+    Args:
+        video_ids (list[str]): The videos the search is filtered to.
+
+    Returns:
+        int: The number of shards, between 1 and the number of videos.
+    """
+    filter_length = sum(len(video_id) + 1 for video_id in video_ids)
+    shards = max(ceil(len(video_ids) / PLAYLIST_VIDEOS_PER_SHARD), ceil(filter_length / TYPESENSE_MAX_FILTER_LENGTH))
+    return max(1, min(shards, PLAYLIST_MAX_SHARDS, len(video_ids)))
+
 def debug(message: str) -> None:
     """Print a debug message.
 
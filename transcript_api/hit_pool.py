@@ -0,0 +1,226 @@
+"""
+This module processes the hits of large searches across a pool of worker processes.
+
+Matching and marking the hits is pure Python, so a large playlist search keeps a single core busy no matter
+how many the instance has. With `HIT_POOL_WORKERS` set, searches with at least `HIT_POOL_MIN_HITS` hits are
+split into one chunk per worker, each processed by `search.process_hits` in its own process, and the
+results are put back together in the order of the hits. Smaller searches stay in process, where the
+transcript cache makes them cheaper than the round trip to a worker.
+
+Transcripts are sent to the workers in the layout of the transcript store: the UTF-8 text of every sentence
+concatenated, the byte offset where each one ends, and the timestamps, packed. That pickles as three byte
+strings per hit, rather than a dict holding a list of sentences.
+
+Functions:
+- init_hit_pool(workers: int|None) -> None: Starts the worker processes and waits for them to be ready.
+- pool_enabled(hits: int) -> bool: Checks whether a number of hits is processed by the pool.
+- process_hits_in_pool(hits: list[dict], query: str, query_pattern: Pattern, max_snippets: int|None, snippet_format: str,
+  approximate_counts: bool, counts: list[tuple[int, bool]]|None) -> list[list[dict[str, str|int]]]|None:
+  Processes hits across the worker processes, or returns None if they failed.
+- encode_transcript(transcript: list[str], timestamps: list[int]) -> tuple[bytes, bytes, bytes]: Packs a transcript.
+- decode_transcript(encoded: tuple[bytes, bytes, bytes]) -> tuple[list[str], array]: Unpacks a transcript.
+
+Global Variables:
+- HIT_POOL: The worker processes, or None until started.
+
+Dependencies:
+- concurrent.futures.ProcessPoolExecutor: The worker processes, started with `spawn` so they do not inherit
+  the threads of the instance, and imported only when the pool starts.
+- search: Processes each chunk in the workers, imported there on first use.
+- settings.HIT_POOL_WORKERS, HIT_POOL_MIN_HITS: The number of workers and the smallest search sent to them.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from array import array
+from concurrent.futures import BrokenExecutor
+from re import compile, Pattern
+from threading import Lock
+from typing import TYPE_CHECKING
+
+# File System Imports
+from helpers import debug
+from metrics import span
+from settings import HIT_POOL_WORKERS, HIT_POOL_MIN_HITS
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+HIT_POOL: ProcessPoolExecutor|None = None
+_WORKERS = 0
+_IN_WORKER = False
+_BROKEN = False
+_POOL_LOCK = Lock()
+
+def _init_worker() -> None:
+    """Marks the process as a worker, so the searches it processes never use a pool of their own."""
+    global _IN_WORKER  # pylint: disable=global-statement
+    _IN_WORKER = True
+    import search # pylint: disable=import-outside-toplevel,unused-import
+
+def _ready() -> bool:
+    return True
+
+def init_hit_pool(workers: int|None = None) -> None:
+    """Starts the worker processes, if enabled, and waits until each one has imported the search module.
+
+    Args:
+        workers (int|None): The number of worker processes, `HIT_POOL_WORKERS` if None.
+    """
+    global HIT_POOL, _WORKERS  # pylint: disable=global-statement
+    workers = HIT_POOL_WORKERS if workers is None else workers
+    if HIT_POOL is not None or workers <= 0 or _IN_WORKER or _BROKEN:
+        return
+
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    with _POOL_LOCK:
+        if HIT_POOL is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=_init_worker)
+            try:
+                for future in [pool.submit(_ready) for _ in range(workers)]:
+                    future.result()
+            except Exception as e: # pylint: disable=broad-except
+                _disable(pool, e)
+                return
+            HIT_POOL, _WORKERS = pool, workers
+            debug(f"Started {workers} hit processing workers")
+
+def _disable(pool: ProcessPoolExecutor, error: Exception) -> None:
+    """Shuts down a pool that failed, so every search is processed in process from now on."""
+    global HIT_POOL, _BROKEN  # pylint: disable=global-statement
+    debug(f"Hit processing workers failed, processing hits in process: {error}")
+    pool.shutdown(wait=False, cancel_futures=True)
+    HIT_POOL, _BROKEN = None, True
+
+def pool_enabled(hits: int) -> bool:
+    """Checks whether a number of hits is processed by the pool.
+
+    Args:
+        hits (int): The number of hits.
+
+    Returns:
+        bool: True if the pool is enabled and working, and the hits are at least `HIT_POOL_MIN_HITS`.
+    """
+    return HIT_POOL_WORKERS > 0 and hits >= HIT_POOL_MIN_HITS and not _IN_WORKER and not _BROKEN
+
+def encode_transcript(transcript: list[str], timestamps: list[int]) -> tuple[bytes, bytes, bytes]:
+    """Packs a transcript for a worker.
+
+    Args:
+        transcript (list[str]): The sentences.
+        timestamps (list[int]): The timestamp of each sentence.
+
+    Returns:
+        tuple[bytes, bytes, bytes]: The UTF-8 text of the sentences, their end offsets as int64, and
+        the timestamps as int32.
+    """
+    encoded = [sentence.encode("utf-8") for sentence in transcript]
+    ends, end = array("q"), 0
+    for sentence in encoded:
+        end += len(sentence)
+        ends.append(end)
+    return b"".join(encoded), ends.tobytes(), array("i", timestamps).tobytes()
+
+def decode_transcript(encoded: tuple[bytes, bytes, bytes]) -> tuple[list[str], array]:
+    """Unpacks a transcript packed by `encode_transcript`.
+
+    Args:
+        encoded (tuple[bytes, bytes, bytes]): The packed transcript.
+
+    Returns:
+        tuple[list[str], array]: The sentences and their timestamps.
+    """
+    blob, ends_bytes, timestamps_bytes = encoded
+    ends = array("q")
+    ends.frombytes(ends_bytes)
+    timestamps = array("i")
+    timestamps.frombytes(timestamps_bytes)
+
+    sentences, start = [], 0
+    for end in ends:
+        sentences.append(blob[start:end].decode("utf-8"))
+        start = end
+    return sentences, timestamps
+
+def _process_chunk(chunk: list[tuple[str, int|None, tuple[bytes, bytes, bytes]]], query: str, pattern: str, flags: int,
+                   max_snippets: int|None, snippet_format: str,
+                   approximate_counts: bool) -> tuple[list[list[dict[str, str|int]]], list[tuple[int, bool]]]:
+    """Processes a chunk of hits in a worker.
+
+    Args:
+        chunk (list[tuple[str, int|None, tuple[bytes, bytes, bytes]]]): The id, upload date and packed
+            transcript of each hit.
+        query (str): The query without quotes.
+        pattern (str): The source of the query pattern.
+        flags (int): The flags of the query pattern.
+        max_snippets (int|None): The best snippets kept per hit, all of them if None.
+        snippet_format (str): How the matches within each snippet are shown.
+        approximate_counts (bool): Whether scanning a hit can stop once enough complete snippets are found.
+
+    Returns:
+        tuple[list[list[dict[str, str|int]]], list[tuple[int, bool]]]: The marked snippets of each hit, in
+        order, and the number of snippets each one matched with whether that number is exact.
+    """
+    from search import process_hits # pylint: disable=import-outside-toplevel
+
+    hits = []
+    for video_id, upload_date, encoded in chunk:
+        transcript, timestamps = decode_transcript(encoded)
+        hits.append({"document": {"id": video_id, "upload_date": upload_date,
+                                  "transcript": transcript, "timestamps": timestamps}})
+    counts: list[tuple[int, bool]] = []
+    results = process_hits(hits, query, compile(pattern, flags), max_snippets, snippet_format, approximate_counts, counts)
+    return results, counts
+
+def process_hits_in_pool(hits: list[dict], query: str, query_pattern: Pattern, max_snippets: int|None = None,
+                         snippet_format: str = "marked", approximate_counts: bool = False,
+                         counts: list[tuple[int, bool]]|None = None) -> list[list[dict[str, str|int]]]|None:
+    """Processes hits across the worker processes, one chunk per worker.
+
+    Args:
+        hits (list[dict]): The hits returned by Typesense, with their transcripts.
+        query (str): The query without quotes.
+        query_pattern (Pattern): The query as a regex pattern.
+        max_snippets (int|None): The best snippets kept per hit, all of them if None.
+        snippet_format (str): How the matches within each snippet are shown.
+        approximate_counts (bool): Whether scanning a hit can stop once enough complete snippets are found.
+        counts (list[tuple[int, bool]]|None): Filled with the number of snippets each hit matched, and whether
+            that number is exact, unless the workers failed.
+
+    Returns:
+        list[list[dict[str, str|int]]]|None: The marked snippets of each hit, in the order of the hits,
+        or None if the workers failed and the hits have to be processed in process.
+    """
+    init_hit_pool()
+    pool = HIT_POOL
+    if pool is None:
+        return None
+
+    with span("hit_pool"):
+        encoded = [(hit["document"]["id"], hit["document"].get("upload_date"),
+                    encode_transcript(hit["document"]["transcript"], hit["document"]["timestamps"]))
+                   if isinstance(hit["document"], dict) else None for hit in hits]
+        valid = [index for index, item in enumerate(encoded) if item is not None]
+
+        chunk_size = -(-len(valid) // _WORKERS) or 1
+        results: list[list[dict[str, str|int]]] = [[] for _ in hits]
+        hit_counts: list[tuple[int, bool]] = [(0, True) for _ in hits]
+        try:
+            futures = [pool.submit(_process_chunk, [encoded[index] for index in valid[start:start + chunk_size]],
+                                   query, query_pattern.pattern, query_pattern.flags, max_snippets,
+                                   snippet_format, approximate_counts)
+                       for start in range(0, len(valid), chunk_size)]
+            chunk_results = [result for future in futures for result in zip(*future.result())]
+        except BrokenExecutor as e:
+            _disable(pool, e)
+            return None
+
+        for index, (matches, count) in zip(valid, chunk_results):
+            results[index], hit_counts[index] = matches, count
+    if counts is not None:
+        counts.extend(hit_counts)
+    return results
@@ -0,0 +1,104 @@
+"""
+This module remembers which videos of each channel have already been published for ingest.
+
+Each channel has a small JSON file in the state directory, holding the sorted ids of every video
+published. Looking up the unseen videos of a submission is a
+binary search per video. Resubmitting a channel then publishes only its new videos, and the newest videos
+extracted first are enough to tell whether the rest of the channel has to be walked at all.
+
+The directory is local to the instance, so it is best mounted from a shared volume. An instance without
+the state of a channel publishes all of its videos, as before.
+
+Classes:
+- IngestState: The published videos of every channel.
+
+Global Variables:
+- INGEST_STATE: The state at settings.INGEST_STATE_PATH, or None when no state is kept.
+
+Dependencies:
+- bisect: Looks up video ids in the sorted seen-set.
+- settings.INGEST_STATE_PATH: The directory of the state.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from bisect import bisect_left
+from json import dump, load
+from os import makedirs, path as os_path, replace
+from threading import Lock
+
+# File System Imports
+from settings import INGEST_STATE_PATH
+
+class IngestState:
+    """The published videos of every channel, kept in a directory.
+
+    Args:
+        directory (str): The directory of the state, created on the first update.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._channels: dict[str, dict[str, object]] = {}
+        self._lock = Lock()
+
+    def unseen(self, channel_id: str, video_ids: list[str]) -> list[str]:
+        """Filters video IDs down to those never published for a channel.
+
+        Args:
+            channel_id (str): The channel ID.
+            video_ids (list[str]): The video IDs, in any order.
+
+        Returns:
+            list[str]: The unseen video IDs, in the given order.
+        """
+        seen = self._channel(channel_id)["seen"]
+        unseen = []
+        for video_id in video_ids:
+            index = bisect_left(seen, video_id)
+            if index == len(seen) or seen[index] != video_id:
+                unseen.append(video_id)
+        return unseen
+
+    def mark(self, channel_id: str, video_ids: list[str]) -> None:
+        """Records videos of a channel as published.
+
+        Args:
+            channel_id (str): The channel ID.
+            video_ids (list[str]): The video IDs.
+        """
+        if not video_ids:
+            return
+        with self._lock:
+            channel = self._channel(channel_id)
+            updated = {"seen": sorted(set(channel["seen"]).union(video_ids))}
+            makedirs(self.directory, exist_ok=True)
+            temporary = self._file(channel_id) + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as state_file:
+                dump(updated, state_file)
+            replace(temporary, self._file(channel_id))
+            self._channels[channel_id] = updated
+
+    def _channel(self, channel_id: str) -> dict[str, object]:
+        """Gets the state of a channel, reading it on first use.
+
+        Args:
+            channel_id (str): The channel ID.
+
+        Returns:
+            dict[str, object]: The sorted `seen` video IDs of the channel.
+        """
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = {"seen": []}
+            if os_path.exists(self._file(channel_id)):
+                with open(self._file(channel_id), encoding="utf-8") as state_file:
+                    channel = load(state_file)
+            self._channels[channel_id] = channel
+        return channel
+
+    def _file(self, channel_id: str) -> str:
+        return os_path.join(self.directory, f"{os_path.basename(channel_id)}.json")
+
+INGEST_STATE: IngestState|None = IngestState(INGEST_STATE_PATH) if INGEST_STATE_PATH else None
@@ -0,0 +1,292 @@
+"""
+This module is an in-process search engine over a snapshot of the transcripts collection, used in place of
+Typesense by small deployments and test rigs.
+
+The snapshot is the `TranscriptDoc` JSON that `go-upsert-typesense` imports, as exported from the collection:
+a file of documents, either an array or one document per line, or a directory of such files. It is loaded
+on the first search.
+
+Documents are numbered newest first, so every posting list is already in `upload_date:desc` order and a
+search never sorts. Each word of the transcripts maps to the numbers of the documents holding it, stored as
+the gaps between them in variable-byte encoding, which fits most gaps in a single byte. Posting lists are
+decoded when searched, and kept decoded in an LRU cache. Filters on `id`, `video_id` and `channel_id` are
+resolved through maps from each value to its documents.
+
+The engine answers the part of the Typesense search API this service uses, with the same response shape:
+- `q`: Every word has to match, as with `drop_tokens_threshold: 0`, and match exactly, as with `prefix: false`
+  and no typos. Quotes are ignored, exact phrases being left to the matcher. `*` matches every document.
+- `filter_by`: `field:value` or `field:[value, ...]` clauses on `id`, `video_id` and `channel_id`, joined by `&&`.
+- `sort_by`: `upload_date:desc`, the default, or `upload_date:asc`.
+- `page`, `per_page` (or `limit`), `include_fields` and `exclude_fields`.
+
+Classes:
+- LocalSearchEngine: The in-process search engine.
+
+Functions:
+- encode_postings(numbers: Iterable[int]) -> bytes: Encodes ascending document numbers as variable-byte gaps.
+- decode_postings(data: bytes) -> array: Decodes a posting list.
+
+Dependencies:
+- cache.LRUCache: The cache of decoded posting lists.
+- query.canonical_tokens: Splits queries and transcripts into words, as the rest of the service does.
+- transcript_store.load_documents: Reads the TranscriptDoc JSON files.
+- settings.LOCAL_SEARCH_SNAPSHOT, LOCAL_SEARCH_CACHE_MAX_BYTES: The snapshot and the size of the cache.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from array import array
+from collections.abc import Iterable
+from os import listdir, path as os_path
+from threading import Lock
+from time import perf_counter
+
+# File System Imports
+from cache import LRUCache
+from query import canonical_tokens
+from settings import LOCAL_SEARCH_SNAPSHOT, LOCAL_SEARCH_CACHE_MAX_BYTES
+from transcript_store import load_documents
+
+FILTER_FIELDS = ("id", "video_id", "channel_id")
+SORT_ORDERS = ("upload_date:desc", "upload_date:asc")
+
+def encode_postings(numbers: Iterable[int]) -> bytes:
+    """Encodes ascending document numbers as the gaps between them, 7 bits per byte.
+
+    Every byte but the last of a gap has its high bit set.
+
+    Args:
+        numbers (Iterable[int]): The document numbers, in ascending order.
+
+    Returns:
+        bytes: The encoded posting list.
+    """
+    encoded = bytearray()
+    previous = 0
+    for number in numbers:
+        gap, previous = number - previous, number
+        while gap >= 0x80:
+            encoded.append(gap & 0x7F | 0x80)
+            gap >>= 7
+        encoded.append(gap)
+    return bytes(encoded)
+
+def decode_postings(data: bytes) -> array:
+    """Decodes a posting list encoded by `encode_postings`.
+
+    Args:
+        data (bytes): The encoded posting list.
+
+    Returns:
+        array: The document numbers, in ascending order.
+    """
+    numbers = array("I")
+    number = value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            number += value
+            numbers.append(number)
+            value = shift = 0
+    return numbers
+
+class LocalSearchEngine:
+    """The in-process search engine, answering with the Typesense response shape.
+
+    Nothing is read until the first search, unless documents are loaded directly.
+
+    Args:
+        snapshot (str): The snapshot file, or a directory of snapshot files.
+        cache_bytes (int): The byte budget of the decoded posting lists.
+    """
+
+    def __init__(self, snapshot: str = LOCAL_SEARCH_SNAPSHOT, cache_bytes: int = LOCAL_SEARCH_CACHE_MAX_BYTES) -> None:
+        self.snapshot = snapshot
+        self._documents: list[dict]|None = None
+        self._fields: dict[str, dict[str, array]] = {field: {} for field in FILTER_FIELDS}
+        self._postings: dict[str, bytes] = {}
+        self._decoded = LRUCache(cache_bytes)
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        self._open()
+        return len(self._documents)
+
+    def load(self, documents: Iterable[dict]) -> int:
+        """Indexes documents, replacing everything indexed before.
+
+        Args:
+            documents (Iterable[dict]): The TranscriptDoc documents. A document appearing twice is indexed
+                as it last appears.
+
+        Returns:
+            int: The number of documents indexed.
+        """
+        with self._lock:
+            return self._index(documents)
+
+    def search(self, query_params: dict[str, object], collection: str = "transcripts") -> dict:
+        """Searches the documents.
+
+        Args:
+            query_params (dict[str, object]): The search parameters, as sent to Typesense.
+            collection (str): The collection to search, which has to be `transcripts`.
+
+        Returns:
+            dict: The response, shaped like the response of Typesense.
+
+        Raises:
+            ValueError: If the collection, filter or sort order is not supported.
+        """
+        start = perf_counter()
+        self._open()
+        if collection != "transcripts":
+            raise ValueError(f"Collection `{collection}` not found.")
+        sort_by = str(query_params.get("sort_by") or SORT_ORDERS[0])
+        if sort_by not in SORT_ORDERS:
+            raise ValueError(f"Sorting by `{sort_by}` is not supported.")
+
+        allowed = self._filter(str(query_params.get("filter_by") or ""))
+        numbers = self._match(str(query_params.get("q") or "*"), allowed)
+        if sort_by == "upload_date:asc":
+            numbers.reverse()
+
+        page = int(query_params.get("page") or 1)
+        per_page = int(query_params.get("per_page") or query_params.get("limit") or 10)
+        include = {field.strip() for field in str(query_params.get("include_fields") or "").split(",") if field.strip()}
+        exclude = {field.strip() for field in str(query_params.get("exclude_fields") or "").split(",") if field.strip()}
+
+        hits = [{"document": {field: value for field, value in self._documents[number].items()
+                              if (not include or field in include) and field not in exclude}}
+                for number in numbers[(page - 1) * per_page:page * per_page]]
+        return {
+            "found": len(numbers),
+            "out_of": len(self._documents),
+            "page": page,
+            "hits": hits,
+            "search_time_ms": int((perf_counter() - start) * 1000),
+        }
+
+    def multi_search(self, search_requests: dict[str, list[dict]], common_params: dict[str, object]) -> dict:
+        """Runs several searches, each failing on its own as in Typesense.
+
+        Args:
+            search_requests (dict[str, list[dict]]): The searches, under `searches`.
+            common_params (dict[str, object]): The parameters shared by every search, overridden by its own.
+
+        Returns:
+            dict: The result of each search, or its `error`, under `results`.
+        """
+        results = []
+        for search_request in search_requests["searches"]:
+            params = {**common_params, **search_request}
+            collection = str(params.pop("collection", "transcripts"))
+            try:
+                results.append(self.search(params, collection))
+            except ValueError as e:
+                results.append({"error": str(e), "code": 400})
+        return {"results": results}
+
+    def is_healthy(self) -> bool:
+        """Loads the snapshot, if not loaded yet.
+
+        Returns:
+            bool: True once the documents are loaded.
+        """
+        self._open()
+        return True
+
+    def _open(self) -> None:
+        """Loads the snapshot on first use."""
+        if self._documents is not None:
+            return
+        with self._lock:
+            if self._documents is not None:
+                return
+            paths = [self.snapshot]
+            if os_path.isdir(self.snapshot):
+                paths = [os_path.join(self.snapshot, name) for name in sorted(listdir(self.snapshot))
+                         if name.endswith((".json", ".jsonl"))]
+            self._index(document for snapshot_path in paths if snapshot_path for document in load_documents(snapshot_path))
+
+    def _index(self, documents: Iterable[dict]) -> int:
+        """Builds the index of documents, with the lock held."""
+        latest = {document["id"]: document for document in documents}
+        ordered = sorted(latest.values(), key=lambda document: document.get("upload_date") or 0, reverse=True)
+
+        fields: dict[str, dict[str, array]] = {field: {} for field in FILTER_FIELDS}
+        postings: dict[str, list[int]] = {}
+        for number, document in enumerate(ordered):
+            for field in FILTER_FIELDS:
+                value = document.get(field, document["id"] if field == "video_id" else None)
+                if value is not None:
+                    fields[field].setdefault(str(value), array("I")).append(number)
+            for word in set(canonical_tokens(" ".join(document.get("transcript", [])))):
+                postings.setdefault(word, []).append(number)
+
+        self._fields = fields
+        self._postings = {word: encode_postings(numbers) for word, numbers in postings.items()}
+        self._decoded.clear()
+        self._documents = ordered
+        return len(ordered)
+
+    def _match(self, query: str, allowed: set[int]|None) -> list[int]:
+        """Finds the documents holding every word of a query.
+
+        Args:
+            query (str): The query, or `*` for every document.
+            allowed (set[int]|None): The documents passing the filter, or None if there is no filter.
+
+        Returns:
+            list[int]: The matching document numbers, in ascending order.
+        """
+        words = canonical_tokens(query)
+        if not words:
+            return sorted(allowed) if allowed is not None else list(range(len(self._documents)))
+        if any(word not in self._postings for word in words):
+            return []
+
+        lists = sorted((self._posting_list(word) for word in set(words)), key=len)
+        numbers = [number for number in lists[0] if allowed is None or number in allowed]
+        for numbers_with_word in lists[1:]:
+            if not numbers:
+                break
+            present = set(numbers_with_word)
+            numbers = [number for number in numbers if number in present]
+        return numbers
+
+    def _posting_list(self, word: str) -> array:
+        """Gets the decoded posting list of a word, decoding it on a cache miss."""
+        numbers = self._decoded.get(word)
+        if numbers is None:
+            numbers = decode_postings(self._postings[word])
+            self._decoded.put(word, numbers)
+        return numbers
+
+    def _filter(self, filter_by: str) -> set[int]|None:
+        """Finds the documents passing a filter.
+
+        Args:
+            filter_by (str): The `filter_by` parameter.
+
+        Returns:
+            set[int]|None: The document numbers passing every clause, or None if there is no filter.
+        """
+        allowed = None
+        for clause in filter_by.split("&&"):
+            if not clause.strip():
+                continue
+            field, _, value = clause.partition(":")
+            field, value = field.strip(), value.strip().lstrip("=").strip()
+            if field not in self._fields:
+                raise ValueError(f"Could not find a filter field named `{field}` in the schema.")
+
+            values = value[1:-1].split(",") if value.startswith("[") and value.endswith("]") else [value]
+            numbers = set()
+            for item in values:
+                numbers.update(self._fields[field].get(item.strip().strip("'\"`"), ()))
+            allowed = numbers if allowed is None else allowed & numbers
+        return allowed
@@ -15,18 +15,74 @@ Dependencies:
 - flask
 - settings
 - helpers
+- cache
+- pagination
+- phrase_index (through search, only when settings.PHRASE_INDEX_PATH is set)
+- query
+- singleflight
+- metrics
+- typesense_gateway (imported on the first request, only with the Typesense backend)
+- backends
+- hit_pool
 - scrape
+- scrape_jobs
 - search
 
 Usage:
 The function can be deployed as an HTTP Cloud Function and accessed via HTTP requests. 
 It accepts JSON payloads with optional parameters such as 
 `channel_id`, `video_ids`, and `query` for searching, or `url` for scraping.
+
+Searches can be paginated with `page`, `page_size` and `max_snippets` (the number of snippets per video, the
+best ones being kept), or with the `next_cursor` of the previous page sent back as `cursor`. Capped results
+hold the `snippet_count` of each video, which may stop short, with `snippet_count_exact` false, when
+`"approximate_counts": true` is sent, trading the ranking of the snippets for speed. Sending `snippet_format` as
+`offsets` or `indexed` returns the character offsets of the matches instead of snippets marked with `<mark>`
+tags, leaving the marking to the client (see `pagination`).
+
+Several searches can be sent at once as `{"searches": [{"query": ..., "channel_id" | "video_ids": ...}, ...]}`,
+each item also accepting the pagination fields. They are served with a single Typesense request, and the
+response holds one entry under `results` per search, in order, each with its own `status`: 200 with the
+same fields as a single search, or 400/408 with an `error`.
+
+Searches can be streamed as newline delimited JSON by sending `"stream": true` or an
+`Accept: application/x-ndjson` header. Each hit is sent on its own line as soon as it is processed,
+followed by a summary record holding `status`, `time` and `MAX_QUERY_WORD_LIMIT`.
+
+Sending `"timings": true` adds a `timings` block to the response, with the count and total milliseconds of
+every phase of the request. The phase durations are also kept as histograms, served in the Prometheus text
+format on the `/metrics` path.
+
+With `SEARCH_BACKEND=local`, searches are answered by an in-process engine over the snapshot at
+`LOCAL_SEARCH_SNAPSHOT` instead of Typesense (see `local_search`), with the same responses.
+
+Identical searches arriving while one is in flight wait for it and share its result, rather than each
+searching Typesense. Streamed searches are not coalesced.
+
+Scraping a large channel can take tens of seconds, so sending `"async": true` with the `url` queues a scrape
+job instead and returns it under `job` straight away. Its `status` (queued, running, done or failed) and result
+are served on the `/jobs/<job_id>` path by the instance that accepted it.
+
+Many URLs can be ingested at once by sending them as a `urls` list. Duplicates are dropped once the URLs
+are in canonical form, playlists and channels are extracted concurrently, and their videos are published
+together. The response holds a summary of each URL under `urls`, and every video published under `video_ids`.
+
+With the phrase index set up, a multi-word query only searches the videos of a playlist that contain the
+exact phrase, and the hits of any search that do not are dropped before their transcripts are fetched.
+
+With the ingest state kept, a resubmitted channel only publishes the videos it never published before.
+Sending `"full": true` publishes every video of the channel again.
+
+The scrape module, along with YT-DLP and the Google Cloud libraries it uses, is only imported for scrape
+requests. With `WARM_UP_ON_START` set, `warm_up` runs when the instance starts, so the first request does not
+pay for creating the Typesense connection or compiling the URL regexes.
 """
 
 from __future__ import annotations
 
 # Standard Library Imports
+from collections.abc import Iterator
+from json import dumps
 from time import perf_counter
 from requests.exceptions import ReadTimeout
 
@@ -35,10 +91,18 @@ import functions_framework
 from flask import jsonify, Request, Response
 
 # File-System Imports
-from settings import API_RESPONSE_HEADERS, TYPESENSE_SEARCH_PARAMS, TYPESENSE_SEARCH_REQUESTS, MAX_QUERY_WORD_LIMIT 
-from helpers import debug, distribute
-from scrape import process_url
-from search import search_typesense, search_playlist
+from settings import (API_RESPONSE_HEADERS, TYPESENSE_SEARCH_PARAMS, TYPESENSE_SEARCH_REQUESTS, MAX_QUERY_WORD_LIMIT,
+                      MAX_PAGE_SIZE, MAX_BATCH_SEARCHES, MAX_BULK_URLS, STREAM_CHUNK_SIZE, WARM_UP_ON_START,
+                      SEARCH_BACKEND)
+from cache import RESULT_CACHE, result_cache_key
+from helpers import debug, distribute, shard_count
+from hit_pool import init_hit_pool
+from metrics import PROMETHEUS_CONTENT_TYPE, Timings, record, render_metrics, span, start_request
+from pagination import Pagination, parse_pagination
+from query import CompiledQuery, compile_query
+from singleflight import SEARCH_FLIGHTS
+import search
+from search import PHRASE_INDEX, search_batch, search_typesense, search_playlist, stream_typesense, stream_playlist
 
 @functions_framework.http
 def transcript_api(request: Request) -> tuple[Response, int, dict[str, str]]:
@@ -59,11 +123,21 @@ def transcript_api(request: Request) -> tuple[Response, int, dict[str, str]]:
         - API_RESPONSE_HEADERS for the response.
     """
 
+    if request.path.rstrip("/").endswith("/metrics"):
+        return (Response(render_metrics(), mimetype=PROMETHEUS_CONTENT_TYPE), 200, API_RESPONSE_HEADERS)
+    if "/jobs/" in request.path:
+        return job_status(request.path.rstrip("/").rsplit("/", 1)[-1])
+
     try:
         start = perf_counter()
+        timings = start_request()
+        if SEARCH_BACKEND == "typesense":
+            from typesense_gateway import new_retry_budget # pylint: disable=import-outside-toplevel
+            new_retry_budget()
         debug("======================== TRANSCRIPT API ========================")
 
-        request_json = request.get_json(silent=True) or {"empty": True}
+        with span("json_parse"):
+            request_json = request.get_json(silent=True) or {"empty": True}
         request_args = request.args or {"empty": True}
 
         data = {
@@ -73,70 +147,78 @@ def transcript_api(request: Request) -> tuple[Response, int, dict[str, str]]:
             "channel_id": None,
             "video_ids": None,
             "hits": None,
+            "page": None,
+            "page_size": None,
+            "found": None,
+            "next_cursor": None,
+            "timings": None,
+            "results": None,
+            "job": None,
+            "urls": None,
         }
 
         channel_id = request_json.get("channel_id")
         video_ids = request_json.get("video_ids")
         query = request_json.get("query")
+        show_timings = bool(request_json.get("timings"))
 
-        if query: # Case when only searching is happening
-            if len(query.split()) > MAX_QUERY_WORD_LIMIT:
-                raise ValueError(f"""Query is too long. Please limit to
-                                {MAX_QUERY_WORD_LIMIT} words or less.""")
+        if "searches" in request_json: # Case when several searches are sent at once
+            searches = request_json["searches"]
+            if not isinstance(searches, list) or not 0 < len(searches) <= MAX_BATCH_SEARCHES:
+                return (jsonify({"error": f"searches must be a list of 1 to {MAX_BATCH_SEARCHES} searches."}),
+                        400, API_RESPONSE_HEADERS)
+            data["results"] = batch_search(searches)
+        elif query: # Case when only searching is happening
+            with span("query_validation"):
+                compiled = compile_query(query)
+                if len(compiled.tokens) > MAX_QUERY_WORD_LIMIT:
+                    raise ValueError(f"""Query is too long. Please limit to
+                                    {MAX_QUERY_WORD_LIMIT} words or less.""")
+                if not compiled.tokens:
+                    return (jsonify({"error": "Query must contain a letter or number."}), 400, API_RESPONSE_HEADERS)
 
-            copy_search_param = TYPESENSE_SEARCH_PARAMS.copy() # Normally copy is bad, but this should be fast
-            copy_search_param["q"] = f"{query}"
-            if channel_id:
-                copy_search_param["filter_by"] = f"channel_id:{channel_id}"
+                try:
+                    pagination = parse_pagination(request_json)
+                except ValueError as e:
+                    return (jsonify({"error": str(e)}), 400, API_RESPONSE_HEADERS)
+            stream = bool(request_json.get("stream")) or "application/x-ndjson" in request.headers.get("Accept", "")
 
+            cache_key = result_cache_key(compiled, channel_id, video_ids, *pagination)
+            cached = RESULT_CACHE.get(cache_key)
+            if cached is None and stream:
+                summary = {"found": 0, "limit": None}
                 try:
-                    data["hits"] = search_typesense(copy_search_param)
+                    hits = run_search(compiled, channel_id, video_ids, pagination, summary, stream)
                 except ReadTimeout as e:
                     return (jsonify({"error": str(e)}), 408, API_RESPONSE_HEADERS)
                 except ValueError as e:
                     return (jsonify({"error": str(e)}), 400, API_RESPONSE_HEADERS)
-
-            elif video_ids:
-                copy_search_param = TYPESENSE_SEARCH_PARAMS.copy()
-                if len(video_ids) < len(TYPESENSE_SEARCH_REQUESTS["searches"]):
-                    copy_search_param["filter_by"] = f"video_id:{video_ids}"
-                    copy_search_param["q"] = f"{query}"
-                    
-                    try:
-                        data["hits"] = search_typesense(copy_search_param)
-                    except ReadTimeout as e:
-                        return (jsonify({"error": str(e)}), 408, API_RESPONSE_HEADERS)
-                    except ValueError as e:
-                        return (jsonify({"error": str(e)}), 400, API_RESPONSE_HEADERS)
-                else:
-                    del copy_search_param["drop_tokens_threshold"]
-                    del copy_search_param["typo_tokens_threshold"]
-                    del copy_search_param["page"]
-                    del copy_search_param["filter_by"]
-                    del copy_search_param["q"]
-
-                    copy_search_requests = TYPESENSE_SEARCH_REQUESTS.copy() 
-                    split_video_ids = distribute(video_ids, len(TYPESENSE_SEARCH_REQUESTS["searches"]))
-
-                    string_ids = [",".join(ids) for ids in split_video_ids]
-
-                    for i, sub_search in enumerate(copy_search_requests["searches"]):
-                        sub_search["q"] = f"{query}"
-                        sub_search["filter_by"] = f"video_id:[{string_ids[i]}]"
-                    
+            else:
+                if cached is None: # Identical searches already in flight share its result
                     try:
-                        data["hits"] = search_playlist(copy_search_requests, copy_search_param)
+                        cached, _ = SEARCH_FLIGHTS.do(cache_key, lambda: search_and_cache(
+                            compiled, channel_id, video_ids, pagination, cache_key))
                     except ReadTimeout as e:
                         return (jsonify({"error": str(e)}), 408, API_RESPONSE_HEADERS)
                     except ValueError as e:
                         return (jsonify({"error": str(e)}), 400, API_RESPONSE_HEADERS)
-            else:
-                try:
-                    data["hits"] = search_typesense(copy_search_param)
-                except ReadTimeout as e:
-                    return (jsonify({"error": str(e)}), 408, API_RESPONSE_HEADERS)
-                except ValueError as e:
-                    return (jsonify({"error": str(e)}), 400, API_RESPONSE_HEADERS)
+                hits = cached["hits"]
+                summary = {"found": cached["found"], "limit": cached["limit"]}
+
+            if stream:
+                lines = stream_hits(hits, start, cache_key, channel_id, pagination, summary,
+                                    timings if show_timings else None)
+                return (Response(lines, mimetype="application/x-ndjson"), 200, API_RESPONSE_HEADERS)
+            data["hits"] = hits
+            data.update(page_fields(pagination, summary))
+        elif "urls" in request_json: # Case when many URLs are ingested at once
+            urls = request_json["urls"]
+            if not isinstance(urls, list) or not 0 < len(urls) <= MAX_BULK_URLS \
+                    or not all(isinstance(url, str) for url in urls):
+                return (jsonify({"error": f"urls must be a list of 1 to {MAX_BULK_URLS} URLs."}),
+                        400, API_RESPONSE_HEADERS)
+            from scrape import process_urls # pylint: disable=import-outside-toplevel
+            data["urls"], data["video_ids"] = process_urls(urls, not request_json.get("full"))
         else: # Case when we only scraping is happening
             url = ""
             if request_args and "url" in request_args:
@@ -144,10 +226,17 @@ def transcript_api(request: Request) -> tuple[Response, int, dict[str, str]]:
             if request_json and "url" in request_json:
                 url = request_json.get("url", "")
 
-            if url:
+            if url and request_json.get("async"):
+                from scrape_jobs import SCRAPE_JOBS # pylint: disable=import-outside-toplevel
+                try:
+                    data["job"] = SCRAPE_JOBS.submit(url, not request_json.get("full")).as_dict()
+                except ValueError as e:
+                    return (jsonify({"error": str(e)}), 400, API_RESPONSE_HEADERS)
+            elif url:
+                from scrape import process_url # pylint: disable=import-outside-toplevel
                 data_temp = {}
                 try:
-                    data_temp = process_url(url)
+                    data_temp = process_url(url, not request_json.get("full"))
                 except ValueError as e:
                     return (jsonify({"error": str(e)}), 400, API_RESPONSE_HEADERS)
                 data["video_ids"] = data_temp["video_ids"]
@@ -157,8 +246,283 @@ def transcript_api(request: Request) -> tuple[Response, int, dict[str, str]]:
         data["time"] = end - start
         debug(f"Transcript API finished in {data['time']} seconds")
 
-        return (jsonify(data), 200, API_RESPONSE_HEADERS)
+        if show_timings:
+            data["timings"] = timings.as_dict()
+        with span("serialization"):
+            response = jsonify(data)
+        record("request", perf_counter() - start)
+        return (response, 200, API_RESPONSE_HEADERS)
 
     except Exception as e:      # DO NOT RETURN ERROR TO FRONTEND
         debug(str(e))
         return (jsonify({"error": "backend error occurred..."}), 500, API_RESPONSE_HEADERS)
+
+def job_status(job_id: str) -> tuple[Response, int, dict[str, str]]:
+    """Gets the status of a scrape job.
+
+    Args:
+        job_id (str): The id of the job.
+
+    Returns:
+        tuple[Response, int, dict[str, str]]: The job, or a 404 if this instance does not know it.
+    """
+    from scrape_jobs import SCRAPE_JOBS # pylint: disable=import-outside-toplevel
+    job = SCRAPE_JOBS.get(job_id)
+    if job is None:
+        return (jsonify({"error": f"Unknown scrape job: {job_id}"}), 404, API_RESPONSE_HEADERS)
+    return (jsonify(job.as_dict()), 200, API_RESPONSE_HEADERS)
+
+def warm_up() -> None:
+    """Prepares the instance for its first request.
+
+    Creates the search backend and the playlist shard executor, starts the hit processing workers if
+    enabled, opens a connection to Typesense (or loads the local snapshot) with a health check, and imports
+    the scrape module, compiling its URL regexes.
+    """
+    start = perf_counter()
+    search.init_typesense()
+    search.init_executor()
+    init_hit_pool()
+    try:
+        search.TYPESENSE_CLIENT.is_healthy()
+    except Exception as e: # The first request retries the connection
+        debug(f"Warm up could not reach Typesense: {e}")
+    import scrape # pylint: disable=import-outside-toplevel,unused-import
+    debug(f"Warm up finished in {perf_counter() - start} seconds")
+
+def batch_search(items: list[dict]) -> list[dict[str, object]]:
+    """Serves several searches with a single Typesense request.
+
+    Each search is validated and looked up in the result cache on its own, and the rest are sent together.
+    An invalid search or one Typesense rejects gets a 400 entry, and a Typesense timeout a 408 entry for
+    every search that was sent.
+
+    Args:
+        items (list[dict]): The searches, each with a `query`, an optional `channel_id` or `video_ids`,
+            and optional pagination fields.
+
+    Returns:
+        list[dict[str, object]]: The result of each search, in order, with its `status`.
+    """
+    results: list[dict[str, object]|None] = [None] * len(items)
+    pending = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict) or not item.get("query"):
+                raise ValueError("Each search must have a query.")
+            query = compile_query(item["query"])
+            if len(query.tokens) > MAX_QUERY_WORD_LIMIT:
+                raise ValueError(f"Query is too long. Please limit to {MAX_QUERY_WORD_LIMIT} words or less.")
+            if not query.tokens:
+                raise ValueError("Query must contain a letter or number.")
+            pagination = parse_pagination(item)
+        except (TypeError, ValueError) as e:
+            results[index] = {"status": 400, "error": str(e)}
+            continue
+
+        channel_id, video_ids = item.get("channel_id"), item.get("video_ids")
+        cache_key = result_cache_key(query, channel_id, video_ids, *pagination)
+        cached = RESULT_CACHE.get(cache_key)
+        if cached is not None:
+            results[index] = {"status": 200, "hits": cached["hits"], **page_fields(pagination, cached)}
+        else:
+            pending.append((index, query, pagination, channel_id, video_ids, cache_key))
+
+    if not pending:
+        return results
+
+    search_requests = {"searches": [batch_search_request(query, channel_id, video_ids, pagination)
+                                    for _, query, pagination, channel_id, video_ids, _ in pending]}
+    common_params = {key: value for key, value in TYPESENSE_SEARCH_PARAMS.items()
+                     if key not in ("q", "filter_by", "page", "per_page", "limit")}
+    summaries = [{"found": 0, "limit": None} for _ in pending]
+    try:
+        responses = search_batch(search_requests, common_params, [entry[1] for entry in pending],
+                                 [entry[2] for entry in pending], summaries)
+    except ReadTimeout as e:
+        for index, *_ in pending:
+            results[index] = {"status": 408, "error": str(e)}
+        return results
+
+    for (index, _, pagination, channel_id, _, cache_key), response, summary in zip(pending, responses, summaries):
+        if isinstance(response, ValueError):
+            results[index] = {"status": 400, "error": str(response)}
+            continue
+        RESULT_CACHE.put(cache_key, {"hits": response, **summary}, channel_id)
+        results[index] = {"status": 200, "hits": response, **page_fields(pagination, summary)}
+    return results
+
+def batch_search_request(query: CompiledQuery, channel_id: str|None, video_ids: list[str]|None,
+                         pagination: Pagination) -> dict[str, object]:
+    """Builds the Typesense search request of one search of a batch.
+
+    Args:
+        query (CompiledQuery): The compiled query.
+        channel_id (str|None): The channel to filter the search to.
+        video_ids (list[str]|None): The videos to filter the search to.
+        pagination (Pagination): The page to fetch.
+
+    Returns:
+        dict[str, object]: The search request.
+    """
+    per_page = pagination.page_size or MAX_PAGE_SIZE
+    search_request = {
+        "collection": "transcripts",
+        "q": query.typesense_query,
+        "page": pagination.page,
+        "per_page": per_page,
+        "limit": per_page,
+    }
+    if channel_id:
+        search_request["filter_by"] = f"channel_id:{channel_id}"
+    elif video_ids:
+        search_request["filter_by"] = f"video_id:[{','.join(map(str, video_ids))}]"
+    return search_request
+
+def search_and_cache(query: CompiledQuery, channel_id: str|None, video_ids: list[str]|None, pagination: Pagination,
+                     cache_key: str) -> dict[str, object]:
+    """Searches Typesense and caches the result.
+
+    Args:
+        query (CompiledQuery): The compiled query.
+        channel_id (str|None): The channel to filter the search to.
+        video_ids (list[str]|None): The videos to filter the search to.
+        pagination (Pagination): The page to fetch and the snippet cap per video.
+        cache_key (str): The result cache key of the search.
+
+    Returns:
+        dict[str, object]: The search `hits`, the number of videos Typesense `found` and the page `limit`.
+    """
+    summary = {"found": 0, "limit": None}
+    result = {"hits": run_search(query, channel_id, video_ids, pagination, summary), **summary}
+    RESULT_CACHE.put(cache_key, result, channel_id)
+    return result
+
+def run_search(query: CompiledQuery, channel_id: str|None, video_ids: list[str]|None, pagination: Pagination,
+               summary: dict[str, int|None], stream: bool = False) -> list[dict] | Iterator[dict]:
+    """Searches Typesense for the query, filtered to a channel or a list of videos if given.
+
+    Args:
+        query (CompiledQuery): The compiled query.
+        channel_id (str|None): The channel to filter the search to.
+        video_ids (list[str]|None): The videos to filter the search to.
+        pagination (Pagination): The page to fetch and the snippet cap per video.
+        summary (dict[str, int|None]): Filled with the number of videos Typesense `found`, and the `limit`
+            past which no further page can be fetched.
+        stream (bool): Whether to return the hits lazily, as they are processed.
+
+    Returns:
+        list[dict] | Iterator[dict]: The search hits.
+    """
+    copy_search_param = TYPESENSE_SEARCH_PARAMS.copy() # Normally copy is bad, but this should be fast
+    copy_search_param["q"] = query.typesense_query
+    if pagination.page_size:
+        copy_search_param["page"] = pagination.page
+        copy_search_param["per_page"] = copy_search_param["limit"] = pagination.page_size
+
+    # Only the videos that may contain a multi-word query are searched, as far as the phrase index knows
+    if not channel_id and isinstance(video_ids, list) and video_ids and PHRASE_INDEX is not None:
+        video_ids = PHRASE_INDEX.filter_ids(video_ids, query.tokens)
+        if not video_ids:
+            return iter([]) if stream else []
+
+    if channel_id:
+        copy_search_param["filter_by"] = f"channel_id:{channel_id}"
+    elif video_ids and len(video_ids) < len(TYPESENSE_SEARCH_REQUESTS["searches"]):
+        copy_search_param["filter_by"] = f"video_id:{video_ids}"
+
+    if not video_ids or channel_id or len(video_ids) < len(TYPESENSE_SEARCH_REQUESTS["searches"]):
+        if stream:
+            return stream_typesense(copy_search_param, STREAM_CHUNK_SIZE, pagination, summary, query)
+        return search_typesense(copy_search_param, pagination, summary, query)
+
+    del copy_search_param["drop_tokens_threshold"]
+    del copy_search_param["typo_tokens_threshold"]
+    del copy_search_param["page"]
+    del copy_search_param["filter_by"]
+    del copy_search_param["q"]
+
+    # Every shard has to return the whole span up to the requested page, which Typesense caps
+    if pagination.page_size:
+        copy_search_param["per_page"] = copy_search_param["limit"] = min(pagination.page * pagination.page_size, MAX_PAGE_SIZE)
+        summary["limit"] = MAX_PAGE_SIZE
+
+    split_video_ids = distribute(video_ids, shard_count(video_ids))
+
+    copy_search_requests = {"searches": [{
+        "collection": "transcripts",
+        "q": query.typesense_query,
+        "filter_by": f"video_id:[{','.join(ids)}]",
+    } for ids in split_video_ids]}
+
+    if stream:
+        return stream_playlist(copy_search_requests, copy_search_param, STREAM_CHUNK_SIZE, pagination, summary, query)
+    return search_playlist(copy_search_requests, copy_search_param, pagination, summary, query)
+
+def page_fields(pagination: Pagination, summary: dict[str, int|None]) -> dict[str, int|str|None]:
+    """Builds the pagination fields of a search response.
+
+    Args:
+        pagination (Pagination): The page that was fetched.
+        summary (dict[str, int|None]): The number of videos Typesense `found` and the page `limit`.
+
+    Returns:
+        dict[str, int|str|None]: The page, page size, number of videos found and cursor of the next page.
+    """
+    return {
+        "page": pagination.page,
+        "page_size": pagination.page_size,
+        "found": summary["found"],
+        "next_cursor": pagination.next_cursor(int(summary["found"] or 0), summary["limit"]),
+    }
+
+def stream_hits(hits: list[dict] | Iterator[dict], start: float, cache_key: str, channel_id: str|None,
+                pagination: Pagination, summary: dict[str, int|None], timings: Timings|None = None) -> Iterator[str]:
+    """Streams search hits as newline delimited JSON, one hit per line, followed by a summary record.
+
+    Hits streamed fresh from Typesense are cached once the stream completes. An error part way through
+    is sent as a final `{"error": ...}` record in place of the summary.
+
+    Args:
+        hits (list[dict] | Iterator[dict]): The search hits, cached or still being processed.
+        start (float): When the request started, from `perf_counter`.
+        cache_key (str): The result cache key of the search.
+        channel_id (str|None): The channel the search is filtered to.
+        pagination (Pagination): The page that was fetched.
+        summary (dict[str, int|None]): The number of videos Typesense `found` and the page `limit`,
+            complete once every hit has been yielded.
+        timings (Timings|None): The timings of the request, added to the summary record if given.
+
+    Returns:
+        Iterator[str]: The lines of the response.
+    """
+    show_timings = timings is not None
+    timings = start_request(timings)
+    collected: list[dict]|None = None if isinstance(hits, list) else []
+    try:
+        for hit in hits:
+            if collected is not None:
+                collected.append(hit)
+            with span("serialization"):
+                line = dumps(hit) + "\n"
+            yield line
+    except (ReadTimeout, ValueError) as e:
+        yield dumps({"error": str(e)}) + "\n"
+        return
+    except Exception as e:      # DO NOT RETURN ERROR TO FRONTEND
+        debug(str(e))
+        yield dumps({"error": "backend error occurred..."}) + "\n"
+        return
+
+    if collected is not None:
+        collected.sort(key=lambda hit: hit["upload_date"], reverse=True)
+        RESULT_CACHE.put(cache_key, {"hits": collected, **summary}, channel_id)
+
+    end = perf_counter()
+    debug(f"Transcript API finished streaming in {end - start} seconds")
+    record("request", end - start)
+    yield dumps({"status": "success", "MAX_QUERY_WORD_LIMIT": MAX_QUERY_WORD_LIMIT, "time": end - start,
+                 **page_fields(pagination, summary), "timings": timings.as_dict() if show_timings else None}) + "\n"
+
+if WARM_UP_ON_START:
+    warm_up()
@@ -0,0 +1,227 @@
+"""
+This module finds a query within a tokenized transcript in a single linear pass.
+
+A transcript is tokenized once into a flat list of words (every cleaned sentence split on single spaces)
+and a list of offsets marking where each sentence starts. Phrase matches are then found over the flat
+list, so a phrase running across a sentence boundary needs no string concatenation.
+
+The results match the sentence-by-sentence search in `search.sentence_search`:
+- A single word query matches a sentence containing the word.
+- A phrase matches like a substring of the cleaned text, so the first word may be the end of a longer word
+  and the last word may be the start of a longer word.
+- A sentence matches with a span of 2 if the phrase is found in it joined with the next (non-empty) sentence,
+  and the next sentence is then skipped.
+
+Functions:
+- tokenize(sentences: list[str]) -> tuple[list[str], list[int]]: Flattens cleaned sentences into words and offsets.
+- is_canonical(query: str) -> bool: Whether a cleaned query can be matched on tokens.
+- phrase_starts(words: list[str], query_words: list[str]) -> list[int]: Finds where the phrase starts.
+- iter_phrase_starts(words: list[str], query_words: list[str]) -> Iterator[int]: Finds where the phrase starts, lazily.
+- match_sentences(sentences: list[str], words: list[str], offsets: list[int], query: str) -> list[tuple[int, int]]:
+  Finds the sentences matching the query along with how many sentences each match spans.
+- iter_match_sentences(sentences: list[str], words: list[str], offsets: list[int], query: str) -> Iterator[tuple[int, int]]:
+  Finds the same matches as `match_sentences`, yielding each one as soon as it is final.
+- resolve_spans(sentences: list[str], within: set[int], crossing: set[int], length: int) -> list[tuple[int, int]]:
+  Turns the sentences holding a match into the sentences reported as snippets.
+- resolve_span(sentences: list[str], within: set[int], crossing: set[int], length: int, index: int) -> int:
+  Decides whether a candidate sentence is reported as a snippet, and how many sentences it spans.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from bisect import bisect_right
+from collections import deque
+from collections.abc import Iterator
+from itertools import chain
+
+def tokenize(sentences: list[str]) -> tuple[list[str], list[int]]:
+    """Flattens cleaned sentences into a word list and the offsets where each sentence starts.
+
+    Sentences are split on single spaces, so repeated spaces leave empty words that no phrase can match across.
+
+    Args:
+        sentences (list[str]): The cleaned sentences of the transcript
+
+    Returns:
+        tuple[list[str], list[int]]: The flat word list, and the start of each sentence followed by its length
+    """
+    words: list[str] = []
+    offsets = []
+    for sentence in sentences:
+        offsets.append(len(words))
+        words.extend(sentence.split(" "))
+    offsets.append(len(words))
+    return words, offsets
+
+def is_canonical(query: str) -> bool:
+    """Whether a cleaned query can be matched on tokens.
+
+    Queries with leading, trailing or repeated spaces, or no words at all, are left to the sentence search.
+
+    Args:
+        query (str): The cleaned query
+
+    Returns:
+        bool: True if the query is its words joined by single spaces
+    """
+    return bool(query) and " ".join(query.split()) == query
+
+def phrase_starts(words: list[str], query_words: list[str]) -> list[int]:
+    """Finds every index of `words` where the phrase starts.
+
+    Args:
+        words (list[str]): The flat word list of the transcript
+        query_words (list[str]): The words of the query
+
+    Returns:
+        list[int]: The indexes of the first word of every match, in ascending order
+    """
+    if len(query_words) == 1: # Kept as a comprehension, the hot path of single word queries
+        word = query_words[0]
+        return [index for index, candidate in enumerate(words) if candidate == word]
+    return list(iter_phrase_starts(words, query_words))
+
+def iter_phrase_starts(words: list[str], query_words: list[str]) -> Iterator[int]:
+    """Finds every index of `words` where the phrase starts, scanning only as far as the caller reads.
+
+    Args:
+        words (list[str]): The flat word list of the transcript
+        query_words (list[str]): The words of the query
+
+    Returns:
+        Iterator[int]: The indexes of the first word of every match, in ascending order
+    """
+    if len(query_words) == 1:
+        word = query_words[0]
+        yield from (index for index, candidate in enumerate(words) if candidate == word)
+        return
+
+    first, middle, last = query_words[0], query_words[1:-1], query_words[-1]
+    length = len(query_words)
+    for index in range(len(words) - length + 1):
+        if not words[index].endswith(first) or not words[index + length - 1].startswith(last):
+            continue
+        if words[index + 1:index + length - 1] == middle:
+            yield index
+
+def match_sentences(sentences: list[str], words: list[str], offsets: list[int], query: str) -> list[tuple[int, int]]:
+    """Finds the sentences matching the query along with how many sentences each match spans.
+
+    Args:
+        sentences (list[str]): The cleaned sentences of the transcript
+        words (list[str]): The flat word list of the transcript
+        offsets (list[int]): The index in `words` where each sentence starts, followed by `len(words)`
+        query (str): The cleaned, canonical query
+
+    Returns:
+        list[tuple[int, int]]: The index of each matching sentence and whether it spans 1 or 2 sentences
+    """
+    query_words = query.split(" ")
+    length = len(query_words)
+
+    within: set[int] = set()
+    crossing: set[int] = set()
+    for start in phrase_starts(words, query_words):
+        first = bisect_right(offsets, start) - 1
+        last = bisect_right(offsets, start + length - 1) - 1
+        if first == last:
+            within.add(first)
+        elif last == first + 1:
+            crossing.add(first)
+
+    return resolve_spans(sentences, within, crossing, length)
+
+def iter_match_sentences(sentences: list[str], words: list[str], offsets: list[int], query: str) -> Iterator[tuple[int, int]]:
+    """Finds the same matches as `match_sentences`, yielding each one as soon as it is final.
+
+    Whether a sentence is reported, and whether it spans the next sentence, depends only on the matches in it
+    and in the next sentence. A sentence is therefore final once a match has been found starting past the
+    next sentence, so a caller that only needs the first matches can stop before the rest is scanned.
+
+    Args:
+        sentences (list[str]): The cleaned sentences of the transcript
+        words (list[str]): The flat word list of the transcript
+        offsets (list[int]): The index in `words` where each sentence starts, followed by `len(words)`
+        query (str): The cleaned, canonical query
+
+    Returns:
+        Iterator[tuple[int, int]]: The index of each matching sentence and whether it spans 1 or 2 sentences
+    """
+    query_words = query.split(" ")
+    length = len(query_words)
+
+    within: set[int] = set()
+    crossing: set[int] = set()
+    candidates: deque[int] = deque()
+    skipped = -1
+    for start in chain(iter_phrase_starts(words, query_words), [None]):
+        if start is None: # Every match was found, so every candidate is final
+            first = len(sentences) + 1
+        else:
+            first = bisect_right(offsets, start) - 1
+            last = bisect_right(offsets, start + length - 1) - 1
+            if first == last:
+                within.add(first)
+                if length > 1 and first and (not candidates or candidates[-1] < first - 1):
+                    candidates.append(first - 1)
+            elif last == first + 1:
+                crossing.add(first)
+            else:
+                continue
+            if not candidates or candidates[-1] < first:
+                candidates.append(first)
+
+        while candidates and candidates[0] < first - 1:
+            index = candidates.popleft()
+            if index != skipped:
+                num_sentences = resolve_span(sentences, within, crossing, length, index)
+                if num_sentences:
+                    skipped = index + 1 if num_sentences == 2 else skipped
+                    yield index, num_sentences
+
+def resolve_span(sentences: list[str], within: set[int], crossing: set[int], length: int, index: int) -> int:
+    """Decides whether a candidate sentence is reported as a snippet, and how many sentences it spans.
+
+    Args:
+        sentences (list[str]): The cleaned sentences of the transcript
+        within (set[int]): The sentences with a match contained entirely inside them
+        crossing (set[int]): The sentences with a match starting in them and ending in the next sentence
+        length (int): The number of words in the query
+        index (int): The candidate sentence, which was not skipped by the snippet before it
+
+    Returns:
+        int: 1 or 2 for the number of sentences the snippet spans, or 0 if the sentence is not reported
+    """
+    if index in within:
+        return 1
+    if length > 1 and index + 1 < len(sentences) and sentences[index + 1] and (index + 1 in within or index in crossing):
+        return 2
+    return 0
+
+def resolve_spans(sentences: list[str], within: set[int], crossing: set[int], length: int) -> list[tuple[int, int]]:
+    """Turns the sentences holding a match into the sentences reported as snippets.
+
+    Args:
+        sentences (list[str]): The cleaned sentences of the transcript
+        within (set[int]): The sentences with a match contained entirely inside them
+        crossing (set[int]): The sentences with a match starting in them and ending in the next sentence
+        length (int): The number of words in the query
+
+    Returns:
+        list[tuple[int, int]]: The index of each matching sentence and whether it spans 1 or 2 sentences
+    """
+    if length == 1:
+        return [(index, 1) for index in sorted(within)]
+
+    candidates = within | crossing | {index - 1 for index in within if index}
+    matches = []
+    skipped = -1
+    for index in sorted(candidates):
+        if index == skipped:
+            continue
+        num_sentences = resolve_span(sentences, within, crossing, length, index)
+        if num_sentences:
+            matches.append((index, num_sentences))
+            skipped = index + 1 if num_sentences == 2 else skipped
+    return matches
@@ -0,0 +1,197 @@
+"""
+This module times the phases of a request and exports them as histogram metrics.
+
+Code wraps each phase in `span`, which adds its duration to the timings of the current request and
+hands it to the metrics exporter. Phases that run many times per request, such as `process_hit`, are
+summed, with their count kept alongside. Events, such as a search joining one already in flight, are
+counted with `count`. The default exporter keeps histograms and counters in process and renders them in
+the Prometheus text format.
+
+Classes:
+- Timings: The per-phase durations of one request.
+- MetricsExporter: Interface for sending phase durations and event counts to a metrics backend.
+- PrometheusExporter: Keeps histograms of phase durations and event counters in process and renders them
+  as Prometheus text.
+
+Functions:
+- start_request(timings: Timings|None) -> Timings: Makes a request's timings current.
+- span(phase: str) -> ContextManager[None]: Times a phase of the current request.
+- record(phase: str, seconds: float) -> None: Records the duration of a phase.
+- count(event: str, amount: int) -> None: Counts an event.
+- set_exporter(exporter: MetricsExporter) -> None: Replaces the metrics exporter.
+- render_metrics() -> str: Renders the metrics of the default exporter.
+
+Global Variables:
+- METRICS_EXPORTER: The exporter every phase duration is sent to.
+
+Dependencies:
+- contextvars: Keeps the timings of the request being served by the current thread.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+from typing import Protocol
+
+PHASE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Timings:
+    """The per-phase durations of one request."""
+
+    def __init__(self) -> None:
+        self._phases: dict[str, list[float]] = {}
+        self._lock = Lock()
+
+    def add(self, phase: str, seconds: float) -> None:
+        """Adds a duration to a phase.
+
+        Args:
+            phase (str): The name of the phase.
+            seconds (float): The duration in seconds.
+        """
+        with self._lock:
+            totals = self._phases.setdefault(phase, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    def as_dict(self) -> dict[str, dict[str, int|float]]:
+        """Gets the timings for a response.
+
+        Returns:
+            dict[str, dict[str, int|float]]: The number of times each phase ran and its total in milliseconds.
+        """
+        with self._lock:
+            return {phase: {"count": int(count), "total_ms": seconds * 1000}
+                    for phase, (count, seconds) in self._phases.items()}
+
+class MetricsExporter(Protocol):
+    """Interface for sending phase durations and event counts to a metrics backend, such as Cloud Monitoring or StatsD."""
+
+    def observe(self, phase: str, seconds: float) -> None:
+        """Records the duration of a phase."""
+
+    def increment(self, event: str, amount: int = 1) -> None:
+        """Counts an event."""
+
+class PrometheusExporter(MetricsExporter):
+    """Keeps histograms of phase durations and event counters in process and renders them in the Prometheus text format.
+
+    Args:
+        buckets (tuple[float, ...]): The upper bounds of the histogram buckets, in seconds.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = PHASE_BUCKETS) -> None:
+        self.buckets = buckets
+        self._histograms: dict[str, list] = {}
+        self._counters: dict[str, int] = {}
+        self._lock = Lock()
+
+    def observe(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(phase)
+            if histogram is None:
+                histogram = self._histograms[phase] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect_left(self.buckets, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def increment(self, event: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[event] = self._counters.get(event, 0) + amount
+
+    def render(self) -> str:
+        """Renders every histogram and counter.
+
+        Returns:
+            str: The histograms and counters in the Prometheus text exposition format.
+        """
+        lines = ["# HELP transcript_api_phase_seconds Time spent in each phase of a request.",
+                 "# TYPE transcript_api_phase_seconds histogram"]
+        with self._lock:
+            for phase, (counts, total, count) in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'transcript_api_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+                lines.append(f'transcript_api_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {count}')
+                lines.append(f'transcript_api_phase_seconds_sum{{phase="{phase}"}} {total}')
+                lines.append(f'transcript_api_phase_seconds_count{{phase="{phase}"}} {count}')
+            lines.append("# HELP transcript_api_events_total Number of times each event happened.")
+            lines.append("# TYPE transcript_api_events_total counter")
+            for event, total in sorted(self._counters.items()):
+                lines.append(f'transcript_api_events_total{{event="{event}"}} {total}')
+        return "\n".join(lines) + "\n"
+
+METRICS_EXPORTER: MetricsExporter = PrometheusExporter()
+_CURRENT_TIMINGS: ContextVar[Timings|None] = ContextVar("timings", default=None)
+
+def start_request(timings: Timings|None = None) -> Timings:
+    """Makes a request's timings current, so the spans that follow add to them.
+
+    Args:
+        timings (Timings|None): The timings to resume, such as those of a streamed response, or None for new ones.
+
+    Returns:
+        Timings: The current timings.
+    """
+    timings = timings or Timings()
+    _CURRENT_TIMINGS.set(timings)
+    return timings
+
+def record(phase: str, seconds: float) -> None:
+    """Records the duration of a phase in the current request's timings and the metrics exporter.
+
+    Args:
+        phase (str): The name of the phase.
+        seconds (float): The duration in seconds.
+    """
+    timings = _CURRENT_TIMINGS.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+    METRICS_EXPORTER.observe(phase, seconds)
+
+def count(event: str, amount: int = 1) -> None:
+    """Counts an event in the metrics exporter.
+
+    Args:
+        event (str): The name of the event.
+        amount (int): The number of times it happened.
+    """
+    METRICS_EXPORTER.increment(event, amount)
+
+@contextmanager
+def span(phase: str) -> Iterator[None]:
+    """Times a phase of the current request, including phases that end in an exception.
+
+    Args:
+        phase (str): The name of the phase.
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, perf_counter() - start)
+
+def set_exporter(exporter: MetricsExporter) -> None:
+    """Replaces the metrics exporter.
+
+    Args:
+        exporter (MetricsExporter): The exporter every phase duration is sent to from now on.
+    """
+    global METRICS_EXPORTER  # pylint: disable=global-statement
+    METRICS_EXPORTER = exporter
+
+def render_metrics() -> str:
+    """Renders the metrics kept in process.
+
+    Returns:
+        str: The metrics in the Prometheus text format, or an empty string if the exporter keeps none.
+    """
+    return METRICS_EXPORTER.render() if isinstance(METRICS_EXPORTER, PrometheusExporter) else ""
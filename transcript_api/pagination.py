@@ -0,0 +1,153 @@
+"""
+This module parses the pagination of search requests and builds the cursors of the next pages.
+
+A request either sends `page`, `page_size`, `max_snippets`, `snippet_format` and `approximate_counts`, or the
+opaque `cursor` returned with the previous page. Requests without any of them keep the original behaviour of
+returning every hit Typesense finds on its first page of 250, with every snippet marked.
+
+With `max_snippets`, only the best snippets of each video are returned (see `ranking`), along with the number
+of snippets it matched. Sending `approximate_counts` as well lets the matching of a video stop once enough
+complete snippets are found, in which case the number is a lower bound and the snippets, while each holds
+the whole query, may not be the best ones.
+
+The snippet format decides how the matches within a snippet are shown:
+- `marked`: The snippet text with every match wrapped in `<mark>` tags.
+- `offsets`: The snippet text as is, with the `[start, end]` character offsets of every match.
+- `indexed`: The index and length of the sentences of the snippet, with the offsets of every match within
+  them joined by a space. The text of every sentence used is sent once per video, under `sentences`.
+
+Classes:
+- Pagination: The page, page size, snippet cap, snippet format and count accuracy of a search.
+
+Functions:
+- parse_pagination(request_json: dict) -> Pagination: Reads the pagination of a search request.
+- encode_cursor(pagination: Pagination) -> str: Builds the opaque cursor of a page.
+- decode_cursor(cursor: str) -> Pagination: Reads an opaque cursor.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from json import dumps, loads
+from typing import NamedTuple
+
+# File System Imports
+from settings import MAX_PAGE_SIZE
+
+SNIPPET_FORMATS = ("marked", "offsets", "indexed")
+
+class Pagination(NamedTuple):
+    """The page, page size, snippet cap, snippet format and count accuracy of a search.
+
+    Attributes:
+        page (int): The page of results, starting at 1.
+        page_size (int|None): The number of videos per page, or None for the unpaginated response.
+        max_snippets (int|None): The maximum number of snippets returned per video, or None for all of them.
+        snippet_format (str): How the matches within each snippet are shown, one of `SNIPPET_FORMATS`.
+        approximate_counts (bool): Whether the matching of a video may stop short once enough complete snippets
+            are found, leaving a lower bound for its count. Only set along with `max_snippets`.
+    """
+    page: int = 1
+    page_size: int|None = None
+    max_snippets: int|None = None
+    snippet_format: str = "marked"
+    approximate_counts: bool = False
+
+    def next_cursor(self, found: int, limit: int|None = None) -> str|None:
+        """Builds the cursor of the next page, if there is one.
+
+        Args:
+            found (int): The number of videos Typesense found.
+            limit (int|None): The number of videos past which pages cannot be fetched.
+
+        Returns:
+            str|None: The cursor of the next page, or None if this is the last page.
+        """
+        if not self.page_size:
+            return None
+        end = self.page * self.page_size
+        if end >= found or (limit is not None and end >= limit):
+            return None
+        return encode_cursor(self._replace(page=self.page + 1))
+
+def positive_int(value: object, name: str) -> int:
+    """Reads a positive integer from a request field.
+
+    Args:
+        value (object): The value of the field.
+        name (str): The name of the field, for the error message.
+
+    Returns:
+        int: The value as an integer.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).isdigit() or int(value) < 1:
+        raise ValueError(f"{name} must be a positive integer.")
+    return int(value)
+
+def parse_pagination(request_json: dict) -> Pagination:
+    """Reads the pagination of a search request.
+
+    Args:
+        request_json (dict): The JSON payload of the request.
+
+    Returns:
+        Pagination: The pagination of the search.
+    """
+    if request_json.get("cursor"):
+        return decode_cursor(str(request_json["cursor"]))
+
+    page = positive_int(request_json.get("page", 1), "page")
+    page_size = request_json.get("page_size")
+    max_snippets = request_json.get("max_snippets")
+    snippet_format = request_json.get("snippet_format") or "marked"
+    approximate_counts = request_json.get("approximate_counts", False)
+
+    if page_size is not None:
+        page_size = positive_int(page_size, "page_size")
+        if page_size > MAX_PAGE_SIZE:
+            raise ValueError(f"page_size must be {MAX_PAGE_SIZE} or less.")
+    elif page != 1:
+        raise ValueError("page_size is required when requesting a page.")
+
+    if max_snippets is not None:
+        max_snippets = positive_int(max_snippets, "max_snippets")
+
+    if snippet_format not in SNIPPET_FORMATS:
+        raise ValueError(f"snippet_format must be one of {', '.join(SNIPPET_FORMATS)}.")
+
+    if not isinstance(approximate_counts, bool):
+        raise ValueError("approximate_counts must be a boolean.")
+
+    return Pagination(page, page_size, max_snippets, snippet_format, approximate_counts and max_snippets is not None)
+
+def encode_cursor(pagination: Pagination) -> str:
+    """Builds the opaque cursor of a page.
+
+    Args:
+        pagination (Pagination): The pagination of the page.
+
+    Returns:
+        str: The cursor.
+    """
+    return urlsafe_b64encode(dumps(list(pagination)).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Pagination:
+    """Reads an opaque cursor.
+
+    Args:
+        cursor (str): The cursor returned with a previous page.
+
+    Returns:
+        Pagination: The pagination of the page.
+    """
+    try:
+        page, page_size, max_snippets, *rest = loads(urlsafe_b64decode(cursor.encode("ascii")))
+    except (DecodeError, UnicodeError, ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+    # Cursors issued before the snippet format and count accuracy were added stop at `max_snippets`
+    return parse_pagination({"page": page, "page_size": page_size, "max_snippets": max_snippets,
+                             "snippet_format": rest[0] if rest else None,
+                             "approximate_counts": rest[1] if len(rest) > 1 else False})
@@ -0,0 +1,362 @@
+"""
+This module holds a positional phrase index of the transcripts, used to drop the videos that do not
+contain a multi-word query before their transcripts are transferred.
+
+Typesense matches the words of a query independently, so a phrase search returns many videos holding the
+words but never the phrase, which the matcher only discards once their transcripts have been downloaded.
+The index answers which videos hold the exact phrase, on word boundaries, instead.
+
+Transcripts are normalized as the matcher does: every sentence lowercased, stripped to letters, digits and
+spaces, and the words of every sentence flattened in order. Each pair of neighbouring words is a posting
+keyed by a 64-bit hash of the pair, holding the video number and the position of the pair within the video.
+Every distinct word is hashed once with BLAKE2, the same in every process, and the hashes of neighbouring
+words are combined with NumPy. A phrase of `n` words is looked up as its `n - 1` word pairs, and a video holds the phrase where the
+pair `i` is found at position `p + i` for every `i`.
+
+The matcher finds a phrase like a substring of the cleaned text, so its first word may be the end of a
+longer word and its last word the start of one. The index keeps every distinct word it has seen, sorted
+forwards and backwards, and looks the edges of a phrase up as every indexed word they end or start, so
+a video is only dropped when the matcher would drop it too. A phrase whose edges extend to more than
+`MAX_EDGE_PAIRS` pairs is not looked up, and neither is any phrase in an index built without the words.
+
+The index is a directory of three files:
+- `hashes.npy`: The hash of every posting, sorted.
+- `postings.npy`: The video number shifted 32 bits left, plus the position, of every posting, in the same order.
+- `index.json`: Maps each video id to its number and upload date.
+- `words.json`: Every distinct word indexed, sorted.
+
+The arrays are memory-mapped on first use, so a cold start does not read them. The index is built from the
+same `TranscriptDoc` JSON that `go-upsert-typesense` imports, and rewritten whenever documents are appended.
+A re-ingested video replaces its postings. Videos missing from the index, or indexed with another upload
+date, are never dropped.
+
+Usage:
+    python phrase_index.py <index directory> <TranscriptDoc JSON or JSON lines file>...
+
+Classes:
+- PhraseIndex: The memory-mapped positional phrase index.
+
+Functions:
+- word_hashes(words: list[str]) -> np.ndarray: Hashes words, each distinct word once.
+- pair_hashes(hashes: np.ndarray) -> np.ndarray: Combines the hashes of neighbouring words.
+- transcript_words(transcript: Iterable[str]) -> list[str]: Normalizes a transcript into its flat word list.
+
+Global Variables:
+- PHRASE_INDEX: The index at settings.PHRASE_INDEX_PATH, or None when no index is configured.
+
+Dependencies:
+- numpy: Sorts the postings, and looks them up with binary searches and intersections.
+- matcher.tokenize: Flattens the normalized sentences into words, as the matcher does.
+- transcript_store.load_documents: Reads the TranscriptDoc JSON files.
+- settings.PHRASE_INDEX_PATH: The directory of the index.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from bisect import bisect_left
+from collections.abc import Iterable, Sequence
+from hashlib import blake2b
+from json import dump, load
+from os import makedirs, path as os_path, replace
+from sys import argv
+from threading import Lock
+
+# Third-Party Imports
+import numpy as np
+
+# File System Imports
+from matcher import tokenize
+from query import querytext
+from settings import PHRASE_INDEX_PATH
+from transcript_store import load_documents
+
+HASHES_FILE = "hashes.npy"
+POSTINGS_FILE = "postings.npy"
+INDEX_FILE = "index.json"
+WORDS_FILE = "words.json"
+
+# The most word pairs the edges of a phrase may extend to before the phrase is left to the matcher
+MAX_EDGE_PAIRS = 1 << 16
+
+# An odd constant spreading the hash of the first word of a pair, so the pair (a, b) differs from (b, a)
+PAIR_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+def word_hashes(words: list[str]) -> np.ndarray:
+    """Hashes words, the same way in every process, hashing each distinct word once.
+
+    Args:
+        words (list[str]): The words.
+
+    Returns:
+        np.ndarray: The 64-bit hash of every word, as unsigned integers.
+    """
+    hashes: dict[str, int] = {}
+    for word in words:
+        if word not in hashes:
+            hashes[word] = int.from_bytes(blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.fromiter((hashes[word] for word in words), dtype=np.uint64, count=len(words))
+
+def pair_hashes(hashes: np.ndarray) -> np.ndarray:
+    """Combines the hashes of every pair of neighbouring words.
+
+    Args:
+        hashes (np.ndarray): The hash of every word, from `word_hashes`.
+
+    Returns:
+        np.ndarray: The hash of each word paired with the next, as signed integers.
+    """
+    return (hashes[:-1] * PAIR_MULTIPLIER + hashes[1:]).view(np.int64)
+
+def transcript_words(transcript: Iterable[str]) -> list[str]:
+    """Normalizes a transcript into its flat word list, as the matcher tokenizes it.
+
+    Args:
+        transcript (Iterable[str]): The sentences of the transcript.
+
+    Returns:
+        list[str]: The words of every sentence, in order.
+    """
+    return tokenize([querytext.sub("", sentence.lower()) for sentence in transcript])[0]
+
+class PhraseIndex:
+    """The memory-mapped positional phrase index.
+
+    Nothing is read from disk until the first lookup.
+
+    Args:
+        directory (str): The directory holding the index files.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._videos: dict[str, list[int]]|None = None
+        self._ids: dict[int, str] = {}
+        self._words: list[str]|None = None
+        self._reversed_words: list[str] = []
+        self._hashes = np.empty(0, dtype=np.int64)
+        self._postings = np.empty(0, dtype=np.int64)
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        self._open()
+        return len(self._videos)
+
+    def indexed(self, video_id: str, upload_date: int|None = None) -> bool:
+        """Checks whether the index knows the words of a video.
+
+        Args:
+            video_id (str): The id of the video.
+            upload_date (int|None): The upload date the caller expects, so a stale copy is never trusted.
+
+        Returns:
+            bool: True if the video is indexed, with the given upload date if any.
+        """
+        self._open()
+        entry = self._videos.get(video_id)
+        return entry is not None and (upload_date is None or entry[1] == upload_date)
+
+    def lookup(self, tokens: Sequence[str]) -> frozenset[str]|None:
+        """Finds the indexed videos that may contain a phrase, as the matcher finds it.
+
+        Args:
+            tokens (Sequence[str]): The words of the phrase, in canonical form.
+
+        Returns:
+            frozenset[str]|None: The ids of the indexed videos that may contain the phrase, or None if the
+            phrase cannot be looked up: it has fewer than two words, its edges extend to too many words, or
+            the index has no words.
+        """
+        if len(tokens) < 2:
+            return None
+        self._open()
+        if self._words is None:
+            return None
+
+        # The first word may end a longer word and the last may start one, the words between are whole
+        firsts, lasts = self._extensions(tokens[0], suffix=True), self._extensions(tokens[-1], suffix=False)
+        if len(firsts) * len(lasts) > MAX_EDGE_PAIRS:
+            return None
+        hashes = [word_hashes(firsts), *(word_hashes([token]) for token in tokens[1:-1]), word_hashes(lasts)]
+
+        starts = None
+        for offset in range(len(tokens) - 1):
+            # The posting of the phrase start for this pair, so every pair of one match shares a value
+            pair_starts = self._pair_postings(hashes[offset], hashes[offset + 1]) - offset
+            starts = np.unique(pair_starts) if starts is None else np.intersect1d(starts, pair_starts)
+            if not len(starts):
+                return frozenset()
+        return frozenset(self._ids[number] for number in np.unique(starts >> 32).tolist())
+
+    def filter_ids(self, video_ids: Iterable[str], tokens: Sequence[str]) -> list[str]:
+        """Drops the videos the index knows do not contain a phrase.
+
+        Args:
+            video_ids (Iterable[str]): The ids of the videos.
+            tokens (Sequence[str]): The words of the phrase, in canonical form.
+
+        Returns:
+            list[str]: The ids of the videos containing the phrase or missing from the index, in order.
+        """
+        found = self.lookup(tokens)
+        if found is None:
+            return list(video_ids)
+        return [video_id for video_id in video_ids if video_id in found or not self.indexed(video_id)]
+
+    def append(self, documents: Iterable[dict]) -> int:
+        """Adds TranscriptDoc documents to the index, replacing the postings of documents already indexed.
+
+        Args:
+            documents (Iterable[dict]): The documents, with `id`, `upload_date` and `transcript`.
+
+        Returns:
+            int: The number of documents added.
+        """
+        with self._lock:
+            makedirs(self.directory, exist_ok=True)
+            videos = self._read_index()
+            words = self._read_words() if videos else []
+            hashes, postings = [self._load(HASHES_FILE)], [self._load(POSTINGS_FILE)]
+            next_number = max((entry[0] for entry in videos.values()), default=-1) + 1
+
+            replaced = []
+            appended = 0
+            for document in documents:
+                if document["id"] in videos:
+                    replaced.append(videos[document["id"]][0])
+                document_words = transcript_words(document["transcript"])
+                if words is not None:
+                    words.extend(set(document_words))
+                pairs = pair_hashes(word_hashes(document_words))
+                hashes.append(pairs)
+                postings.append((next_number << 32) + np.arange(len(pairs), dtype=np.int64))
+                videos[document["id"]] = [next_number, document["upload_date"]]
+                next_number += 1
+                appended += 1
+
+            hashes, postings = np.concatenate(hashes), np.concatenate(postings)
+            if replaced:
+                kept = ~np.isin(postings >> 32, replaced)
+                hashes, postings = hashes[kept], postings[kept]
+            order = np.lexsort((postings, hashes))
+
+            self._save(HASHES_FILE, hashes[order])
+            self._save(POSTINGS_FILE, postings[order])
+            if words is not None:
+                self._write(WORDS_FILE, sorted(set(words)))
+            self._write(INDEX_FILE, videos)
+
+            self._videos = None
+        return appended
+
+    def _extensions(self, word: str, suffix: bool) -> list[str]:
+        """Finds the indexed words a phrase edge may be part of.
+
+        Args:
+            word (str): The first or last word of the phrase.
+            suffix (bool): True to find the words ending with it, False for the words starting with it.
+
+        Returns:
+            list[str]: The indexed words ending or starting with the word, the word itself included.
+        """
+        words = self._reversed_words if suffix else self._words
+        key = word[::-1] if suffix else word
+        found = words[bisect_left(words, key):bisect_left(words, key + "\U0010ffff")]
+        return [found_word[::-1] for found_word in found] if suffix else found
+
+    def _pair_postings(self, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+        """Gets the postings of every pair of a word from `first` followed by a word from `second`.
+
+        Args:
+            first (np.ndarray): The hashes of the candidates for the first word of the pair.
+            second (np.ndarray): The hashes of the candidates for the second word of the pair.
+
+        Returns:
+            np.ndarray: The postings of the pairs, unsorted.
+        """
+        keys = np.unique((first[:, None] * PAIR_MULTIPLIER + second[None, :]).ravel().view(np.int64))
+        lows, highs = np.searchsorted(self._hashes, keys, "left"), np.searchsorted(self._hashes, keys, "right")
+        ranges = [(low, high) for low, high in zip(lows.tolist(), highs.tolist()) if high > low]
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.asarray(self._postings[low:high]) for low, high in ranges])
+
+    def _open(self) -> None:
+        """Maps the index files and loads the video numbers, on first use."""
+        if self._videos is not None:
+            return
+
+        with self._lock:
+            if self._videos is not None:
+                return
+            videos = self._read_index()
+            self._hashes = self._load(HASHES_FILE, "r")
+            self._postings = self._load(POSTINGS_FILE, "r")
+            self._ids = {entry[0]: video_id for video_id, entry in videos.items()}
+            words = self._read_words() if videos else []
+            if words is not None:
+                self._reversed_words = sorted(word[::-1] for word in words)
+            self._words = words
+            self._videos = videos
+
+    def _load(self, name: str, mmap_mode: str|None = None) -> np.ndarray:
+        """Loads an index array, empty if the index has not been built.
+
+        Args:
+            name (str): The name of the file.
+            mmap_mode (str|None): "r" to map the file read-only rather than read it.
+
+        Returns:
+            np.ndarray: The array.
+        """
+        if not os_path.exists(self._file(name)):
+            return np.empty(0, dtype=np.int64)
+        return np.load(self._file(name), mmap_mode=mmap_mode)
+
+    def _save(self, name: str, values: np.ndarray) -> None:
+        """Writes an index array, replacing the previous one at once."""
+        temporary = self._file(name + ".tmp")
+        with open(temporary, "wb") as file:
+            np.save(file, values)
+        replace(temporary, self._file(name))
+
+    def _write(self, name: str, value: object) -> None:
+        """Writes an index JSON file, replacing the previous one at once."""
+        temporary = self._file(name + ".tmp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            dump(value, file)
+        replace(temporary, self._file(name))
+
+    def _read_words(self) -> list[str]|None:
+        """Reads the distinct words of the index.
+
+        Returns:
+            list[str]|None: The words, sorted, or None if the index was built without them.
+        """
+        if not os_path.exists(self._file(WORDS_FILE)):
+            return None
+        with open(self._file(WORDS_FILE), encoding="utf-8") as words_file:
+            return load(words_file)
+
+    def _read_index(self) -> dict[str, list[int]]:
+        """Reads the video numbers of the index.
+
+        Returns:
+            dict[str, list[int]]: The number and upload date of each video.
+        """
+        if not os_path.exists(self._file(INDEX_FILE)):
+            return {}
+        with open(self._file(INDEX_FILE), encoding="utf-8") as index_file:
+            return load(index_file)
+
+    def _file(self, name: str) -> str:
+        return os_path.join(self.directory, name)
+
+PHRASE_INDEX: PhraseIndex|None = PhraseIndex(PHRASE_INDEX_PATH) if PHRASE_INDEX_PATH else None
+
+if __name__ == "__main__":
+    if len(argv) < 3:
+        raise SystemExit("Usage: python phrase_index.py <index directory> <TranscriptDoc JSON file>...")
+    index = PhraseIndex(argv[1])
+    for document_path in argv[2:]:
+        print(f"Indexed {index.append(load_documents(document_path))} documents from {document_path}")
@@ -0,0 +1,86 @@
+"""
+This module compiles a search query once per request into the canonical form shared by every stage.
+
+The word limit, the result cache, the Typesense request and the matcher all read the same compiled
+query, so two queries differing only in case, punctuation or spacing are treated as the same search
+everywhere, and the boundary pattern is compiled once rather than per search call. Quoting is the exception:
+a quoted query asks Typesense for the exact phrase, so it is a different search from the same words unquoted.
+
+Classes:
+- CompiledQuery: A query in canonical form along with its compiled pattern, phrase hash and cache key.
+
+Functions:
+- canonical_tokens(query: str) -> tuple[str, ...]: Lowercases a query, strips it to letters, digits and spaces,
+  and splits it into words.
+- compile_query(query: str) -> CompiledQuery: Compiles a query, reusing the compiled form of recent queries.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from functools import lru_cache
+from hashlib import sha1
+from re import compile, escape, Pattern, IGNORECASE
+from typing import NamedTuple
+
+querytext = compile(r'[^a-z0-9 ]+')
+
+class CompiledQuery(NamedTuple):
+    """A query in canonical form along with everything derived from it.
+
+    Attributes:
+        text (str): The query as sent by the user.
+        tokens (tuple[str, ...]): The lowercased words of the query, stripped to letters and digits.
+        canonical (str): The tokens joined by single spaces, as matched against cleaned sentences.
+        quoted (bool): Whether the user quoted the query, asking Typesense for the exact phrase.
+        pattern (Pattern): The canonical query between word boundaries, used to mark snippets.
+        phrase_hash (int): The hash of the query as sent to Typesense, for deduplicating searches in process.
+        key (str): A stable digest of the query as sent to Typesense, for cache keys shared between instances.
+    """
+    text: str
+    tokens: tuple[str, ...]
+    canonical: str
+    quoted: bool
+    pattern: Pattern
+    phrase_hash: int
+    key: str
+
+    @property
+    def typesense_query(self) -> str:
+        """The query sent to Typesense, quoted for an exact phrase search when the user quoted it."""
+        return f'"{self.canonical}"' if self.quoted else self.canonical
+
+def canonical_tokens(query: str) -> tuple[str, ...]:
+    """Lowercases a query, strips it to letters, digits and spaces, and splits it into words.
+
+    Args:
+        query (str): The query as sent by the user.
+
+    Returns:
+        tuple[str, ...]: The words of the query.
+    """
+    return tuple(querytext.sub("", query.lower()).split())
+
+@lru_cache(maxsize=1024)
+def compile_query(query: str) -> CompiledQuery:
+    """Compiles a query, reusing the compiled form of recent queries.
+
+    Args:
+        query (str): The query as sent by the user.
+
+    Returns:
+        CompiledQuery: The compiled query.
+    """
+    tokens = canonical_tokens(query)
+    canonical = " ".join(tokens)
+    quoted = '"' in query
+    searched = f'"{canonical}"' if quoted else canonical
+    return CompiledQuery(
+        text=query,
+        tokens=tokens,
+        canonical=canonical,
+        quoted=quoted,
+        pattern=compile(r"\b" + escape(canonical) + r"\b", IGNORECASE),
+        phrase_hash=hash(searched),
+        key=sha1(searched.encode("utf-8")).hexdigest(),
+    )
@@ -0,0 +1,130 @@
+"""
+This module picks the best snippets of a video when a search caps the number of snippets per video.
+
+A common word can match hundreds of sentences of a long lecture, and the first few of them are not
+necessarily worth reading. Every matching snippet is scored instead, and a heap bounded to `max_snippets`
+entries keeps the best ones as the matches are read, in O(k) memory. The selected snippets are returned in
+the order they appear in the video.
+
+A snippet is scored on, in order of weight:
+- Phrase completeness: the whole query is found, on word boundaries, inside one of the sentences of the
+  snippet, rather than only across a sentence boundary or as part of longer words.
+- Match density: the share of the words of the snippet taken up by the query.
+- Position: earlier in the video, which only breaks ties between otherwise equal snippets.
+
+The number of snippets matched is counted along the way. When approximate counts are allowed, scanning
+stops once `max_snippets` complete snippets have been found, and the count is then a lower bound. This
+trades ranking for speed: every snippet kept holds the complete phrase, but a later snippet with a higher
+match density may have outranked some of them, so the snippets kept are not always the best ones.
+
+Classes:
+- SnippetSelection: The snippets selected for a video and the number of snippets it matched.
+
+Functions:
+- score_snippet(transcript: list[str], normalized: NormalizedTranscript, snippet_span: tuple[int, int],
+  query_pattern: Pattern, query_length: int) -> tuple[float, bool]: Scores a snippet.
+- select_snippets(spans: Iterable[tuple[int, int]], transcript: list[str], normalized: NormalizedTranscript,
+  query: str, query_pattern: Pattern, max_snippets: int|None, approximate: bool) -> SnippetSelection:
+  Keeps the best snippets of a video.
+
+Global Variables:
+- COMPLETENESS_WEIGHT, DENSITY_WEIGHT, POSITION_WEIGHT: The weight of each part of the score.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from collections.abc import Iterable
+from heapq import heappush, heappushpop
+from re import Pattern
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from search import NormalizedTranscript
+
+# A complete snippet always outranks an incomplete one, whatever their density and position
+COMPLETENESS_WEIGHT = 1.0
+DENSITY_WEIGHT = 0.5
+POSITION_WEIGHT = 0.1
+
+class SnippetSelection(NamedTuple):
+    """The snippets selected for a video and the number of snippets it matched.
+
+    Attributes:
+        spans (list[tuple[int, int]]): The index of each selected sentence and whether it spans 1 or 2
+            sentences, in the order of the transcript.
+        count (int): The number of snippets matched.
+        exact (bool): False if scanning stopped early, making `count` a lower bound.
+    """
+    spans: list[tuple[int, int]]
+    count: int
+    exact: bool
+
+def score_snippet(transcript: list[str], normalized: NormalizedTranscript, snippet_span: tuple[int, int],
+                  query_pattern: Pattern, query_length: int) -> tuple[float, bool]:
+    """Scores a snippet on phrase completeness, match density and position.
+
+    Args:
+        transcript (list[str]): The sentences of the transcript.
+        normalized (NormalizedTranscript): The transcript, cleaned and tokenized.
+        snippet_span (tuple[int, int]): The index of the sentence and whether it spans 1 or 2 sentences.
+        query_pattern (Pattern): The query as a regex pattern.
+        query_length (int): The number of words in the query.
+
+    Returns:
+        tuple[float, bool]: The score, and whether the snippet holds the complete phrase.
+    """
+    index, num_sentences = snippet_span
+    text = transcript[index] if num_sentences == 1 else f"{transcript[index]} {transcript[index + 1]}"
+    occurrences = len(query_pattern.findall(text))
+    words = normalized.offsets[index + num_sentences] - normalized.offsets[index]
+
+    complete = any(query_pattern.search(transcript[sentence]) for sentence in range(index, index + num_sentences))
+    density = min(1.0, occurrences * query_length / words) if words else 0.0
+    position = 1 - index / len(transcript)
+    return COMPLETENESS_WEIGHT * complete + DENSITY_WEIGHT * density + POSITION_WEIGHT * position, complete
+
+def select_snippets(spans: Iterable[tuple[int, int]], transcript: list[str], normalized: NormalizedTranscript,
+                    query: str, query_pattern: Pattern, max_snippets: int|None = None,
+                    approximate: bool = False) -> SnippetSelection:
+    """Keeps the best snippets of a video.
+
+    Args:
+        spans (Iterable[tuple[int, int]]): The matching sentences, in the order of the transcript. Only read
+            as far as needed when `approximate` is set, so it can be produced lazily.
+        transcript (list[str]): The sentences of the transcript.
+        normalized (NormalizedTranscript): The transcript, cleaned and tokenized.
+        query (str): The query without quotes.
+        query_pattern (Pattern): The query as a regex pattern.
+        max_snippets (int|None): The number of snippets to keep, all of them (unscored) if None.
+        approximate (bool): Whether to stop once `max_snippets` complete snippets have been found, keeping
+            complete snippets that may not be the best ones.
+
+    Returns:
+        SnippetSelection: The selected snippets and the number of snippets matched.
+    """
+    if max_snippets is None:
+        spans = list(spans)
+        return SnippetSelection(spans, len(spans), True)
+
+    query_length = len(query.split()) or 1
+    spans = iter(spans)
+    heap: list[tuple[float, int, tuple[int, int]]] = []
+    count = complete_count = 0
+    for snippet_span in spans:
+        count += 1
+        score, complete = score_snippet(transcript, normalized, snippet_span, query_pattern, query_length)
+        # Ties keep the earlier snippet, as the later one compares lower and is popped first
+        entry = (score, -snippet_span[0], snippet_span)
+        if len(heap) < max_snippets:
+            heappush(heap, entry)
+        else:
+            heappushpop(heap, entry)
+
+        complete_count += complete
+        if approximate and complete_count >= max_snippets:
+            # The count is only a lower bound if a match is left unscanned
+            exact = next(spans, None) is None
+            return SnippetSelection(sorted(entry[2] for entry in heap), count + (not exact), exact)
+
+    return SnippetSelection(sorted(entry[2] for entry in heap), count, True)
@@ -7,113 +7,241 @@ to a Google Cloud Pub/Sub topic for further processing.
 
 Functions:
 - init_ydl_client(): Initializes the YT-DLP client for processing YouTube URLs.
-- process_url(url: str) -> dict[str, str|None]: Processes a Universal Reference Link (URL) and returns
+- init_probe_client(): Initializes the YT-DLP client extracting only the newest videos of a channel.
+- process_url(url: str, incremental: bool) -> dict[str, str|None]: Processes a Universal Reference Link (URL) and returns
   a dictionary containing video IDs or channel IDs.
+- process_urls(urls: list[str], incremental: bool) -> tuple[list[dict[str, object]], list[str]]: Ingests many URLs
+  at once, publishing their deduplicated videos together.
+- resolve_url(parsed: ParsedURL, incremental: bool) -> tuple[str|None, list[str]]: Gets the videos of a parsed URL.
+- record_ingest(channel_id: str|None, video_ids: list[str]) -> None: Records the published videos of a channel.
 - get_url_type(url: str) -> URLType: Determines the type of URL (video, playlist, or channel).
 - get_channel_videos(channel_url: str) -> tuple[str, list[str]]: Retrieves video IDs from a channel URL.
+- get_new_channel_videos(channel_url: str) -> tuple[str, list[str]]: Retrieves the video IDs of a channel
+  never published before.
 - get_playlist_videos(playlist_url: str) -> list[str]: Retrieves video IDs from a playlist URL.
-- get_video(url: str) -> str: Extracts the video ID from a video URL.
+- publish_video_ids(video_ids: list[str]) -> int: Publishes video IDs to the Pub/Sub topic in batches.
+
+- init_publisher(): Initializes the Google Cloud Pub/Sub publisher.
 
 Constants:
-- BATCH_SETTINGS: Batch settings for publishing messages to Google Cloud Pub/Sub.
 - YDL_CLIENT: Global variable for the YT-DLP client.
+- PROBE_YDL_CLIENT: Global variable for the YT-DLP client extracting the newest `INGEST_PROBE_SIZE` videos.
 - PUBLISHER: Global variable for the Google Cloud Pub/Sub PublisherClient.
 - TOPIC_PATH: Path to the Google Cloud Pub/Sub topic.
-- URLType: Enum for URL types (VIDEO, PLAYLIST, CHANNEL).
+- URLType: Enum for URL types (VIDEO, PLAYLIST, CHANNEL), from urls.
 
 Imports:
-- Standard Library Imports: re, json
-- Third-Party Imports: yt_dlp, google.cloud.pubsub_v1, google.oauth2.service_account
-- File System Imports: settings, helpers
+- Standard Library Imports: json, concurrent.futures
+- Third-Party Imports: yt_dlp, google.cloud.pubsub_v1, google.oauth2.service_account,
+  imported on first use since they make up most of the cold start of the function
+- File System Imports: settings, cache, helpers, ingest_state, urls
 """
 
 from __future__ import annotations
 
 # Standard Library Imports
-import re
 import json
-from enum import Enum
-
-# Third-Party Imports
-from yt_dlp import YoutubeDL
-from google.cloud.pubsub_v1 import PublisherClient
-from google.cloud.pubsub_v1.types import BatchSettings
-from google.oauth2 import service_account
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
 # File System Imports
-from settings import YDL_OPS, VALID_CHANNEL_REGEX, VALID_PLAYLIST_REGEX, VALID_VIDEO_REGEX
+from settings import (YDL_OPS, SCRAPE_MAX_CONCURRENCY, SCRAPE_PUBLISH_BATCH_SIZE, PUBSUB_MAX_MESSAGES,
+                      PUBSUB_MAX_LATENCY_SECONDS, INGEST_PROBE_SIZE)
+from cache import RESULT_CACHE
 from helpers import debug
+from ingest_state import INGEST_STATE
+from urls import ParsedURL, URLType, parse_url, parse_urls
 
-BATCH_SETTINGS = BatchSettings(
-    max_messages    = 1,    # Publish after 1 message
-    max_latency     = 0,    # Try to publish instantly
-)
+if TYPE_CHECKING:
+    from yt_dlp import YoutubeDL
+    from google.cloud.pubsub_v1 import PublisherClient
 
 YDL_CLIENT: YoutubeDL = None
+PROBE_YDL_CLIENT: YoutubeDL = None
 PUBLISHER: PublisherClient = None
 TOPIC_PATH = None
 
-class URLType(Enum):
-    """Enum for URL types."""
-    VIDEO = 1
-    PLAYLIST = 2
-    CHANNEL = 3
-
 def init_ydl_client():
     """
     Initialize the YT-DLP Client if not already initialized; Uses lazy loading
     """
     global YDL_CLIENT # pylint: disable=global-statement
     if not YDL_CLIENT:
+        from yt_dlp import YoutubeDL # pylint: disable=import-outside-toplevel
         YDL_CLIENT = YoutubeDL(YDL_OPS)
 
-def process_url(url: str) -> dict[str, str|list[str]|None]:
+def init_probe_client():
+    """
+    Initialize the YT-DLP Client extracting only the newest videos of a channel; Uses lazy loading
+    """
+    global PROBE_YDL_CLIENT # pylint: disable=global-statement
+    if not PROBE_YDL_CLIENT:
+        from yt_dlp import YoutubeDL # pylint: disable=import-outside-toplevel
+        PROBE_YDL_CLIENT = YoutubeDL({**YDL_OPS, "playlist_items": f"1-{INGEST_PROBE_SIZE}"})
+
+def init_publisher():
+    """
+    Initialize the Pub/Sub publisher if not already initialized; Uses lazy loading
+    """
+    global PUBLISHER, TOPIC_PATH # pylint: disable=global-statement
+    if PUBLISHER is None:
+        # pylint: disable=import-outside-toplevel
+        from google.cloud.pubsub_v1 import PublisherClient
+        from google.cloud.pubsub_v1.types import BatchSettings
+        from google.oauth2 import service_account
+
+        batch_settings = BatchSettings(
+            max_messages    = PUBSUB_MAX_MESSAGES,          # Publish once this many messages are waiting
+            max_latency     = PUBSUB_MAX_LATENCY_SECONDS,   # or once the oldest has waited this long
+        )
+        cred = service_account.Credentials.from_service_account_file(
+            "credentials_pub_sub.json")
+        PUBLISHER = PublisherClient(credentials=cred, batch_settings=batch_settings)
+        TOPIC_PATH = PUBLISHER.topic_path("ScriptSearch", "Test-Go-Url-Check")
+
+def process_url(url: str, incremental: bool = True) -> dict[str, str|list[str]|None]:
     """
     Takes a Universal Reference Link, 
     determines if the url is a channel or a playlist, 
     and returns 250 most recent videos.
 
+    When the ingest state is kept, a channel only publishes the videos it never published before.
+
     Args:
         url (str): Universsal Reference Link
+        incremental (bool): Whether a channel only publishes its new videos, if the ingest state is kept
 
     Returns:
         dict[str, str|None]: Dictionary containing video IDs or channel IDs.
     """
     debug(f"Processing URL: {url}")
 
-    init_ydl_client()
-    url_type = get_url_type(url)
+    channel_id, video_ids = resolve_url(parse_url(url), incremental)
+    publish_video_ids(video_ids)
+    record_ingest(channel_id, video_ids)
 
-    data: dict[str, str|list[str]|None] = {
-        "video_ids": None,
-        "channel_id": None,
+    return {
+        "video_ids": None if channel_id else video_ids,
+        "channel_id": channel_id,
     }
 
-    video_ids = []
-    match url_type:
-        case URLType.VIDEO:
-            video_id = get_video(url)
-            video_ids.append(video_id)
-            data["video_ids"] = video_ids
+def process_urls(urls: list[str], incremental: bool = True,
+                 max_workers: int = SCRAPE_MAX_CONCURRENCY) -> tuple[list[dict[str, object]], list[str]]:
+    """Ingests many URLs at once, such as a list pasted by the curation team.
+
+    The URLs are deduplicated by their canonical form, and the playlists and channels are extracted
+    concurrently. The videos of every URL are merged into one set and published together, in batches.
+
+    Args:
+        urls (list[str]): The URLs.
+        incremental (bool): Whether channels only publish their new videos, if the ingest state is kept
+        max_workers (int): The maximum number of URLs extracted at once.
+
+    Returns:
+        tuple[list[dict[str, object]], list[str]]: A summary of each URL, in order, with its `status`
+        (ok, duplicate, invalid or failed), and the video IDs published.
+    """
+    debug(f"Processing {len(urls)} URLs")
+
+    summaries: list[dict[str, object]] = []
+    unique: dict[str, int] = {} # The index of the first summary of each canonical URL
+    parsed_urls: dict[int, ParsedURL] = {}
+    for url, parsed in zip(urls, parse_urls(urls)):
+        summary: dict[str, object] = {"url": url, "status": "ok", "type": None, "channel_id": None,
+                                      "video_count": 0, "error": None}
+        if isinstance(parsed, ValueError):
+            summary.update(status="invalid", error=str(parsed))
+        else:
+            summary["type"] = parsed.url_type.name.lower()
+            if parsed.url in unique:
+                summary.update(status="duplicate", duplicate_of=urls[unique[parsed.url]])
+            else:
+                unique[parsed.url] = len(summaries)
+                parsed_urls[len(summaries)] = parsed
+        summaries.append(summary)
+
+    if any(parsed.url_type is not URLType.VIDEO for parsed in parsed_urls.values()):
+        init_ydl_client()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scrape-url") as executor:
+        futures = {index: executor.submit(resolve_url, parsed, incremental) for index, parsed in parsed_urls.items()}
+
+    resolved: list[tuple[str|None, list[str]]] = []
+    for index, future in futures.items():
+        try:
+            channel_id, video_ids = future.result()
+        except Exception as e: # pylint: disable=broad-except
+            summaries[index].update(status="failed", error=str(e))
+            continue
+        summaries[index].update(channel_id=channel_id, video_count=len(video_ids))
+        resolved.append((channel_id, video_ids))
+
+    video_ids = list(dict.fromkeys(video_id for _, ids in resolved for video_id in ids))
+    publish_video_ids(video_ids)
+    for channel_id, ids in resolved:
+        record_ingest(channel_id, ids)
+
+    return summaries, video_ids
+
+def resolve_url(parsed: ParsedURL, incremental: bool = True) -> tuple[str|None, list[str]]:
+    """Gets the videos of a parsed URL.
+
+    Args:
+        parsed (ParsedURL): The URL.
+        incremental (bool): Whether a channel only gets its new videos, if the ingest state is kept
+
+    Returns:
+        tuple[str|None, list[str]]: The channel ID, if the URL is a channel, and the video IDs.
+    """
+    match parsed.url_type:
+        case URLType.VIDEO: # The id is read from the URL, without asking YouTube
+            return None, [parsed.identifier]
 
         case URLType.PLAYLIST:
-            video_ids = get_playlist_videos(url)
-            data["video_ids"] = video_ids
-        
-        case URLType.CHANNEL:
-            data["channel_id"], video_ids = get_channel_videos(url)
-        
-    global PUBLISHER, TOPIC_PATH # pylint: disable=global-statement
-    if PUBLISHER is None:
-        cred = service_account.Credentials.from_service_account_file(
-            "credentials_pub_sub.json")
-        PUBLISHER = PublisherClient(credentials=cred, batch_settings=BATCH_SETTINGS)
-        TOPIC_PATH = PUBLISHER.topic_path("ScriptSearch", "Test-Go-Url-Check")
-    
-    byteString = json.dumps(video_ids).encode("utf-8")
-    PUBLISHER.publish(TOPIC_PATH, data=byteString) # We don't really need result from this I believe
+            init_ydl_client()
+            return None, get_playlist_videos(parsed.url)
+
+        case URLType.CHANNEL if incremental and INGEST_STATE is not None:
+            init_ydl_client()
+            return get_new_channel_videos(parsed.url)
+
+        case _:
+            init_ydl_client()
+            return get_channel_videos(parsed.url)
+
+def record_ingest(channel_id: str|None, video_ids: list[str]) -> None:
+    """Records the published videos of a channel and drops its cached search results.
+
+    Args:
+        channel_id (str|None): The channel ID, or None if the videos are not a channel's.
+        video_ids (list[str]): The published video IDs.
+    """
+    if not channel_id:
+        return
+    if INGEST_STATE is not None:
+        INGEST_STATE.mark(channel_id, video_ids)
+    RESULT_CACHE.invalidate_channel(channel_id)
 
-    return data
+def publish_video_ids(video_ids: list[str], batch_size: int = SCRAPE_PUBLISH_BATCH_SIZE) -> int:
+    """Publishes video IDs to the Pub/Sub topic, a batch of them per message.
+
+    The messages are sent together by the publisher, so a channel takes a few requests rather than one
+    per message, and the consumers can start on the first batch while the others are processed.
+
+    Args:
+        video_ids (list[str]): The video IDs.
+        batch_size (int): The number of video IDs per message.
+
+    Returns:
+        int: The number of messages published.
+    """
+    init_publisher()
+    futures = []
+    for batch_start in range(0, len(video_ids), batch_size):
+        byteString = json.dumps(video_ids[batch_start:batch_start + batch_size]).encode("utf-8")
+        futures.append(PUBLISHER.publish(TOPIC_PATH, data=byteString))
+    for future in futures: # Surface publishing errors instead of losing the videos silently
+        future.result()
+    return len(futures)
 
 def get_url_type(url: str) -> URLType:
     """Determines the URL type.
@@ -125,25 +253,20 @@ def get_url_type(url: str) -> URLType:
         URLType: The type of video.
     """
 
-    if re.search(VALID_VIDEO_REGEX, url):
-        return URLType.VIDEO
-    if re.search(VALID_PLAYLIST_REGEX, url):
-        return URLType.PLAYLIST
-    if re.search(VALID_CHANNEL_REGEX, url):
-        return URLType.CHANNEL
-    raise ValueError(f"Invalid URL: {url}")
+    return parse_url(url).url_type
 
-def get_channel_videos(channel_url: str) -> tuple[str, list[str]]:
+def get_channel_videos(channel_url: str, client: YoutubeDL|None = None) -> tuple[str, list[str]]:
     """Get the video urls from a channel.
 
     Args:
         channel_url (str): The channel URL.
+        client (YoutubeDL|None): The client extracting the videos, YDL_CLIENT if None.
 
     Returns:
         List[str]: The video URLs.
     """
 
-    channel = YDL_CLIENT.extract_info(channel_url, download=False)
+    channel = (client or YDL_CLIENT).extract_info(channel_url, download=False)
 
     if not channel["entries"]:
         raise ValueError(f"Channel {channel_url} has no videos.")
@@ -156,29 +279,39 @@ def get_channel_videos(channel_url: str) -> tuple[str, list[str]]:
 
     return channel["channel_id"], video_ids
 
-def get_playlist_videos(playlist_url: str) -> list[str]:
-    """Get the video urls from a playlist.
+def get_new_channel_videos(channel_url: str) -> tuple[str, list[str]]:
+    """Get the video urls of a channel that were never published before.
+
+    The newest videos are extracted first. Reaching a known video means every older one was already
+    published, so the rest of the channel is only walked when none of them is known.
 
     Args:
-        playlist_url (str): The playlist URL.
+        channel_url (str): The channel URL.
 
     Returns:
-        list[str]: The video URLs.
+        tuple[str, list[str]]: The channel ID and its new video URLs, newest first.
     """
 
-    playlist = YDL_CLIENT.extract_info(playlist_url, download=False)
-    return [entry["id"] for entry in playlist["entries"]]
+    init_probe_client()
+    channel_id, video_ids = get_channel_videos(channel_url, PROBE_YDL_CLIENT)
+    new_video_ids = INGEST_STATE.unseen(channel_id, video_ids)
 
+    if len(new_video_ids) == len(video_ids) == INGEST_PROBE_SIZE:
+        channel_id, video_ids = get_channel_videos(channel_url)
+        new_video_ids = INGEST_STATE.unseen(channel_id, video_ids)
 
-def get_video(url: str) -> str:
-    """Get the video ID from a URL.
+    debug(f"Channel {channel_id} has {len(new_video_ids)} new videos.")
+    return channel_id, new_video_ids
+
+def get_playlist_videos(playlist_url: str) -> list[str]:
+    """Get the video urls from a playlist.
 
     Args:
-        url (str): The URL
+        playlist_url (str): The playlist URL.
 
     Returns:
-        str: The video ID
+        list[str]: The video URLs.
     """
-    info = YDL_CLIENT.extract_info(url, download=False)
-    return info["id"]
 
+    playlist = YDL_CLIENT.extract_info(playlist_url, download=False)
+    return [entry["id"] for entry in playlist["entries"]]
@@ -0,0 +1,144 @@
+"""
+This module runs scrape requests in the background, so a large channel does not hold up a request worker.
+
+Submitting a URL checks its type and returns a job straight away. The job waits for one of a bounded number
+of workers, which extracts the videos and publishes them to Pub/Sub in batches. Its status can be polled
+until it is done or failed. Jobs are kept in memory by the instance that accepted them, and are dropped
+once they have been finished for `SCRAPE_JOB_RETENTION_SECONDS`.
+
+Classes:
+- ScrapeJob: A URL being scraped in the background, with its status and result.
+- ScrapeJobs: Runs scrape jobs on a bounded pool of workers and keeps them for status requests.
+
+Global Variables:
+- SCRAPE_JOBS: The scrape jobs of the instance.
+
+Dependencies:
+- scrape: Extracts the videos of a URL and publishes them
+- settings: The number of workers and how long finished jobs are kept
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+from time import monotonic, time
+from uuid import uuid4
+
+# File System Imports
+from helpers import debug
+from scrape import get_url_type, process_url
+from settings import SCRAPE_MAX_CONCURRENCY, SCRAPE_JOB_RETENTION_SECONDS
+
+class ScrapeJob:
+    """A URL being scraped in the background, with its status and result.
+
+    Args:
+        url (str): The URL to scrape.
+        incremental (bool): Whether a channel only publishes its new videos.
+    """
+
+    def __init__(self, url: str, incremental: bool = True) -> None:
+        self.job_id = uuid4().hex
+        self.url = url
+        self.incremental = incremental
+        self.status = "queued"
+        self.channel_id: str|None = None
+        self.video_ids: list[str]|None = None
+        self.error: str|None = None
+        self.submitted_at = time()
+        self.finished_at: float|None = None
+        self.done = Event()
+
+    def as_dict(self) -> dict[str, object]:
+        """Gets the job for a response.
+
+        Returns:
+            dict[str, object]: The id, URL, status and result of the job.
+        """
+        return {
+            "job_id": self.job_id,
+            "url": self.url,
+            "status": self.status,
+            "channel_id": self.channel_id,
+            "video_ids": self.video_ids,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+        }
+
+class ScrapeJobs:
+    """Runs scrape jobs on a bounded pool of workers and keeps them for status requests.
+
+    Args:
+        max_workers (int): The maximum number of URLs scraped at once.
+        retention_seconds (float): The number of seconds a finished job is kept.
+    """
+
+    def __init__(self, max_workers: int = SCRAPE_MAX_CONCURRENCY,
+                 retention_seconds: float = SCRAPE_JOB_RETENTION_SECONDS) -> None:
+        self.retention_seconds = retention_seconds
+        self._jobs: dict[str, ScrapeJob] = {}
+        self._finished: dict[str, float] = {}
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scrape-job")
+
+    def submit(self, url: str, incremental: bool = True) -> ScrapeJob:
+        """Starts scraping a URL in the background.
+
+        Args:
+            url (str): The URL to scrape.
+            incremental (bool): Whether a channel only publishes its new videos.
+
+        Returns:
+            ScrapeJob: The queued job.
+
+        Raises:
+            ValueError: If the URL is not a video, playlist or channel URL.
+        """
+        get_url_type(url)
+        job = ScrapeJob(url, incremental)
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job)
+        debug(f"Queued scrape job {job.job_id} for {url}")
+        return job
+
+    def get(self, job_id: str) -> ScrapeJob|None:
+        """Gets a job.
+
+        Args:
+            job_id (str): The id of the job.
+
+        Returns:
+            ScrapeJob|None: The job, or None if it is unknown or was dropped.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: ScrapeJob) -> None:
+        """Scrapes the URL of a job, recording its result or error."""
+        job.status = "running"
+        try:
+            result = process_url(job.url, job.incremental)
+            job.channel_id, job.video_ids = result["channel_id"], result["video_ids"]
+            job.status = "done"
+        except Exception as e: # pylint: disable=broad-except
+            debug(f"Scrape job {job.job_id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        job.finished_at = time()
+        with self._lock:
+            self._finished[job.job_id] = monotonic()
+        job.done.set()
+
+    def _prune(self) -> None:
+        """Drops the jobs finished longer ago than the retention period. Called with the lock held."""
+        cutoff = monotonic() - self.retention_seconds
+        for job_id in [job_id for job_id, finished in self._finished.items() if finished < cutoff]:
+            del self._finished[job_id]
+            self._jobs.pop(job_id, None)
+
+SCRAPE_JOBS = ScrapeJobs()
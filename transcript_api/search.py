@@ -5,69 +5,349 @@ It includes functions for initializing the Typesense client, searching for queri
 finding indexes of words or phrases in the transcript, and marking specific words within a sentence.
 
 Dependencies:
-- typesense.Client: a Python client for the Typesense API
+- backends.create_backend: the search backend, the Typesense nodes or the in-process engine
 - helpers.debug: a function for debugging purposes
 - settings.MAX_QUERY_WORD_LIMIT: the maximum number of words allowed in a query
-- settings.TYPESENSE_HOST: the host URL for the Typesense server
-- settings.TYPESENSE_API_KEY: the API key for accessing the Typesense server
+- settings.TRANSCRIPT_CACHE_MAX_BYTES: the byte budget of the normalized transcript cache
+- cache.LRUCache: the cache holding normalized transcripts between searches
+- matcher: the single pass phrase matcher over tokenized transcripts
+- batch_matcher: the vectorized matcher over every hit of a search at once, imported only when batch matching is on
+- settings.BATCH_MATCHING: whether hits are matched together by the batch matcher
+- settings.TWO_PHASE_SEARCH: whether transcripts are fetched separately, only for the hits being processed
+- settings.DOCUMENT_CACHE_MAX_BYTES: the byte budget of the cache of transcripts fetched separately
+- transcript_store.TRANSCRIPT_STORE: the local transcript store read before fetching transcripts from Typesense
+- phrase_index.PHRASE_INDEX: the phrase index dropping the hits without a multi-word query before their transcripts are fetched,
+  imported only when settings.PHRASE_INDEX_PATH is set
+- pagination.Pagination: the page and snippet cap of a search
+- ranking.select_snippets: keeps the best snippets of each video when they are capped
+- query.compile_query: the canonical form and boundary pattern of the query, compiled once per request
+- metrics.span: times the Typesense requests and the matching of each hit
+- hit_pool: the worker processes matching the hits of large searches, when enabled
 """
 
 from __future__ import annotations
 
 # Standard Library Imports
-from re import compile, escape, search, Match, Pattern, IGNORECASE
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from re import compile, search, Match, Pattern
 from time import perf_counter
-from collections.abc import Generator
-
-# Third Party Imports
-from typesense import Client
+from collections.abc import Generator, Iterator
+from sys import getsizeof
+from typing import NamedTuple
 
 # File System Imports
+from backends import SearchBackend, create_backend
+from cache import LRUCache, sizeof_strings
 from helpers import debug
-from settings import TYPESENSE_HOST, TYPESENSE_API_KEY 
-
-TYPESENSE_CLIENT: Client = None
+from hit_pool import pool_enabled, process_hits_in_pool
+from metrics import span
+from matcher import is_canonical, iter_match_sentences, match_sentences, tokenize
+from pagination import Pagination
+from query import CompiledQuery, compile_query
+from ranking import select_snippets
+from transcript_store import TRANSCRIPT_STORE
+from settings import (TRANSCRIPT_CACHE_MAX_BYTES, DOCUMENT_CACHE_MAX_BYTES, BATCH_MATCHING, TWO_PHASE_SEARCH, PLAYLIST_MAX_SHARDS,
+                      PHRASE_INDEX_PATH)
+
+# NumPy is only imported when the phrase index is configured
+PHRASE_INDEX = None
+if PHRASE_INDEX_PATH:
+    from phrase_index import PHRASE_INDEX
+
+TYPESENSE_CLIENT: SearchBackend = None
+SEARCH_EXECUTOR: ThreadPoolExecutor = None
 cleantext = compile(r'[^a-z0-9 ]+')
 
+class NormalizedTranscript(NamedTuple):
+    """A transcript preprocessed for matching.
+
+    Attributes:
+        sentences (list[str]): The sentences lowercased and stripped by `cleantext`.
+        words (list[str]): Every sentence split on single spaces, flattened in order.
+        offsets (array): Index in `words` where each sentence starts, followed by `len(words)`.
+        hashes (array): The hash of every word, used by the batch matcher.
+    """
+    sentences: list[str]
+    words: list[str]
+    offsets: array
+    hashes: array
+
+def sizeof_normalized(normalized: NormalizedTranscript) -> int:
+    """Estimate the bytes held by a normalized transcript.
+
+    Args:
+        normalized (NormalizedTranscript): The normalized transcript.
+
+    Returns:
+        int: The approximate number of bytes held by the normalized transcript.
+    """
+    return (sizeof_strings(normalized.sentences) + sizeof_strings(normalized.words)
+            + getsizeof(normalized.sentences) + getsizeof(normalized.words)
+            + getsizeof(normalized.offsets) + getsizeof(normalized.hashes))
+
+TRANSCRIPT_CACHE = LRUCache(TRANSCRIPT_CACHE_MAX_BYTES, sizeof_normalized)
+DOCUMENT_CACHE = LRUCache(DOCUMENT_CACHE_MAX_BYTES, lambda content: sizeof_strings(content[0]) + getsizeof(content[1]) * 2)
+TRANSCRIPT_FIELDS = "transcript,timestamps"
+
 def init_typesense() -> None:
     """
-    Initializes the typesense client.
+    Initializes the search backend set by `SEARCH_BACKEND`, Typesense by default.
     """
 
     global TYPESENSE_CLIENT  # pylint: disable=global-statement
     if not TYPESENSE_CLIENT:
-        TYPESENSE_CLIENT = Client({
-            "nodes": [{
-                "host": TYPESENSE_HOST,
-                "port": 443,
-                "protocol": "https"
-            }],
-            "api_key": TYPESENSE_API_KEY,
-            "connection_timeout_seconds": 4
-        })
-
-def search_playlist(search_requests: dict[str, list[dict[str, str]]], query_params: dict[str, object]) -> list[dict[str, str]]:
+        TYPESENSE_CLIENT = create_backend()
+
+def init_executor() -> None:
+    """
+    Initializes the thread pool that sends playlist shards to Typesense concurrently.
+    """
+
+    global SEARCH_EXECUTOR  # pylint: disable=global-statement
+    if not SEARCH_EXECUTOR:
+        SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=PLAYLIST_MAX_SHARDS, thread_name_prefix="typesense")
+
+def search_playlist(search_requests: dict[str, list[dict[str, str]]], query_params: dict[str, object],
+                    pagination: Pagination|None = None, summary: dict[str, int]|None = None,
+                    query: CompiledQuery|None = None) -> list[dict[str, str]]:
     """Searches for a query in the playlist data.
 
+    Every search request is sent as its own Typesense request, concurrently, and the hits of each are
+    processed as soon as they arrive. The results are then ordered by upload date, newest first.
+
     Args:
         search_requests (dict[str, list[dict[str, str]]]): The search requests to use when searching.
         query_params (dict[str, object]): The query params to use when searching.
+        pagination (Pagination|None): The page of the playlist to return and the snippet cap per video.
+        summary (dict[str, int]|None): Filled with the number of videos Typesense `found`.
+        query (CompiledQuery|None): The compiled query, compiled from the first search request if None.
 
     Returns:
         list[dict[str, str]]: The search results.
     """
 
+    result = list(stream_playlist(search_requests, query_params, None, pagination, summary, query))
+    result.sort(key=lambda data: data["upload_date"], reverse=True)
+    return result
+
+def stream_playlist(search_requests: dict[str, list[dict[str, str]]], query_params: dict[str, object],
+                    chunk_size: int|None = None, pagination: Pagination|None = None,
+                    summary: dict[str, int]|None = None,
+                    query: CompiledQuery|None = None) -> Iterator[dict[str, str | list[dict[str, str | int]]]]:
+    """Searches for a query in the playlist data, yielding results in the order the shards arrive.
+
+    The requests are sent before this returns; a shard that fails raises while iterating.
+    When a page size is given, every shard is awaited and only the hits of the requested page,
+    across all shards and newest first, are processed.
+
+    Args:
+        search_requests (dict[str, list[dict[str, str]]]): The search requests to use when searching.
+        query_params (dict[str, object]): The query params to use when searching.
+        chunk_size (int|None): The number of hits processed together before their results are yielded.
+        pagination (Pagination|None): The page of the playlist to return and the snippet cap per video.
+        summary (dict[str, int]|None): Filled with the number of videos Typesense `found` once every shard arrived.
+        query (CompiledQuery|None): The compiled query, compiled from the first search request if None.
+
+    Returns:
+        Iterator[dict[str, str|list[dict[str, str|int]]]]: The search results.
+    """
+
     debug(f"Searching for {search_requests['searches'][0]['q']} in playlists.")
 
+    pagination = pagination or Pagination()
+    summary = summary if summary is not None else {}
     init_typesense()
-    responses = TYPESENSE_CLIENT.multi_search.perform(search_requests, query_params)
+    init_executor()
+    query = query or compile_query(search_requests["searches"][0]["q"])
+    query_params = metadata_params(query_params) if two_phase(query) else query_params
+    futures = [SEARCH_EXECUTOR.submit(copy_context().run, perform_shard, search, dict(query_params))
+               for search in search_requests["searches"]]
+
+    return iter_shards(futures, query.canonical, query.pattern, chunk_size, pagination, summary)
+
+def perform_shard(search_request: dict[str, str], query_params: dict[str, object]) -> dict[str, list[dict]]:
+    """Sends a single shard of a playlist search to Typesense.
+
+    Args:
+        search_request (dict[str, str]): The search request of the shard.
+        query_params (dict[str, object]): The query params common to every shard.
+
+    Returns:
+        dict[str, list[dict]]: The multi search response holding the results of the shard.
+    """
+    with span("typesense_request"):
+        return TYPESENSE_CLIENT.multi_search({"searches": [search_request]}, query_params)
+
+def iter_shards(futures: list[Future], query_no_quotes: str, query_pattern: Pattern, chunk_size: int|None,
+                pagination: Pagination, summary: dict[str, int]) -> Iterator[dict[str, str | list[dict[str, str | int]]]]:
+    """Yields the results of every shard of a playlist search as soon as the shard arrives.
+
+    Args:
+        futures (list[Future]): The pending Typesense requests of the shards
+        query_no_quotes (str): The query without quotes
+        query_pattern (Pattern): The query as a regex pattern
+        chunk_size (int|None): The number of hits processed together before their results are yielded
+        pagination (Pagination): The page of the playlist to return and the snippet cap per video
+        summary (dict[str, int]): Filled with the number of videos Typesense `found`
+
+    Returns:
+        Iterator[dict[str, str|list[dict[str, str|int]]]]: The search results.
+    """
+    summary["found"] = 0
+    page_hits = []
+    try:
+        for future in as_completed(futures):
+            response = future.result()["results"][0]
+            if "error" in response:
+                raise ValueError(response["error"])
+            summary["found"] += response.get("found", len(response["hits"]))
+            if pagination.page_size:
+                page_hits.extend(response["hits"])
+            else:
+                yield from iter_results(response["hits"], query_no_quotes, query_pattern, chunk_size, pagination.max_snippets,
+                                        pagination.snippet_format, pagination.approximate_counts)
+    finally:
+        for future in futures:
+            future.cancel()
+
+    if pagination.page_size:
+        page_hits.sort(key=lambda hit: hit["document"]["upload_date"], reverse=True)
+        page_start = (pagination.page - 1) * pagination.page_size
+        page_hits = page_hits[page_start:page_start + pagination.page_size]
+        yield from iter_results(page_hits, query_no_quotes, query_pattern, chunk_size, pagination.max_snippets,
+                                pagination.snippet_format, pagination.approximate_counts)
+
+    debug(f"Transcript cache: {TRANSCRIPT_CACHE.stats()}")
+
+def search_typesense(query_params: dict[str, object], pagination: Pagination|None = None,
+                     summary: dict[str, int]|None = None,
+                     query: CompiledQuery|None = None) -> list[dict[str, str | list[dict[str, str | int]]]]:
+    """Searches for a query in the transcript data.
 
-    cleaned_query = cleantext.sub("", search_requests["searches"][0]["q"]).lower()
-    query_pattern = compile(r"\b" + escape(cleaned_query) + r"\b", IGNORECASE)
+    Args:
+        query_params (dict[str, str|int|bool]): The query params to use when searching.
+        pagination (Pagination|None): The snippet cap per video; the page itself is set in the query params.
+        summary (dict[str, int]|None): Filled with the number of videos Typesense `found`.
+        query (CompiledQuery|None): The compiled query, compiled from the `q` param if None.
+
+    Returns:
+        list[dict[str, str|list[dict[str, str|int]]]]: The search results.
+    """
 
-    result = []
-    for response in responses["results"]:
-        for hit in response["hits"]:
+    result = list(stream_typesense(query_params, None, pagination, summary, query))
+
+    debug(f"Transcript cache: {TRANSCRIPT_CACHE.stats()}")
+    return result
+
+def stream_typesense(query_params: dict[str, object], chunk_size: int|None = None, pagination: Pagination|None = None,
+                     summary: dict[str, int]|None = None,
+                     query: CompiledQuery|None = None) -> Iterator[dict[str, str | list[dict[str, str | int]]]]:
+    """Searches for a query in the transcript data, yielding results as their hits are processed.
+
+    The Typesense request is made before this returns, so its errors are raised here rather than while iterating.
+
+    Args:
+        query_params (dict[str, str|int|bool]): The query params to use when searching.
+        chunk_size (int|None): The number of hits processed together before their results are yielded.
+        pagination (Pagination|None): The snippet cap per video; the page itself is set in the query params.
+        summary (dict[str, int]|None): Filled with the number of videos Typesense `found`.
+        query (CompiledQuery|None): The compiled query, compiled from the `q` param if None.
+
+    Returns:
+        Iterator[dict[str, str|list[dict[str, str|int]]]]: The search results.
+    """
+
+    debug(f"Searching for {query_params['q']} in transcripts.")
+
+    init_typesense()
+    query = query or compile_query(str(query_params["q"]))
+    query_params = metadata_params(query_params) if two_phase(query) else query_params
+    
+    start = perf_counter()
+    with span("typesense_request"):
+        response = TYPESENSE_CLIENT.search(query_params)
+    end = perf_counter()
+    debug(f"Search took {end - start} seconds.")
+
+    if summary is not None:
+        summary["found"] = response.get("found", len(response["hits"]))
+
+    pagination = pagination or Pagination()
+    return iter_results(response["hits"], query.canonical, query.pattern, chunk_size, pagination.max_snippets,
+                        pagination.snippet_format, pagination.approximate_counts)
+
+def search_batch(search_requests: dict[str, list[dict[str, object]]], query_params: dict[str, object],
+                 queries: list[CompiledQuery], paginations: list[Pagination],
+                 summaries: list[dict[str, int]]) -> list[list[dict[str, str | list[dict[str, str | int]]]] | ValueError]:
+    """Searches for several queries in a single Typesense request.
+
+    Args:
+        search_requests (dict[str, list[dict[str, object]]]): One search request per query, under `searches`.
+        query_params (dict[str, object]): The query params common to every search.
+        queries (list[CompiledQuery]): The compiled query of each search.
+        paginations (list[Pagination]): The snippet cap and format of each search; the page itself is set in its
+            search request.
+        summaries (list[dict[str, int]]): Filled with the number of videos Typesense `found` for each search.
+
+    Returns:
+        list[list[dict[str, str|list[dict[str, str|int]]]] | ValueError]: The results of each search,
+        or the error Typesense returned for it.
+    """
+
+    debug(f"Searching for {len(queries)} queries in one request.")
+
+    init_typesense()
+    query_params = metadata_params(query_params) if any(two_phase(query) for query in queries) else query_params
+
+    start = perf_counter()
+    with span("typesense_request"):
+        response = TYPESENSE_CLIENT.multi_search(search_requests, query_params)
+    end = perf_counter()
+    debug(f"Batch search took {end - start} seconds.")
+
+    results = []
+    for result, query, pagination, summary in zip(response["results"], queries, paginations, summaries):
+        if "error" in result:
+            results.append(ValueError(result["error"]))
+            continue
+        summary["found"] = result.get("found", len(result["hits"]))
+        results.append(list(iter_results(result["hits"], query.canonical, query.pattern, None, pagination.max_snippets,
+                                         pagination.snippet_format, pagination.approximate_counts)))
+    return results
+
+def iter_results(hits: list[dict], query_no_quotes: str, query_pattern: Pattern, chunk_size: int|None = None,
+                 max_snippets: int|None = None, snippet_format: str = "marked",
+                 approximate_counts: bool = False) -> Iterator[dict[str, str | list[dict[str, str | int]]]]:
+    """Yields the search results for the hits that have at least one match.
+
+    In the `indexed` snippet format, each result also holds the text of the sentences its snippets refer to,
+    by sentence index. When the snippets are capped, each result also holds the number of snippets the video
+    matched, as `snippet_count`, and whether that number is exact, as `snippet_count_exact`.
+
+    Args:
+        hits (list[dict]): The hits returned by Typesense
+        query_no_quotes (str): The query without quotes
+        query_pattern (Pattern): The query as a regex pattern
+        chunk_size (int|None): The number of hits processed together before their results are yielded,
+            all of them at once if None
+        max_snippets (int|None): The best snippets kept per video, all of them if None
+        snippet_format (str): How the matches within each snippet are shown
+        approximate_counts (bool): Whether scanning a video can stop once enough complete snippets are found
+
+    Returns:
+        Iterator[dict[str, str|list[dict[str, str|int]]]]: The search results.
+    """
+    hits = drop_phrase_misses(hits, query_no_quotes)
+    chunk_size = chunk_size or len(hits) or 1
+    for chunk_start in range(0, len(hits), chunk_size):
+        chunk = hits[chunk_start:chunk_start + chunk_size]
+        fetch_transcripts(chunk)
+        counts: list[tuple[int, bool]] = []
+        chunk_matches = process_hits(chunk, query_no_quotes, query_pattern, max_snippets, snippet_format,
+                                     approximate_counts, counts)
+        for hit, matches, (snippet_count, exact) in zip(chunk, chunk_matches, counts):
             data = {
                 "video_id": hit["document"]["id"],
                 "title": hit["document"]["title"],
@@ -75,107 +355,356 @@ def search_playlist(search_requests: dict[str, list[dict[str, str]]], query_para
                 "channel_name": hit["document"]["channel_name"],
                 "duration": hit["document"]["duration"],
                 "upload_date": hit["document"]["upload_date"],
-                "matches": process_hit(hit, cleaned_query, query_pattern)
+                "matches": matches
             }
+            if snippet_format == "indexed":
+                transcript = hit["document"]["transcript"]
+                data["sentences"] = {str(index): transcript[index] for match in matches
+                                     for index in range(match["sentence"], match["sentence"] + match["length"])}
+            if max_snippets is not None:
+                data["snippet_count"], data["snippet_count_exact"] = snippet_count, exact
 
             if data["matches"]:
-                result.append(data)
-    return result
+                yield data
 
-def search_typesense(query_params: dict[str, object]) -> list[dict[str, str | list[dict[str, str | int]]]]:
-    """Searches for a query in the transcript data.
+def two_phase(query: CompiledQuery) -> bool:
+    """Checks whether a search fetches the metadata of its hits first, and their transcripts separately.
+
+    Searches are two-phase when configured to be, and for multi-word queries when the phrase index is set up,
+    so the hits it knows do not contain the phrase are dropped before their transcripts are fetched.
 
     Args:
-        query_params (dict[str, str|int|bool]): The query params to use when searching.
+        query (CompiledQuery): The compiled query.
 
     Returns:
-        list[dict[str, str|list[dict[str, str|int]]]]: The search results.
+        bool: True if the transcripts are left out of the Typesense search.
     """
+    return TWO_PHASE_SEARCH or (PHRASE_INDEX is not None and len(query.tokens) > 1)
 
-    debug(f"Searching for {query_params['q']} in transcripts.")
+def drop_phrase_misses(hits: list[dict], query_no_quotes: str) -> list[dict]:
+    """Drops the hits the phrase index knows do not contain a multi-word query.
+
+    Typesense matches the words of a query independently, so without this a phrase search carries every hit
+    holding its words in any order. Hits missing from the index, or indexed with another upload date, are kept.
+
+    Args:
+        hits (list[dict]): The hits returned by Typesense
+        query_no_quotes (str): The query without quotes
+
+    Returns:
+        list[dict]: The hits that may contain the query, in order
+    """
+    # Queries the matcher searches sentence by sentence may match across the spacing the index splits on
+    if PHRASE_INDEX is None or not is_canonical(query_no_quotes):
+        return hits
+    found = PHRASE_INDEX.lookup(query_no_quotes.split())
+    if found is None:
+        return hits
+    return [hit for hit in hits if not isinstance(hit["document"], dict) or hit["document"]["id"] in found
+            or not PHRASE_INDEX.indexed(hit["document"]["id"], hit["document"].get("upload_date"))]
+
+def metadata_params(query_params: dict[str, object]) -> dict[str, object]:
+    """Builds the query params of the first phase of a two-phase search, which leaves out the transcripts.
+
+    Args:
+        query_params (dict[str, object]): The query params to use when searching.
+
+    Returns:
+        dict[str, object]: The query params, excluding the transcript and timestamps from the hits.
+    """
+    return {**query_params, "exclude_fields": TRANSCRIPT_FIELDS}
+
+def fetch_transcripts(hits: list[dict]) -> None:
+    """Fills in the transcript and timestamps of hits returned without them, for the second phase of a search.
+
+    Transcripts are read from the local transcript store or the document cache when possible, and the rest
+    are fetched from Typesense in a single request. Hits whose transcript cannot be found are given an empty one.
+
+    Args:
+        hits (list[dict]): The hits returned by Typesense
+    """
+    missing = {}
+    for hit in hits:
+        document = hit["document"]
+        if not isinstance(document, dict) or "transcript" in document:
+            continue
+
+        content = TRANSCRIPT_STORE.get(document["id"], document.get("upload_date")) if TRANSCRIPT_STORE is not None else None
+        if content is None:
+            content = DOCUMENT_CACHE.get((document["id"], document.get("upload_date")))
+        if content is None:
+            missing[document["id"]] = document
+        else:
+            document["transcript"], document["timestamps"] = content
+
+    if not missing:
+        return
 
-    init_typesense()
-    
     start = perf_counter()
-    response = TYPESENSE_CLIENT.collections["transcripts"].documents.search(query_params)
+    with span("typesense_fetch"):
+        response = TYPESENSE_CLIENT.multi_search({"searches": [{
+        "collection": "transcripts",
+        "q": "*",
+        "filter_by": f"id:[{','.join(missing)}]",
+        "include_fields": f"id,{TRANSCRIPT_FIELDS}",
+        "per_page": len(missing),
+    }]}, {})["results"][0]
     end = perf_counter()
-    debug(f"Search took {end - start} seconds.")
+    debug(f"Fetching {len(missing)} transcripts took {end - start} seconds.")
+
+    if "error" in response:
+        raise ValueError(response["error"])
 
-    cleaned_query = cleantext.sub("", str(query_params["q"])).lower()
-    query_pattern = compile(r"\b" + escape(cleaned_query) + r"\b", IGNORECASE)
-    result = []
     for hit in response["hits"]:
-        data = {
-            "video_id": hit["document"]["id"],
-            "title": hit["document"]["title"],
-            "channel_id": hit["document"]["channel_id"],
-            "channel_name": hit["document"]["channel_name"],
-            "duration": hit["document"]["duration"],
-            "upload_date": hit["document"]["upload_date"],
-            "matches": process_hit(hit, cleaned_query, query_pattern)
-        }
-
-        if data["matches"]:
-            result.append(data)
+        document = missing.get(hit["document"]["id"])
+        if document is not None:
+            document["transcript"], document["timestamps"] = hit["document"]["transcript"], hit["document"]["timestamps"]
+            DOCUMENT_CACHE.put((document["id"], document.get("upload_date")), (document["transcript"], document["timestamps"]))
+
+    for document in missing.values():
+        document.setdefault("transcript", [])
+        document.setdefault("timestamps", [])
+
+def process_hits(hits: list[dict], query_no_quotes: str, query_pattern: Pattern, max_snippets: int|None = None,
+                 snippet_format: str = "marked", approximate_counts: bool = False,
+                 counts: list[tuple[int, bool]]|None = None) -> list[list[dict[str, str]]]:
+    """
+    Processes every hit, matching them all at once with the batch matcher when enabled.
 
-    return result
+    Searches with enough hits are processed across the worker processes of the hit pool, when enabled.
+    The batch matcher finds every match of every hit at once, so its counts are always exact.
 
-def process_hit(hit: dict[str, int|list[dict[str, str|list[str]]]|dict[str, list[str]]], query_no_quotes: str, query_pattern: Pattern) -> list[dict[str, str]]:
+    Args:
+        hits (list[dict]): The hits returned by Typesense
+        query_no_quotes (str): The query without quotes
+        query_pattern (Pattern): The query as a regex pattern
+        max_snippets (int|None): The best snippets kept per hit, all of them if None
+        snippet_format (str): How the matches within each snippet are shown
+        approximate_counts (bool): Whether scanning a hit can stop once enough complete snippets are found
+        counts (list[tuple[int, bool]]|None): Filled with the number of snippets each hit matched, and whether
+            that number is exact
+
+    Returns:
+        list[list[dict[str, str|int]]]: The processed data of every hit, in order
+    """
+    counts = [] if counts is None else counts
+    if pool_enabled(len(hits)):
+        results = process_hits_in_pool(hits, query_no_quotes, query_pattern, max_snippets, snippet_format,
+                                       approximate_counts, counts)
+        if results is not None:
+            return results
+    if not BATCH_MATCHING or not is_canonical(query_no_quotes):
+        return [process_hit(hit, query_no_quotes, query_pattern, max_snippets, snippet_format, approximate_counts, counts)
+                for hit in hits]
+
+    from batch_matcher import batch_match_sentences # pylint: disable=import-outside-toplevel
+    documents = [hit["document"] for hit in hits if isinstance(hit["document"], dict)]
+    with span("batch_match"):
+        normalized = [get_normalized_transcript(document) for document in documents]
+        spans = batch_match_sentences(normalized, query_no_quotes)
+    selections = iter([select_snippets(document_spans, document["transcript"], transcript, query_no_quotes, query_pattern,
+                                       max_snippets)
+                       for document, transcript, document_spans in zip(documents, normalized, spans)])
+
+    results = []
+    for hit in hits:
+        if not isinstance(hit["document"], dict):
+            counts.append((0, True))
+            results.append([])
+            continue
+        selection = next(selections)
+        counts.append((selection.count, selection.exact))
+        results.append(mark_snippets(hit["document"], selection.spans, query_pattern, snippet_format))
+    return results
+
+def process_hit(hit: dict[str, int|list[dict[str, str|list[str]]]|dict[str, list[str]]], query_no_quotes: str, query_pattern: Pattern,
+                max_snippets: int|None = None, snippet_format: str = "marked", approximate_counts: bool = False,
+                counts: list[tuple[int, bool]]|None = None) -> list[dict[str, str]]:
     """
     Processes the hit data.
 
+    With `max_snippets`, only the best snippets are kept (see `ranking`). With `approximate_counts` as well,
+    the transcript is matched lazily and scanning stops once enough complete snippets are found, which may
+    not be the best ones.
+
     Args:
         hit (dict[str, str|list[str]]): The hit data
         query_no_quotes (str): The query without quotes
         query_pattern (Pattern): The query as a regex pattern
+        max_snippets (int|None): The best snippets kept, all of them if None
+        snippet_format (str): How the matches within each snippet are shown
+        approximate_counts (bool): Whether scanning can stop once enough complete snippets are found
+        counts (list[tuple[int, bool]]|None): Filled with the number of snippets matched, and whether that
+            number is exact
 
     Returns:
         list[dict[str, str|int]]: The processed hit data
     """
     if not isinstance(hit["document"], dict):
+        if counts is not None:
+            counts.append((0, True))
         return []
 
-    document = dict(hit["document"])
-    marked_snippets = []
+    with span("process_hit"):
+        document = dict(hit["document"])
+        normalized = get_normalized_transcript(document)
+        if approximate_counts and max_snippets is not None:
+            spans = iter_sentence_spans(normalized, query_no_quotes, query_pattern)
+        else:
+            spans = sentence_spans(normalized, query_no_quotes, query_pattern)
+        selection = select_snippets(spans, document["transcript"], normalized, query_no_quotes, query_pattern,
+                                    max_snippets, approximate_counts)
+        if counts is not None:
+            counts.append((selection.count, selection.exact))
+        return mark_snippets(document, selection.spans, query_pattern, snippet_format)
+
+def mark_snippets(document: dict, spans: list[tuple[int, int]], query_pattern: Pattern,
+                  snippet_format: str = "marked") -> list[dict[str, str]]:
+    """
+    Builds the marked snippets of the matching sentences of a document.
+
+    Only the `marked` format rewrites the snippet text; the others send the offsets of the matches, leaving
+    the marking to the client.
 
-    # Preprocess the transcript
-    new_transcript = [cleantext.sub("", sentence.lower()) for sentence in document["transcript"]]
-    for index, sentence in enumerate(sentence_search(document["transcript"], new_transcript, query_no_quotes, query_pattern)):
-        if not sentence: continue
+    Args:
+        document (dict): The Typesense document of the hit
+        spans (list[tuple[int, int]]): The index of each matching sentence and whether it spans 1 or 2 sentences
+        query_pattern (Pattern): The query as a regex pattern
+        snippet_format (str): How the matches within each snippet are shown
 
-        marked_snippets.append({"snippet": mark_word(sentence, query_pattern), "timestamp": document["timestamps"][index]})
+    Returns:
+        list[dict[str, str|int]]: The marked snippets and their timestamps
+    """
+    transcript = document["transcript"]
+    marked_snippets = []
+    with span("mark_word"):
+        for index, num_sentences in spans:
+            sentence = transcript[index] if num_sentences == 1 else f"{transcript[index]} {transcript[index + 1]}"
+            timestamp = document["timestamps"][index]
+            if snippet_format == "marked":
+                marked_snippets.append({"snippet": mark_word(sentence, query_pattern), "timestamp": timestamp})
+            elif snippet_format == "offsets":
+                marked_snippets.append({"snippet": sentence, "offsets": match_offsets(sentence, query_pattern),
+                                        "timestamp": timestamp})
+            else:
+                marked_snippets.append({"sentence": index, "length": num_sentences,
+                                        "offsets": match_offsets(sentence, query_pattern), "timestamp": timestamp})
 
     return marked_snippets
 
-def sentence_search(transcript: list[str], new_transcript: list[str], query: str, query_pattern: Pattern) -> Generator[str|None, None, None]:
-    """Returns a sentence if query found (handles multi-word as well)
+def normalize_transcript(transcript: list[str]) -> NormalizedTranscript:
+    """Preprocesses a transcript for matching.
 
     Args:
-        transcript: The transcript data
-        new_transcript: The transcript data, cleaned and preprocessed
+        transcript (list[str]): The sentences of the transcript
+
+    Returns:
+        NormalizedTranscript: The cleaned sentences and their word offsets
+    """
+    return index_sentences([cleantext.sub("", sentence.lower()) for sentence in transcript])
+
+def index_sentences(sentences: list[str]) -> NormalizedTranscript:
+    """Tokenizes cleaned sentences for matching.
+
+    Args:
+        sentences (list[str]): The cleaned sentences of the transcript
+
+    Returns:
+        NormalizedTranscript: The cleaned sentences and their word offsets
+    """
+    words, offsets = tokenize(sentences)
+    return NormalizedTranscript(sentences, words, array("q", offsets), array("q", map(hash, words)))
+
+def get_normalized_transcript(document: dict) -> NormalizedTranscript:
+    """Gets the normalized transcript of a document, preprocessing it only on a cache miss.
+
+    The cache is keyed by the video id together with the upload date, sentence count and a hash of the
+    sentences of the document, so a re-ingested transcript only reuses a stale entry on a hash collision.
+    Hashing the sentences costs about 1% of normalizing them.
+
+    Args:
+        document (dict): The Typesense document of the hit
+
+    Returns:
+        NormalizedTranscript: The cleaned sentences and their word offsets
+    """
+    key = (document["id"], document.get("upload_date"), len(document["transcript"]), hash(tuple(document["transcript"])))
+    normalized = TRANSCRIPT_CACHE.get(key)
+    if normalized is None:
+        normalized = normalize_transcript(document["transcript"])
+        TRANSCRIPT_CACHE.put(key, normalized)
+    return normalized
+
+def sentence_spans(normalized: NormalizedTranscript, query: str, query_pattern: Pattern) -> list[tuple[int, int]]:
+    """Finds the sentences containing the query (handles multi-word as well)
+
+    Canonical queries are matched on the word list in one pass; anything else falls back to
+    matching sentence by sentence.
+
+    Args:
+        normalized: The transcript data, cleaned and tokenized
         query: The query
         query_pattern: The query as a regex pattern
+
+    Returns:
+        list[tuple[int, int]]: The index of each matching sentence and whether it spans 1 or 2 sentences
+    """
+    if is_canonical(query):
+        return match_sentences(normalized.sentences, normalized.words, normalized.offsets, query)
+    return list(iter_sentence_spans(normalized, query, query_pattern))
+
+def iter_sentence_spans(normalized: NormalizedTranscript, query: str, query_pattern: Pattern) -> Iterator[tuple[int, int]]:
+    """Finds the same sentences as `sentence_spans`, scanning the transcript only as far as the caller reads.
+
+    Args:
+        normalized: The transcript data, cleaned and tokenized
+        query: The query
+        query_pattern: The query as a regex pattern
+
+    Returns:
+        Iterator[tuple[int, int]]: The index of each matching sentence and whether it spans 1 or 2 sentences
     """
+    if is_canonical(query):
+        yield from iter_match_sentences(normalized.sentences, normalized.words, normalized.offsets, query)
+        return
 
+    new_transcript = normalized.sentences
     words = query.split()
     skip_next = False # If this is set to true then we know that previous snippet current sentence
     for i, sentence in enumerate(new_transcript):
         if skip_next:
             skip_next = False
-            yield None
             continue
         if len(words) == 1:
-            yield transcript[i] if single_word(sentence, query_pattern) else None
+            if single_word(sentence, query_pattern):
+                yield i, 1
         else:
-            num_sentences = multi_word(sentence, new_transcript[i + 1] if i != len(transcript) - 1 else "", query)
-            if num_sentences == 1:
-                yield transcript[i]
-            elif num_sentences == 2:
-                skip_next = True
-                yield f"{transcript[i]} {transcript[i+1]}"
-            else:
-                yield None
-        
+            num_sentences = multi_word(sentence, new_transcript[i + 1] if i != len(new_transcript) - 1 else "", query)
+            if num_sentences:
+                skip_next = num_sentences == 2
+                yield i, num_sentences
+
+def sentence_search(transcript: list[str], new_transcript: list[str], query: str, query_pattern: Pattern) -> Generator[str|None, None, None]:
+    """Returns a sentence if query found (handles multi-word as well)
+
+    Args:
+        transcript: The transcript data
+        new_transcript: The transcript data, cleaned and preprocessed
+        query: The query
+        query_pattern: The query as a regex pattern
+    """
+
+    normalized = index_sentences(new_transcript)
+    spans = dict(sentence_spans(normalized, query, query_pattern))
+    for i in range(len(new_transcript)):
+        num_sentences = spans.get(i)
+        if num_sentences == 1:
+            yield transcript[i]
+        elif num_sentences == 2:
+            yield f"{transcript[i]} {transcript[i+1]}"
+        else:
+            yield None
+
 def single_word(sentence: str, query_pattern: Pattern) -> Match[str]|None:
     """
     Finds the query within the sentence if it exists
@@ -219,3 +748,16 @@ def mark_word(sentence: str, query_pattern: Pattern) -> str:
         str: The marked sentence
     """
     return query_pattern.sub(r"<mark>\g<0></mark>", sentence)
+
+def match_offsets(sentence: str, query_pattern: Pattern) -> list[list[int]]:
+    """
+    Finds every instance of word or phrase within a sentence, without rewriting it.
+
+    Args:
+        sentence (str): The sentence
+        query_pattern (Pattern): The query precompiled
+
+    Returns:
+        list[list[int]]: The `[start, end]` character offsets of each instance
+    """
+    return [[match.start(), match.end()] for match in query_pattern.finditer(sentence)]
@@ -10,14 +10,49 @@ Imports:
 Constants:
     - `DEBUG_FLAG`: A literal indicating debugging status.
     - `MAX_VIDEO_LIMIT`: Maximum limit for video downloads.
-    - `VALID_VIDEO_REGEX`: Regular expression pattern for validating video URLs.
-    - `VALID_PLAYLIST_REGEX`: Regular expression pattern for validating playlist URLs.
-    - `VALID_CHANNEL_REGEX`: Regular expression pattern for validating channel URLs.
     - `YDL_OPS`: Dictionary containing options for YT-DLP.
+    - `SCRAPE_MAX_CONCURRENCY`: Maximum number of URLs scraped at once by asynchronous scrape jobs.
+    - `SCRAPE_PUBLISH_BATCH_SIZE`: Number of video IDs sent in each Pub/Sub message, the batch size of `go-publish-ids`.
+    - `MAX_BULK_URLS`: Maximum number of URLs in one bulk ingest request.
+    - `SCRAPE_JOB_RETENTION_SECONDS`: Seconds a finished scrape job stays available to the status endpoint.
+    - `INGEST_STATE_PATH`: Directory of the per-channel ingest state, if channels are ingested incrementally.
+    - `INGEST_PROBE_SIZE`: Number of newest videos extracted first when a known channel is resubmitted.
+    - `PUBSUB_MAX_MESSAGES`: Number of messages the publisher sends together.
+    - `PUBSUB_MAX_LATENCY_SECONDS`: Seconds the publisher waits to fill a batch of messages.
     - `MAX_QUERY_WORD_LIMIT`: Maximum limit for query words.
+    - `SEARCH_BACKEND`: The search backend, `typesense` or `local` for the in-process engine.
+    - `LOCAL_SEARCH_SNAPSHOT`: Snapshot of the transcripts collection loaded by the local engine, a file or a directory.
+    - `LOCAL_SEARCH_CACHE_MAX_BYTES`: Byte budget of the decoded postings cached by the local engine.
     - `TYPESENSE_API_KEY`: Typesense API key.
     - `TYPESENSE_HOST`: Typesense host URL.
+    - `TYPESENSE_NODES`: Typesense nodes, comma separated, defaulting to `TYPESENSE_HOST`.
+    - `TYPESENSE_NEAREST_NODE`: Typesense node tried first, usually the one in the same region.
+    - `TYPESENSE_CONNECTION_TIMEOUT_SECONDS`: Timeout of a single Typesense attempt.
+    - `TYPESENSE_POOL_SIZE`: Maximum number of keep-alive connections per Typesense node.
+    - `TYPESENSE_RETRY_BUDGET`: Number of retries and hedged requests each user request may send to Typesense.
+    - `TYPESENSE_HEDGE_PERCENTILE`: Percentile of recent latencies after which a request is hedged on another node.
+    - `TYPESENSE_HEDGE_MIN_DELAY_SECONDS`: Shortest wait before a request is hedged.
+    - `TYPESENSE_BREAKER_FAILURES`: Consecutive failures after which a node is skipped.
+    - `TYPESENSE_BREAKER_RESET_SECONDS`: Seconds a skipped node waits before a trial request.
     - `TYPESENSE_SEARCH_PARAMS`: Parameters for Typesense search.
+    - `PLAYLIST_VIDEOS_PER_SHARD`: Number of videos a playlist search aims to put in each concurrent shard.
+    - `PLAYLIST_MAX_SHARDS`: Maximum number of concurrent shards for a playlist search.
+    - `TYPESENSE_MAX_FILTER_LENGTH`: Maximum length of the filter string of a single shard.
+    - `TRANSCRIPT_CACHE_MAX_BYTES`: Byte budget of the normalized transcript cache.
+    - `RESULT_CACHE_MAX_BYTES`: Byte budget of the search result cache.
+    - `RESULT_CACHE_TTL_SECONDS`: Seconds a cached search result stays valid.
+    - `RESULT_CACHE_INGEST_GRACE_SECONDS`: Seconds after an ingest during which a channel's results are not cached.
+    - `TWO_PHASE_SEARCH`: Whether searches fetch metadata first and transcripts only for the hits being processed.
+    - `TRANSCRIPT_STORE_PATH`: Directory of the local transcript store read in the second phase, if any.
+    - `PHRASE_INDEX_PATH`: Directory of the phrase index dropping the videos without a multi-word query, if any.
+    - `DOCUMENT_CACHE_MAX_BYTES`: Byte budget of the cache of transcripts fetched in the second phase.
+    - `BATCH_MATCHING`: Whether every hit of a search is matched at once with NumPy.
+    - `HIT_POOL_WORKERS`: Number of worker processes matching the hits of large searches, none if 0.
+    - `HIT_POOL_MIN_HITS`: Smallest number of hits sent to the worker processes rather than processed in process.
+    - `MAX_PAGE_SIZE`: Maximum number of videos per page of search results.
+    - `MAX_BATCH_SEARCHES`: Maximum number of searches in one batch request.
+    - `STREAM_CHUNK_SIZE`: Number of hits processed together before a streamed response sends them.
+    - `WARM_UP_ON_START`: Whether the instance creates its clients and compiles its regexes when it starts.
     - `API_RESPONSE_HEADERS`: Headers for API responses.
 """
 from __future__ import annotations
@@ -26,15 +61,13 @@ from os import environ
 
 # Config Settings
 DEBUG_FLAG = True
+WARM_UP_ON_START: bool = environ.get("WARM_UP_ON_START", "false").lower() == "true"
 
 BANNED_CHARS: list[str] = ["!", "@", "#", "$", "%", "^", "&", "*",
                            "(", ")", "-", "_", "=", "+", "[", "]", "{", "}", "\\", "|", ":", ";", "<", ">", ",", ".", "?", "/", "\""]
 
 # YT-DLP Settings
 MAX_VIDEO_LIMIT: int = 250
-VALID_VIDEO_REGEX: str = r"^((?:https?:)?\/\/)?((?:www|m)\.)?((?:youtube\.com|youtu.be))(\/(?:[\w\-]+\?v=|embed\/|v\/)?)(?![playlist|channel])([\w\-]+)(\S+)?$"
-VALID_PLAYLIST_REGEX: str = r"^((?:https?:)?\/\/)?((?:www|m)\.)?(youtube\.com)\/(.*)[\&|\?](list=[\w\-]+)(\&index=[0-9]*)?(\&si=[\w\-]+)?$"
-VALID_CHANNEL_REGEX: str = r"^((?:https?:)?\/\/)?((?:www|m)\.)?(youtube\.com)\/(((c\/)?[\w\-\.]+)|(\@[\w\-\.]{3,30})|(channel\/[\w\-]+))(\?si=[\w\-]+)?(\/videos|\/featured)?$"
 YDL_OPS: dict[str, bool | str | dict[str, dict[str, list[str]]]] = {
     "quiet": True,
     "extract_flat": True,
@@ -47,11 +80,36 @@ YDL_OPS: dict[str, bool | str | dict[str, dict[str, list[str]]]] = {
     },
     "source_address": "0.0.0.0",  # we're getting ip blocked
 }
+SCRAPE_MAX_CONCURRENCY: int = int(environ.get("SCRAPE_MAX_CONCURRENCY", 4))
+SCRAPE_PUBLISH_BATCH_SIZE: int = int(environ.get("SCRAPE_PUBLISH_BATCH_SIZE", 25))
+MAX_BULK_URLS: int = int(environ.get("MAX_BULK_URLS", 500))
+SCRAPE_JOB_RETENTION_SECONDS: float = float(environ.get("SCRAPE_JOB_RETENTION_SECONDS", 3600))
+INGEST_STATE_PATH: str = environ.get("INGEST_STATE_PATH", "")
+INGEST_PROBE_SIZE: int = int(environ.get("INGEST_PROBE_SIZE", 30))
+
+# Pub/Sub Settings
+PUBSUB_MAX_MESSAGES: int = int(environ.get("PUBSUB_MAX_MESSAGES", 100))
+PUBSUB_MAX_LATENCY_SECONDS: float = float(environ.get("PUBSUB_MAX_LATENCY_SECONDS", 0.05))
+
+# Search Backend Settings
+SEARCH_BACKEND: str = environ.get("SEARCH_BACKEND", "typesense").lower()
+LOCAL_SEARCH_SNAPSHOT: str = environ.get("LOCAL_SEARCH_SNAPSHOT", "")
+LOCAL_SEARCH_CACHE_MAX_BYTES: int = int(environ.get("LOCAL_SEARCH_CACHE_MAX_BYTES", 16 * 1024 * 1024))
 
 # TYPESENSE Settings
 MAX_QUERY_WORD_LIMIT: int = 5
 TYPESENSE_API_KEY: str | None = environ.get("TYPESENSE_API_KEY")
 TYPESENSE_HOST: str | None = environ.get("TYPESENSE_HOST")
+TYPESENSE_NODES: list[str] = [node.strip() for node in environ.get("TYPESENSE_NODES", TYPESENSE_HOST or "").split(",")
+                               if node.strip()]
+TYPESENSE_NEAREST_NODE: str | None = environ.get("TYPESENSE_NEAREST_NODE")
+TYPESENSE_CONNECTION_TIMEOUT_SECONDS: float = float(environ.get("TYPESENSE_CONNECTION_TIMEOUT_SECONDS", 4))
+TYPESENSE_POOL_SIZE: int = int(environ.get("TYPESENSE_POOL_SIZE", 32))
+TYPESENSE_RETRY_BUDGET: int = int(environ.get("TYPESENSE_RETRY_BUDGET", 2))
+TYPESENSE_HEDGE_PERCENTILE: float = float(environ.get("TYPESENSE_HEDGE_PERCENTILE", 0.95))
+TYPESENSE_HEDGE_MIN_DELAY_SECONDS: float = float(environ.get("TYPESENSE_HEDGE_MIN_DELAY_SECONDS", 0.25))
+TYPESENSE_BREAKER_FAILURES: int = int(environ.get("TYPESENSE_BREAKER_FAILURES", 5))
+TYPESENSE_BREAKER_RESET_SECONDS: float = float(environ.get("TYPESENSE_BREAKER_RESET_SECONDS", 30))
 TYPESENSE_SEARCH_PARAMS = {
     "drop_tokens_threshold": 0,
     "typo_tokens_threshold": 0,
@@ -98,7 +156,30 @@ TYPESENSE_SEARCH_REQUESTS = {
     ]
 }
 
+# Matching Settings
+TWO_PHASE_SEARCH: bool = environ.get("TWO_PHASE_SEARCH", "false").lower() == "true"
+TRANSCRIPT_STORE_PATH: str = environ.get("TRANSCRIPT_STORE_PATH", "")
+PHRASE_INDEX_PATH: str = environ.get("PHRASE_INDEX_PATH", "")
+BATCH_MATCHING: bool = environ.get("BATCH_MATCHING", "true").lower() == "true"
+HIT_POOL_WORKERS: int = int(environ.get("HIT_POOL_WORKERS", 0))
+HIT_POOL_MIN_HITS: int = int(environ.get("HIT_POOL_MIN_HITS", 100))
+
+# Cache Settings
+TRANSCRIPT_CACHE_MAX_BYTES: int = int(environ.get("TRANSCRIPT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+DOCUMENT_CACHE_MAX_BYTES: int = int(environ.get("DOCUMENT_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+RESULT_CACHE_MAX_BYTES: int = int(environ.get("RESULT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+RESULT_CACHE_TTL_SECONDS: float = float(environ.get("RESULT_CACHE_TTL_SECONDS", 300))
+RESULT_CACHE_INGEST_GRACE_SECONDS: float = float(environ.get("RESULT_CACHE_INGEST_GRACE_SECONDS", 600))
+
+# Playlist Search Settings
+PLAYLIST_VIDEOS_PER_SHARD: int = int(environ.get("PLAYLIST_VIDEOS_PER_SHARD", 50))
+PLAYLIST_MAX_SHARDS: int = int(environ.get("PLAYLIST_MAX_SHARDS", 8))
+TYPESENSE_MAX_FILTER_LENGTH: int = int(environ.get("TYPESENSE_MAX_FILTER_LENGTH", 4000))
+
 # API Settings
+MAX_PAGE_SIZE: int = 250
+MAX_BATCH_SEARCHES: int = int(environ.get("MAX_BATCH_SEARCHES", 20))
+STREAM_CHUNK_SIZE: int = int(environ.get("STREAM_CHUNK_SIZE", 10))
 API_RESPONSE_HEADERS: dict[str, str] = {
     "Access-Control-Allow-Origin": "*",
     "Access-Control-Allow-Methods": "GET,POST,PATCH,UPDATE,FETCH,DELETE,OPTIONS",
@@ -0,0 +1,101 @@
+"""
+This module coalesces identical concurrent work, so only one caller does it and every other caller shares the result.
+
+When a video goes viral, many identical searches reach the same instance within milliseconds. The first
+becomes the leader and runs the search, and the rest wait for its result instead of repeating the
+Typesense request and the matching. An error raised by the leader is raised to every waiting caller.
+
+Classes:
+- SingleFlight: Runs at most one call per key at a time, sharing its result with concurrent callers.
+
+Global Variables:
+- SEARCH_FLIGHTS: The single flight shared by every search on the instance.
+
+Dependencies:
+- threading: Guards the calls in flight and wakes the waiting callers.
+- metrics.count: Counts the leaders and the coalesced callers.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from collections.abc import Callable, Hashable
+from threading import Event, Lock
+
+# File System Imports
+from metrics import count
+
+class _Call:
+    """A call in flight, with its result once it finishes."""
+
+    def __init__(self) -> None:
+        self.done = Event()
+        self.result: object = None
+        self.error: BaseException|None = None
+
+class SingleFlight:
+    """Runs at most one call per key at a time, sharing its result with concurrent callers.
+
+    Args:
+        name (str): The name of the work, used for the metrics.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = Lock()
+
+    def do(self, key: Hashable, function: Callable[[], object]) -> tuple[object, bool]:
+        """Runs the function, or waits for the identical call already in flight.
+
+        Args:
+            key (Hashable): Identifies the work; calls with equal keys are coalesced.
+            function (Callable[[], object]): The work.
+
+        Returns:
+            tuple[object, bool]: The result, and whether it was shared from another caller's call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        count(f"{self.name}_leader" if leader else f"{self.name}_coalesced")
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> dict[str, int|float]:
+        """Gets the counters of the single flight.
+
+        Returns:
+            dict[str, int|float]: The leaders, coalesced callers, coalescing ratio and calls in flight.
+        """
+        calls = self.leaders + self.coalesced
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalescing_ratio": self.coalesced / calls if calls else 0.0,
+            "in_flight": len(self._calls),
+        }
+
+SEARCH_FLIGHTS = SingleFlight("search")
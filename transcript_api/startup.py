@@ -0,0 +1,78 @@
+"""
+This script reports the import cost of the function, broken down by module.
+
+It imports `main` in a fresh interpreter with `-X importtime`, the way a new instance does on a cold start,
+and sums the time spent in each top-level package. The slowest packages are printed first, along with the
+total, so the effect of lazy imports can be measured.
+
+Usage:
+    python startup.py [--module main] [--top 20] [--scrape]
+
+Functions:
+- import_times(module: str, extra: list[str]) -> list[tuple[str, int, int]]: Measures the imports of a module.
+- report(times: list[tuple[str, int, int]], top: int) -> str: Formats the cost of the slowest packages.
+
+Dependencies:
+- subprocess: Runs the import in a fresh interpreter.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from argparse import ArgumentParser
+from subprocess import run
+from sys import executable
+
+def import_times(module: str = "main", extra: list[str]|None = None) -> list[tuple[str, int, int]]:
+    """Imports a module in a fresh interpreter and measures every import.
+
+    Args:
+        module (str): The module to import.
+        extra (list[str]|None): Modules imported afterwards, such as those loaded on first use.
+
+    Returns:
+        list[tuple[str, int, int]]: The name, self time and cumulative time in microseconds of every
+        imported module, in import order.
+    """
+    statement = "; ".join(f"import {name}" for name in [module, *(extra or [])])
+    result = run([executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, check=True)
+
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(self_time), int(cumulative)))
+    return times
+
+def report(times: list[tuple[str, int, int]], top: int = 20) -> str:
+    """Formats the import cost of the slowest top-level packages.
+
+    Args:
+        times (list[tuple[str, int, int]]): The import times returned by `import_times`.
+        top (int): The number of packages to list.
+
+    Returns:
+        str: The report.
+    """
+    packages: dict[str, int] = {}
+    for name, self_time, _ in times:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_time
+
+    total = sum(packages.values())
+    lines = [f"{'package':<32}{'ms':>10}{'share':>8}"]
+    for package, self_time in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        lines.append(f"{package:<32}{self_time / 1000:>10.1f}{self_time / total:>8.1%}")
+    lines.append(f"{'total':<32}{total / 1000:>10.1f}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Report the import cost of the function by package.")
+    parser.add_argument("--module", default="main", help="module to import")
+    parser.add_argument("--top", type=int, default=20, help="number of packages to list")
+    parser.add_argument("--scrape", action="store_true", help="also import the lazily loaded scrape dependencies")
+    args = parser.parse_args()
+
+    extra_modules = ["scrape", "yt_dlp", "google.cloud.pubsub_v1", "google.oauth2.service_account"] if args.scrape else []
+    print(report(import_times(args.module, extra_modules), args.top))
@@ -1,7 +1,36 @@
+import json
+import re
+import tempfile
 from unittest import TestCase, main
 from unittest.mock import patch
 
-from helpers import distribute
+from flask import Flask, request as flask_request
+
+from bench import compare, run_benchmarks
+from batch_matcher import batch_match_sentences
+from cache import LRUCache, ResultCache, RESULT_CACHE, result_cache_key
+from helpers import distribute, shard_count
+from ingest_state import IngestState
+import hit_pool
+from main import run_search, transcript_api
+from scrape_jobs import ScrapeJobs
+from singleflight import SingleFlight
+from startup import import_times
+import threading
+import time
+from types import SimpleNamespace
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from typesense_gateway import CircuitBreaker, RetryBudget, TypesenseConfigError, TypesenseGateway, TypesenseUnavailable, new_retry_budget, node_config
+from transcript_store import TranscriptStore
+from phrase_index import PhraseIndex
+from local_search import LocalSearchEngine, decode_postings, encode_postings
+from backends import SearchBackendConfigError, create_backend
+from urls import ParsedURL, parse_url, parse_urls
+from metrics import PrometheusExporter, Timings, span, start_request
+from query import compile_query
+from pagination import Pagination, decode_cursor, parse_pagination
+from matcher import iter_match_sentences, match_sentences, tokenize
+from ranking import select_snippets
 from scrape import *
 from search import * 
 from settings import *
@@ -31,16 +60,42 @@ class TestGetURLType(TestCase):
         with self.assertRaises(ValueError):
             get_url_type(invalid_url)
 
-class TestExtractVideos(TestCase):
-    @patch('scrape.get_video')
-    def test_get_video(self, mock_type):
-        video_url = r"https://www.youtube.com/watch?v=2rkAL9ehPq8"
-        mock_type.return_value = str
+class TestParseURL(TestCase):
+    def test_videos(self):
+        for url in ["https://www.youtube.com/watch?v=jNQXAC9IVRw", "youtube.com/watch?v=jNQXAC9IVRw&list=PL1&t=4",
+                    "https://youtu.be/jNQXAC9IVRw?si=abc", "//m.youtube.com/embed/jNQXAC9IVRw",
+                    "https://www.youtube.com/shorts/jNQXAC9IVRw"]:
+            self.assertEqual(parse_url(url), ParsedURL(URLType.VIDEO, "jNQXAC9IVRw",
+                                                       "https://www.youtube.com/watch?v=jNQXAC9IVRw"))
+
+    def test_playlists(self):
+        for url in ["https://www.youtube.com/playlist?list=PLBRObSmbZluRiGDWMKtOTJiLy3q0zIfd7&si=x",
+                    "https://www.youtube.com/watch?list=PLBRObSmbZluRiGDWMKtOTJiLy3q0zIfd7&index=2"]:
+            self.assertEqual(parse_url(url).identifier, "PLBRObSmbZluRiGDWMKtOTJiLy3q0zIfd7")
+            self.assertEqual(parse_url(url).url_type, URLType.PLAYLIST)
 
-        video_id = get_video(video_url)
+    def test_channels(self):
+        self.assertEqual(parse_url("https://www.youtube.com/@Jawed/featured"),
+                         ParsedURL(URLType.CHANNEL, "@jawed", "https://www.youtube.com/@jawed/videos"))
+        self.assertEqual(parse_url("youtube.com/channel/UC4QobU6STFB0P71PMvOGN5A?si=x").identifier,
+                         "channel/UC4QobU6STFB0P71PMvOGN5A")
+        self.assertEqual(parse_url("https://www.youtube.com/c/jawed").url, "https://www.youtube.com/c/jawed/videos")
+        self.assertEqual(parse_url("https://www.youtube.com/jawed"),
+                         ParsedURL(URLType.CHANNEL, "jawed", "https://www.youtube.com/jawed/videos"))
 
-        self.assertEqual(video_id, "2rkAL9ehPq8")
+    def test_invalid(self):
+        for url in ["https://example.com/watch?v=jNQXAC9IVRw", "https://www.youtube.com/watch?v=short",
+                    "https://www.youtube.com/results?search_query=me", "ftp://youtube.com/@jawed",
+                    "https://www.youtube.com/@jawed/community", "", "https://youtu.be/"]:
+            with self.assertRaises(ValueError, msg=url):
+                parse_url(url)
 
+    def test_bulk(self):
+        parsed = parse_urls(["youtu.be/jNQXAC9IVRw", "not a url"])
+        self.assertEqual(parsed[0].identifier, "jNQXAC9IVRw")
+        self.assertIsInstance(parsed[1], ValueError)
+
+class TestExtractVideos(TestCase):
     @patch('scrape.get_playlist_videos')
     def test_get_playlist_videos(self, mock_type):
         playlist_url = r"https://www.youtube.com/playlist?list=PLBRObSmbZluRiGDWMKtOTJiLy3q0zIfd7"
@@ -144,6 +199,11 @@ class TestHelpers(TestCase):
         self.assertEqual(len(result[3]), 194//num_blocks + 1)
         self.assertEqual(len(result[4]), 194//num_blocks)
 
+    def test_shard_count(self):
+        self.assertEqual(shard_count(["a" * 11] * 4), 1)
+        self.assertEqual(shard_count(["a" * 11] * 120), 3)
+        self.assertEqual(shard_count(["a" * 11] * 5000), PLAYLIST_MAX_SHARDS)
+
 class TestMarkWord(TestCase):
     @patch('search.mark_word')
     def test_mark_word(self, mocktype):
@@ -152,6 +212,958 @@ class TestMarkWord(TestCase):
         result = mark_word(text, word)
         self.assertEqual(result, "This is a <mark>game</mark>")
 
+class TestSnippetFormats(TestCase):
+    hits = [{"document": {"id": "a", "title": "t", "channel_id": "c", "channel_name": "n", "duration": 1, "upload_date": 1,
+                          "transcript": ["Game on, game", "over the", "game is"], "timestamps": [0, 4, 8]}}]
+
+    def results(self, query, snippet_format):
+        compiled = compile_query(query)
+        return list(iter_results(self.hits, compiled.canonical, compiled.pattern, None, None, snippet_format))
+
+    def test_offsets(self):
+        matches = self.results("game", "offsets")[0]["matches"]
+        self.assertEqual(matches[0], {"snippet": "Game on, game", "offsets": [[0, 4], [9, 13]], "timestamp": 0})
+        self.assertEqual(self.results("game", "marked")[0]["matches"][0]["snippet"], "<mark>Game</mark> on, <mark>game</mark>")
+
+    def test_indexed(self):
+        result = self.results("over the game", "indexed")[0]
+        self.assertEqual(result["matches"], [{"sentence": 1, "length": 2, "offsets": [[0, 13]], "timestamp": 4}])
+        self.assertEqual(result["sentences"], {"1": "over the", "2": "game is"})
+
+    def test_format_is_validated_and_kept_in_cursor(self):
+        with self.assertRaises(ValueError):
+            parse_pagination({"snippet_format": "html"})
+        pagination = parse_pagination({"page_size": 1, "snippet_format": "offsets"})
+        self.assertEqual(decode_cursor(pagination.next_cursor(5)).snippet_format, "offsets")
+        self.assertNotEqual(result_cache_key("game", None, None, *pagination),
+                            result_cache_key("game", None, None, *pagination._replace(snippet_format="marked")))
+
+class TestSnippetRanking(TestCase):
+    def select(self, transcript, query, max_snippets, approximate=False):
+        compiled = compile_query(query)
+        normalized = normalize_transcript(transcript)
+        return select_snippets(iter(sentence_spans(normalized, compiled.canonical, compiled.pattern)), transcript,
+                               normalized, compiled.canonical, compiled.pattern, max_snippets, approximate)
+
+    def test_keeps_densest_in_transcript_order(self):
+        transcript = ["the game was long and slow today", "game game", "nothing", "a game"]
+        self.assertEqual(self.select(transcript, "game", 2), ([(1, 1), (3, 1)], 3, True))
+
+    def test_complete_phrase_outranks_split_phrase(self):
+        transcript = ["we use dynamic", "programming here", "nothing", "dynamic programming is used a lot in this course"]
+        self.assertEqual(self.select(transcript, "dynamic programming", 1), ([(2, 2)], 2, True))
+
+    def test_ties_keep_earlier_snippets(self):
+        self.assertEqual(self.select(["a game", "a game", "a game"], "game", 2), ([(0, 1), (1, 1)], 3, True))
+
+    def test_uncapped_keeps_every_snippet(self):
+        self.assertEqual(self.select(["game", "none", "game"], "game", None), ([(0, 1), (2, 1)], 2, True))
+
+    def test_approximate_stops_early(self):
+        hit = {"document": {"id": "long", "upload_date": 1, "transcript": ["the game"] * 100, "timestamps": list(range(100))}}
+        pattern = compile_query("game").pattern
+        exact, approximate = [], []
+        self.assertEqual(process_hit(hit, "game", pattern, 3, counts=exact),
+                         process_hit(hit, "game", pattern, 3, approximate_counts=True, counts=approximate))
+        self.assertEqual(exact, [(100, True)])
+        # The match after the third is read to tell that scanning stopped short
+        self.assertEqual(approximate, [(4, False)])
+
+    def test_approximate_trades_ranking(self):
+        transcript = ["the game was long and slow today", "game game"]
+        self.assertEqual(self.select(transcript, "game", 1), ([(1, 1)], 2, True))
+        self.assertEqual(self.select(transcript, "game", 1, approximate=True), ([(0, 1)], 2, False))
+        # Stopping on the last match is a finished scan
+        self.assertEqual(self.select(transcript, "game", 2, approximate=True), ([(0, 1), (1, 1)], 2, True))
+
+    def test_results_hold_snippet_count(self):
+        hits = [{"document": {"id": "abc", "title": "t", "channel_id": "c", "channel_name": "n", "duration": 1, "upload_date": 1,
+                              "transcript": ["game"] * 5, "timestamps": list(range(5))}}]
+        compiled = compile_query("game")
+        result = list(iter_results(hits, compiled.canonical, compiled.pattern, None, 2))[0]
+        self.assertEqual((len(result["matches"]), result["snippet_count"], result["snippet_count_exact"]), (2, 5, True))
+        self.assertNotIn("snippet_count", list(iter_results(hits, compiled.canonical, compiled.pattern))[0])
+
+    def test_pagination_reads_approximate_counts(self):
+        pagination = parse_pagination({"page_size": 1, "max_snippets": 3, "approximate_counts": True})
+        self.assertTrue(decode_cursor(pagination.next_cursor(5)).approximate_counts)
+        self.assertFalse(parse_pagination({"approximate_counts": True}).approximate_counts)
+        with self.assertRaises(ValueError):
+            parse_pagination({"max_snippets": 3, "approximate_counts": "yes"})
+        self.assertNotEqual(result_cache_key("game", None, None, *pagination),
+                            result_cache_key("game", None, None, *pagination._replace(approximate_counts=False)))
+
+class TestTranscriptCache(TestCase):
+    def setUp(self):
+        TRANSCRIPT_CACHE.clear()
+
+    def test_lru_evicts_by_bytes(self):
+        cache = LRUCache(10, len)
+        cache.put("a", "aaaa")
+        cache.put("b", "bbbb")
+        cache.get("a")
+        cache.put("c", "cccc")
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.stats()["bytes"], 8)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_normalize_transcript_offsets(self):
+        normalized = normalize_transcript(["Hello, World!", "It's a game"])
+        self.assertEqual(normalized.sentences, ["hello world", "its a game"])
+        self.assertEqual(normalized.words, ["hello", "world", "its", "a", "game"])
+        self.assertEqual(list(normalized.offsets), [0, 2, 5])
+
+    def test_process_hit_reuses_normalized_transcript(self):
+        hit = {"document": {"id": "abc", "upload_date": 1, "transcript": ["This is a game", "No match"], "timestamps": [0, 5]}}
+        pattern = re.compile(r"\b" + re.escape("game") + r"\b", re.IGNORECASE)
+
+        first = process_hit(hit, "game", pattern)
+        second = process_hit(hit, "game", pattern)
+        self.assertEqual(first, [{"snippet": "This is a <mark>game</mark>", "timestamp": 0}])
+        self.assertEqual(first, second)
+        self.assertEqual(TRANSCRIPT_CACHE.stats()["misses"], 1)
+        self.assertEqual(TRANSCRIPT_CACHE.stats()["hits"], 1)
+
+    def test_reingested_transcript_is_normalized_again(self):
+        pattern = compile_query("game").pattern
+        hit = {"document": {"id": "abc", "upload_date": 1, "transcript": ["This is a game", "No match"], "timestamps": [0, 5]}}
+        process_hit(hit, "game", pattern)
+        hit = {"document": {"id": "abc", "upload_date": 1, "transcript": ["No match", "Game over"], "timestamps": [0, 5]}}
+        self.assertEqual(process_hit(hit, "game", pattern), [{"snippet": "<mark>Game</mark> over", "timestamp": 5}])
+
+class TestMatcher(TestCase):
+    def match(self, sentences, query):
+        return match_sentences(sentences, *tokenize(sentences), query)
+
+    def test_single_word(self):
+        self.assertEqual(self.match(["a game", "games", "the game ends"], "game"), [(0, 1), (2, 1)])
+
+    def test_phrase_across_sentences(self):
+        sentences = ["we use dynamic", "programming here", "dynamic programming again"]
+        self.assertEqual(self.match(sentences, "dynamic programming"), [(0, 2), (2, 1)])
+
+    def test_phrase_matches_like_substring(self):
+        self.assertEqual(self.match(["nondynamic programmings"], "dynamic programming"), [(0, 1)])
+        self.assertEqual(self.match(["dynamic  programming"], "dynamic programming"), [])
+
+    def test_lazy_matches_equal_eager(self):
+        cases = [(["we use dynamic", "programming here", "dynamic programming again"], "dynamic programming"),
+                 (["dynamic", "programming", "", "dynamic programming dynamic", "programming"], "dynamic programming"),
+                 (["a game", "games", "the game ends"], "game")]
+        for sentences, query in cases:
+            words, offsets = tokenize(sentences)
+            self.assertEqual(list(iter_match_sentences(sentences, words, offsets, query)),
+                             match_sentences(sentences, words, offsets, query))
+
+    def test_matches_sentence_search(self):
+        transcript = ["Mega", "knight is", "here. Mega knight!", "mega", ""]
+        new_transcript = [cleantext.sub("", sentence.lower()) for sentence in transcript]
+        pattern = re.compile(r"\b" + re.escape("mega knight") + r"\b", re.IGNORECASE)
+        expected = ["Mega knight is", None, "here. Mega knight!", None, None]
+        self.assertEqual(list(sentence_search(transcript, new_transcript, "mega knight", pattern)), expected)
+
+class TestBatchMatcher(TestCase):
+    def test_batch_matches_each_hit(self):
+        transcripts = [["We use dynamic", "programming here"], ["nothing"], ["Dynamic programming!", "dynamic", "programming"]]
+        hits = [{"document": {"id": str(i), "upload_date": 1, "transcript": transcript, "timestamps": list(range(len(transcript)))}}
+                for i, transcript in enumerate(transcripts)]
+        pattern = re.compile(r"\b" + re.escape("dynamic programming") + r"\b", re.IGNORECASE)
+
+        expected = [process_hit(hit, "dynamic programming", pattern) for hit in hits]
+        self.assertEqual(process_hits(hits, "dynamic programming", pattern), expected)
+        self.assertEqual([len(matches) for matches in expected], [1, 0, 2])
+
+    def test_batch_ignores_phrase_across_hits(self):
+        normalized = [normalize_transcript(["the end is dynamic"]), normalize_transcript(["programming starts"])]
+        self.assertEqual(batch_match_sentences(normalized, "dynamic programming"), [[], []])
+
+class TestResultCache(TestCase):
+    def test_key_normalizes_query_and_filter(self):
+        self.assertEqual(result_cache_key("Dynamic  Programming!", None, ["b", "a"], 1),
+                         result_cache_key("dynamic programming", None, ["a", "b"], 1))
+        self.assertTrue(result_cache_key("game", "UC123", None, 1).startswith("channel:UC123|"))
+        self.assertNotEqual(result_cache_key("game", None, None, 1), result_cache_key("game", None, None, 2))
+
+    def test_ttl_expires(self):
+        cache = ResultCache(1024, 0, 0)
+        cache.put("key", [])
+        self.assertIsNone(cache.get("key"))
+
+    def test_invalidate_only_channel(self):
+        cache = ResultCache(1024, 60, 60)
+        cache.put("channel:A|1|game", [{"channel_id": "A"}], "A")
+        cache.put("all|1|game", [{"channel_id": "A"}, {"channel_id": "B"}])
+        cache.put("channel:B|1|game", [{"channel_id": "B"}], "B")
+
+        cache.invalidate_channel("A")
+        self.assertIsNone(cache.get("channel:A|1|game"))
+        self.assertIsNone(cache.get("all|1|game"))
+        self.assertEqual(cache.get("channel:B|1|game"), [{"channel_id": "B"}])
+
+        cache.put("channel:A|1|game", [{"channel_id": "A"}], "A")
+        self.assertIsNone(cache.get("channel:A|1|game"))
+
+    def test_index_follows_cached_entries(self):
+        cache = ResultCache(300, 60, 0)
+        for index in range(10):
+            cache.put(f"channel:C{index}|1|game", [{"channel_id": f"C{index}", "snippet": "x" * 50}], f"C{index}")
+        cache.invalidate_channel("C9")
+        cache.put("huge", [{"channel_id": "H", "snippet": "x" * 1000}])  # Also forgets the passed grace period
+        self.assertEqual(set(cache._key_channels), {key for key in cache._local._entries})
+        self.assertEqual(set(cache._channel_keys), {channel for channels in cache._key_channels.values() for channel in channels})
+        self.assertNotIn("H", cache._channel_keys)
+        self.assertEqual(cache._ingesting, {})
+
+        cache = ResultCache(1024, 0, 60)
+        cache.put("channel:A|1|game", [], "A")
+        self.assertIsNone(cache.get("channel:A|1|game"))
+        self.assertEqual((cache._channel_keys, cache._key_channels), ({}, {}))
+
+class TestPlaylistFanOut(TestCase):
+    @staticmethod
+    def perform(search_requests, query_params):
+        video_id = search_requests["searches"][0]["filter_by"][len("video_id:["):-1]
+        document = {"id": video_id, "title": "", "channel_id": "c", "channel_name": "", "duration": 1,
+                    "upload_date": int(video_id), "transcript": ["a game"], "timestamps": [0]}
+        return {"results": [{"hits": [{"document": document}]}]}
+
+    @patch('search.TYPESENSE_CLIENT')
+    def test_shards_merged_by_upload_date(self, mock_client):
+        mock_client.multi_search.side_effect = self.perform
+        search_requests = {"searches": [{"collection": "transcripts", "q": "game", "filter_by": f"video_id:[{i}]"} for i in (3, 9, 5)]}
+
+        result = search_playlist(search_requests, {})
+        self.assertEqual([data["video_id"] for data in result], ["9", "5", "3"])
+        self.assertEqual(mock_client.multi_search.call_count, 3)
+
+    @patch('search.TYPESENSE_CLIENT')
+    def test_shard_error(self, mock_client):
+        mock_client.multi_search.return_value = {"results": [{"error": "bad filter", "code": 400}]}
+        with self.assertRaises(ValueError):
+            search_playlist({"searches": [{"collection": "transcripts", "q": "game", "filter_by": ""}]}, {})
+
+class TestTwoPhaseSearch(TestCase):
+    def setUp(self):
+        DOCUMENT_CACHE.clear()
+
+    @patch('search.TYPESENSE_CLIENT')
+    def test_fetch_transcripts(self, mock_client):
+        fetched = {"id": "two", "transcript": ["a game"], "timestamps": [0]}
+        mock_client.multi_search.return_value = {"results": [{"hits": [{"document": fetched}]}]}
+        hits = [{"document": {"id": "two", "upload_date": 1}}, {"document": {"id": "gone", "upload_date": 1}}]
+
+        fetch_transcripts(hits)
+        self.assertEqual(hits[0]["document"]["transcript"], ["a game"])
+        self.assertEqual(hits[1]["document"]["transcript"], [])
+        self.assertIn("id:[two,gone]", str(mock_client.multi_search.call_args))
+
+        # The second fetch is served by the document cache
+        hits = [{"document": {"id": "two", "upload_date": 1}}]
+        fetch_transcripts(hits)
+        self.assertEqual(hits[0]["document"]["timestamps"], [0])
+        self.assertEqual(mock_client.multi_search.call_count, 1)
+
+    def test_metadata_params(self):
+        self.assertEqual(metadata_params({"q": "game"})["exclude_fields"], "transcript,timestamps")
+
+class TestHitPool(TestCase):
+    def test_encode_round_trip(self):
+        sentences, timestamps = hit_pool.decode_transcript(hit_pool.encode_transcript(["héllo", "", "a game"], [0, 3, 5]))
+        self.assertEqual(sentences, ["héllo", "", "a game"])
+        self.assertEqual(list(timestamps), [0, 3, 5])
+
+    def test_matches_in_process_results(self):
+        hits = [{"document": {"id": str(index), "upload_date": 10 - index, "timestamps": [0, 4, 8],
+                              "transcript": ["Good Game", "the game is", f"over {index}"]}} for index in range(5)]
+        hits.insert(2, {"document": "not a document"})
+        query = compile_query("game is")
+        expected_counts, counts = [], []
+        expected = [process_hit(hit, query.canonical, query.pattern, 1, counts=expected_counts) for hit in hits]
+
+        hit_pool.init_hit_pool(2)
+        try:
+            self.assertEqual(hit_pool.process_hits_in_pool(hits, query.canonical, query.pattern, 1, counts=counts), expected)
+            self.assertEqual(counts, expected_counts)
+        finally:
+            hit_pool.HIT_POOL.shutdown()
+            hit_pool.HIT_POOL = None
+
+    @patch('hit_pool.HIT_POOL_MIN_HITS', 3)
+    @patch('hit_pool.HIT_POOL_WORKERS', 2)
+    def test_small_searches_stay_in_process(self):
+        self.assertFalse(hit_pool.pool_enabled(2))
+        self.assertTrue(hit_pool.pool_enabled(3))
+
+class TestTranscriptStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = TranscriptStore(self.directory.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_append_and_get(self):
+        self.store.append([{"id": "a", "upload_date": 1, "transcript": ["héllo", "a game"], "timestamps": [0, 5]}])
+        self.store.append([{"id": "b", "upload_date": 2, "transcript": ["game on"], "timestamps": [7]}])
+
+        sentences, timestamps = self.store.get("a", 1)
+        self.assertEqual(list(sentences), ["héllo", "a game"])
+        self.assertEqual(list(timestamps), [0, 5])
+        self.assertEqual(self.store.get("b")[0][0], "game on")
+        self.assertIsNone(self.store.get("a", 2))
+        self.assertIsNone(self.store.get("missing"))
+
+    @patch('search.TYPESENSE_CLIENT')
+    def test_fetch_transcripts_reads_store(self, mock_client):
+        self.store.append([{"id": "a", "upload_date": 1, "transcript": ["a game"], "timestamps": [3]}])
+        hit = {"document": {"id": "a", "upload_date": 1}}
+        with patch('search.TRANSCRIPT_STORE', self.store):
+            fetch_transcripts([hit])
+            matches = process_hit(hit, "game", re.compile(r"\bgame\b", re.IGNORECASE))
+
+        self.assertEqual(matches, [{"snippet": "a <mark>game</mark>", "timestamp": 3}])
+        mock_client.multi_search.assert_not_called()
+
+class TestPhraseIndex(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = PhraseIndex(self.directory.name)
+        self.index.append([
+            {"id": "a", "upload_date": 1, "transcript": ["We use dynamic", "Programming, here."]},
+            {"id": "b", "upload_date": 1, "transcript": ["programming is dynamic"]},
+            {"id": "c", "upload_date": 1, "transcript": ["the mega knight is here"]},
+        ])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_lookup_exact_phrase(self):
+        self.assertEqual(self.index.lookup(["dynamic", "programming"]), {"a"})
+        self.assertEqual(self.index.lookup(["mega", "knight", "is", "here"]), {"c"})
+        self.assertEqual(self.index.lookup(["knight", "mega"]), set())
+        self.assertIsNone(self.index.lookup(["dynamic"]))
+
+    def test_reingest_replaces_postings(self):
+        self.index.append([{"id": "a", "upload_date": 2, "transcript": ["nothing here"]}])
+        self.assertEqual(self.index.lookup(["dynamic", "programming"]), set())
+        self.assertTrue(self.index.indexed("a", 2))
+        self.assertFalse(self.index.indexed("a", 1))
+        self.assertEqual(len(self.index), 3)
+        # Videos missing from the index are kept
+        self.assertEqual(self.index.filter_ids(["c", "new"], ["mega", "knight"]), ["c", "new"])
+        self.assertEqual(self.index.filter_ids(["a", "b", "new"], ["mega", "knight"]), ["new"])
+
+    @patch('search.TYPESENSE_CLIENT')
+    def test_drops_hits_before_fetching_transcripts(self, mock_client):
+        metadata = {"title": "", "channel_id": "c", "channel_name": "", "duration": 1, "upload_date": 1}
+        mock_client.search.return_value = {"found": 4, "hits": [{"document": {"id": video_id, **metadata}}
+                                                                 for video_id in ("a", "b", "c", "new")]}
+        mock_client.multi_search.return_value = {"results": [{"hits": [
+            {"document": {"id": "a", "transcript": ["We use dynamic", "Programming, here."], "timestamps": [0, 2]}},
+            {"document": {"id": "new", "transcript": ["dynamic programming"], "timestamps": [0]}}]}]}
+
+        with patch('search.PHRASE_INDEX', self.index):
+            result = search_typesense({"q": "dynamic programming"})
+
+        self.assertEqual([data["video_id"] for data in result], ["a", "new"])
+        self.assertIn("exclude_fields", mock_client.search.call_args.args[0])
+        self.assertIn("id:[a,new]", str(mock_client.multi_search.call_args))
+
+    def test_edges_match_like_the_matcher(self):
+        self.index.append([{"id": "e", "upload_date": 1, "transcript": ["nondynamic programmings"]}])
+        self.assertEqual(self.index.lookup(["dynamic", "programming"]), {"a", "e"})
+        self.assertEqual(self.index.filter_ids(["e"], ["dynamic", "programming"]), ["e"])
+        self.assertEqual(self.index.lookup(["amic", "program"]), {"a", "e"})
+        self.assertEqual(self.index.lookup(["non", "programming"]), set())
+
+    def test_same_results_with_and_without_index(self):
+        transcripts = {"a": ["We use dynamic", "Programming, here."], "b": ["programming is dynamic"],
+                       "c": ["the mega knight is here"], "e": ["nondynamic programmings"],
+                       "f": ["ultramega knight is herein"], "g": ["a  dynamic  programming"],
+                       "h": ["dynamic", "", "programming"]}
+        self.index.append([{"id": f"same-{video_id}", "upload_date": 1, "transcript": transcript}
+                           for video_id, transcript in transcripts.items()])
+        video_ids = [f"same-{video_id}" for video_id in transcripts]
+
+        for text in ("dynamic programming", "amic program", "mega knight is here", "knight is", "is here", "knight mega"):
+            query = compile_query(text)
+            hits = [{"document": {"id": f"same-{video_id}", "upload_date": 1, "title": "", "channel_id": "c",
+                                  "channel_name": "", "duration": 1, "transcript": transcript,
+                                  "timestamps": list(range(len(transcript)))}}
+                    for video_id, transcript in transcripts.items()]
+            with patch('search.PHRASE_INDEX', None):
+                expected = list(iter_results(hits, query.canonical, query.pattern))
+            with patch('search.PHRASE_INDEX', self.index):
+                self.assertEqual(list(iter_results(hits, query.canonical, query.pattern)), expected, text)
+            self.assertLessEqual({result["video_id"] for result in expected},
+                                 set(self.index.filter_ids(video_ids, query.tokens)), text)
+
+    @patch('main.search_typesense')
+    def test_playlist_searches_only_candidates(self, mock_search):
+        mock_search.return_value = []
+        query = compile_query("dynamic programming")
+        with patch('main.PHRASE_INDEX', self.index):
+            run_search(query, None, ["a", "b", "new"], Pagination(), {})
+            self.assertEqual(mock_search.call_args.args[0]["filter_by"], "video_id:['a', 'new']")
+
+            self.assertEqual(run_search(query, None, ["b", "c"], Pagination(), {}), [])
+            self.assertEqual(mock_search.call_count, 1)
+
+class TestLocalSearch(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        metadata = {"title": "", "channel_name": "", "duration": 1, "timestamps": [0, 2]}
+        with open(f"{self.directory.name}/transcripts.jsonl", "w", encoding="utf-8") as snapshot:
+            for video_id, channel_id, upload_date, transcript in (
+                    ("a", "one", 1, ["We use dynamic", "Programming, here."]),
+                    ("b", "one", 3, ["programming is dynamic", "fun"]),
+                    ("c", "two", 2, ["the mega knight", "is here"])):
+                snapshot.write(json.dumps({"id": video_id, "video_id": video_id, "channel_id": channel_id,
+                                           "upload_date": upload_date, "transcript": transcript, **metadata}) + "\n")
+        self.engine = LocalSearchEngine(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def ids(self, response):
+        return [hit["document"]["id"] for hit in response["hits"]]
+
+    def test_postings_round_trip(self):
+        numbers = [0, 1, 127, 128, 300, 70000, 2 ** 31]
+        self.assertEqual(list(decode_postings(encode_postings(numbers))), numbers)
+        self.assertEqual(len(encode_postings(range(100))), 100)
+
+    def test_match_filter_and_sort(self):
+        self.assertEqual(self.ids(self.engine.search({"q": "dynamic programming"})), ["b", "a"])
+        self.assertEqual(self.ids(self.engine.search({"q": '"here"', "sort_by": "upload_date:asc"})), ["a", "c"])
+        self.assertEqual(self.ids(self.engine.search({"q": "dynamic knight"})), [])
+        self.assertEqual(self.ids(self.engine.search({"q": "dyn"})), [])
+        self.assertEqual(self.ids(self.engine.search({"q": "*", "filter_by": "channel_id:one"})), ["b", "a"])
+        self.assertEqual(self.ids(self.engine.search({"q": "here", "filter_by": "video_id:['a', 'c']"})), ["c", "a"])
+        self.assertEqual(self.ids(self.engine.search({"q": "*", "filter_by": "id:[a,c] && channel_id:=two"})), ["c"])
+        self.assertEqual(len(self.engine), 3)
+
+    def test_pages_and_fields(self):
+        response = self.engine.search({"q": "*", "page": 2, "per_page": 2, "exclude_fields": "transcript,timestamps"})
+        self.assertEqual((response["found"], response["out_of"], response["page"]), (3, 3, 2))
+        self.assertEqual(self.ids(response), ["a"])
+        self.assertNotIn("transcript", response["hits"][0]["document"])
+        document = self.engine.search({"q": "fun", "include_fields": "id,channel_id"})["hits"][0]["document"]
+        self.assertEqual(document, {"id": "b", "channel_id": "one"})
+
+    def test_multi_search_errors(self):
+        response = self.engine.multi_search({"searches": [{"filter_by": "id:[b]"}, {"filter_by": "title:x"}]},
+                                            {"q": "*", "include_fields": "id"})
+        self.assertEqual(self.ids(response["results"][0]), ["b"])
+        self.assertEqual(response["results"][1]["code"], 400)
+        with self.assertRaises(ValueError):
+            self.engine.search({"q": "*", "sort_by": "duration:desc"})
+        with self.assertRaises(SearchBackendConfigError):
+            create_backend("elastic")
+
+    def test_search_through_backend(self):
+        with patch('search.TYPESENSE_CLIENT', self.engine):
+            result = search_typesense({"q": "dynamic programming", "filter_by": "channel_id:one", "per_page": 250})
+            channel_result = run_search(compile_query("mega knight"), "two", None, Pagination(), {})
+
+        # The engine matches the words of "b", and the matcher drops it for lacking the phrase
+        self.assertEqual([data["video_id"] for data in result], ["a"])
+        self.assertIn("<mark>", result[0]["matches"][0]["snippet"])
+        self.assertEqual([data["video_id"] for data in channel_result], ["c"])
+
+class TestBenchmarks(TestCase):
+    def test_run_and_compare(self):
+        results = run_benchmarks(hits=4, sentences=20, query_words=[1, 2], iterations=2)
+        self.assertIn("search_playlist[2w]", results["results"])
+        self.assertEqual(compare(results, results, 0.25), [])
+
+        slower = json.loads(json.dumps(results))
+        for stats in slower["results"].values():
+            stats["p50_ms"] *= 2
+        self.assertEqual(len(compare(slower, results, 0.25)), len(results["results"]))
+
+class TestTypesenseGateway(TestCase):
+    @staticmethod
+    def gateway(behaviours):
+        """Builds a gateway whose nodes run the given behaviours, in node order."""
+        behaviours = iter(behaviours)
+        def client_factory(config):
+            behaviour = next(behaviours)
+            documents = SimpleNamespace(search=lambda params: behaviour(config["nodes"][0]["host"]))
+            return SimpleNamespace(collections={"transcripts": SimpleNamespace(documents=documents)})
+        return TypesenseGateway(["a", "b", "c"], "key", client_factory=client_factory)
+
+    @staticmethod
+    def answer(host):
+        return {"node": host}
+
+    @staticmethod
+    def fail(host):
+        raise RequestsConnectionError(host)
+
+    @staticmethod
+    def slow(host):
+        time.sleep(0.5)
+        return {"node": host}
+
+    def setUp(self):
+        new_retry_budget(2)
+
+    def test_node_config(self):
+        self.assertEqual(node_config("search.example.com"), {"host": "search.example.com", "port": 443, "protocol": "https"})
+        self.assertEqual(node_config("http://localhost:8108"), {"host": "localhost", "port": 8108, "protocol": "http"})
+
+    def test_missing_nodes_is_server_error(self):
+        with self.assertRaises(TypesenseConfigError):
+            TypesenseGateway([], "key")
+
+        RESULT_CACHE.clear()
+        with patch('search.TYPESENSE_CLIENT', None), patch('backends.TYPESENSE_NODES', []), \
+                patch('backends.TYPESENSE_NEAREST_NODE', None):
+            with TestTranscriptApi.app.test_request_context(json={"query": "game", "channel_id": "UC1"}):
+                _, status, _ = transcript_api(flask_request)
+        self.assertEqual(status, 500)
+
+    def test_nearest_node_first(self):
+        gateway = TypesenseGateway(["a", "b"], "key", nearest_node="b", client_factory=lambda config: config)
+        self.assertEqual(gateway.nodes, ["b", "a"])
+
+    def test_retries_next_node(self):
+        gateway = self.gateway([self.fail, self.answer, self.answer])
+        self.assertEqual(gateway.search({"q": "game"}), {"node": "b"})
+        self.assertEqual(gateway.retries, 1)
+
+    def test_counters_under_concurrency(self):
+        gateway = self.gateway([self.fail, self.answer, self.answer])
+        gateway.breakers[0].failures = 100  # Every search fails on the first node and retries on the next
+        threads = [threading.Thread(target=gateway.search, args=({"q": "game"},)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(gateway.stats()["retries"], 20)
+
+    def test_single_node_retries(self):
+        outcomes = iter([self.fail, self.fail, self.answer, self.fail, self.fail, self.fail])
+        documents = SimpleNamespace(search=lambda params: next(outcomes)("a"))
+        client = SimpleNamespace(collections={"transcripts": SimpleNamespace(documents=documents)})
+        gateway = TypesenseGateway(["a"], "key", client_factory=lambda config: client)
+
+        self.assertEqual(gateway.search({"q": "game"}), {"node": "a"})
+        self.assertEqual(gateway.retries, 2)
+        new_retry_budget(2)
+        with self.assertRaises(TypesenseUnavailable):
+            gateway.search({"q": "game"})
+        self.assertEqual(gateway.retries, 4)
+
+    def test_failed_launch_keeps_budget(self):
+        gateway = self.gateway([self.fail, self.fail, self.fail])
+        for breaker in gateway.breakers:
+            breaker.failures, breaker.reset_seconds = 1, 60
+        budget = new_retry_budget(5)
+        with self.assertRaises(TypesenseUnavailable):
+            gateway.search({"q": "game"})
+        # Each node failed once and opened its breaker, and the retry finding no node was not spent
+        self.assertEqual((gateway.retries, budget.remaining), (2, 3))
+
+    def test_retry_budget_exhausted(self):
+        new_retry_budget(1)
+        gateway = self.gateway([self.fail, self.fail, self.answer])
+        with self.assertRaises(TypesenseUnavailable):
+            gateway.search({"q": "game"})
+
+    def test_hedges_slow_node(self):
+        gateway = self.gateway([self.slow, self.answer, self.answer])
+        gateway.latency.min_delay = 0.01
+        self.assertEqual(gateway.search({"q": "game"}), {"node": "b"})
+        self.assertEqual(gateway.hedges, 1)
+
+    def test_circuit_breaker(self):
+        breaker = CircuitBreaker(failures=2, reset_seconds=0)
+        breaker.failure()
+        self.assertTrue(breaker.allow())
+        breaker.failure()
+        self.assertTrue(breaker.is_open)
+        self.assertTrue(breaker.allow())   # The trial request once the reset time has passed
+        self.assertFalse(breaker.allow())
+        breaker.success()
+        self.assertFalse(breaker.is_open)
+
+    def test_retry_budget(self):
+        budget = RetryBudget(1)
+        self.assertTrue(budget.spend())
+        self.assertFalse(budget.spend())
+
+class TestCompiledQuery(TestCase):
+    def test_canonical_form(self):
+        query = compile_query("  Game,  ON! ")
+        self.assertEqual(query.tokens, ("game", "on"))
+        self.assertEqual(query.canonical, "game on")
+        self.assertEqual(query.key, compile_query("game on").key)
+        self.assertEqual(query.typesense_query, "game on")
+        self.assertEqual(compile_query('"Game on"').typesense_query, '"game on"')
+        self.assertIs(compile_query("  Game,  ON! "), query)
+
+    def test_pattern_marks_original_sentence(self):
+        self.assertEqual(mark_word("The Game on tonight", compile_query("game ON").pattern), "The <mark>Game on</mark> tonight")
+
+    @patch('main.run_search')
+    def test_shared_by_api_and_cache(self, mock_search):
+        mock_search.return_value = []
+        RESULT_CACHE.clear()
+        with Flask(__name__).test_request_context(json={"query": "GAME!"}):
+            transcript_api(flask_request)
+        self.assertEqual(mock_search.call_args.args[0].canonical, "game")
+        self.assertIsNotNone(RESULT_CACHE.get(result_cache_key("game", None, None, 1)))
+
+        with Flask(__name__).test_request_context(json={"query": "!!!"}):
+            _, status, _ = transcript_api(flask_request)
+        self.assertEqual(status, 400)
+
+    @patch('main.run_search')
+    def test_quoted_query_is_another_search(self, mock_search):
+        mock_search.return_value = []
+        RESULT_CACHE.clear()
+        self.assertNotEqual(compile_query('"game on"').key, compile_query("game on").key)
+        self.assertNotEqual(result_cache_key('"game on"', None, None, 1), result_cache_key("game on", None, None, 1))
+
+        for text in ('"Game on"', "game on", '"game, on"'):
+            with Flask(__name__).test_request_context(json={"query": text}):
+                transcript_api(flask_request)
+        self.assertEqual([call.args[0].typesense_query for call in mock_search.call_args_list], ['"game on"', "game on"])
+
+class TestPagination(TestCase):
+    def test_defaults_to_unpaginated(self):
+        self.assertEqual(parse_pagination({"query": "game"}), Pagination(1, None, None))
+        self.assertIsNone(Pagination().next_cursor(1000))
+
+    def test_cursor_round_trip(self):
+        pagination = Pagination(1, 20, 5)
+        cursor = pagination.next_cursor(100)
+        self.assertEqual(decode_cursor(cursor), Pagination(2, 20, 5))
+        self.assertIsNone(Pagination(5, 20, 5).next_cursor(100))
+        self.assertIsNone(Pagination(1, 20).next_cursor(100, limit=20))
+
+    def test_max_snippets_caps_matches(self):
+        hit = {"document": {"id": "caps", "upload_date": 1, "transcript": ["game", "game", "game"], "timestamps": [0, 1, 2]}}
+        pattern = re.compile(r"\bgame\b", re.IGNORECASE)
+        self.assertEqual(len(process_hits([hit], "game", pattern, max_snippets=2)[0]), 2)
+        self.assertEqual(len(process_hit(hit, "game", pattern, max_snippets=2)), 2)
+
+class TestMetrics(TestCase):
+    def test_span_adds_to_current_request(self):
+        timings = start_request(Timings())
+        with span("mark_word"):
+            pass
+        with span("mark_word"):
+            pass
+        self.assertEqual(timings.as_dict()["mark_word"]["count"], 2)
+
+    def test_prometheus_histogram(self):
+        exporter = PrometheusExporter(buckets=(0.01, 0.1))
+        exporter.observe("typesense_request", 0.05)
+        exporter.observe("typesense_request", 2)
+        text = exporter.render()
+        self.assertIn('transcript_api_phase_seconds_bucket{phase="typesense_request",le="0.01"} 0', text)
+        self.assertIn('transcript_api_phase_seconds_bucket{phase="typesense_request",le="0.1"} 1', text)
+        self.assertIn('transcript_api_phase_seconds_count{phase="typesense_request"} 2', text)
+
+class TestSingleFlight(TestCase):
+    def run_concurrently(self, flight, function, callers=5):
+        results, errors = [], []
+        def call():
+            try:
+                results.append(flight.do("key", function))
+            except ValueError as e:
+                errors.append(e)
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        while flight.leaders + flight.coalesced < callers:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def setUp(self):
+        self.release = threading.Event()
+
+    def test_concurrent_calls_share_result(self):
+        flight = SingleFlight("test")
+        calls = []
+        def search():
+            calls.append(1)
+            self.release.wait()
+            return ["hit"]
+
+        results, _ = self.run_concurrently(flight, search)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, _ in results], [["hit"]] * 5)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True, True])
+        self.assertEqual(flight.stats()["coalescing_ratio"], 0.8)
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    def test_error_raised_to_every_caller(self):
+        def fail():
+            self.release.wait()
+            raise ValueError("bad filter")
+
+        _, errors = self.run_concurrently(SingleFlight("test"), fail, callers=3)
+        self.assertEqual(len(errors), 3)
+
+class TestScrapeJobs(TestCase):
+    @patch('scrape_jobs.process_url')
+    def test_job_runs_in_background(self, mock_process):
+        mock_process.return_value = {"channel_id": "UC1", "video_ids": None}
+        jobs = ScrapeJobs(max_workers=1)
+        job = jobs.submit("https://www.youtube.com/@jawed")
+        self.assertTrue(job.done.wait(5))
+        self.assertEqual(jobs.get(job.job_id).as_dict()["status"], "done")
+        self.assertEqual(job.channel_id, "UC1")
+
+    @patch('scrape_jobs.process_url')
+    def test_failed_job_and_retention(self, mock_process):
+        mock_process.side_effect = ValueError("Channel has no videos.")
+        jobs = ScrapeJobs(max_workers=1, retention_seconds=0)
+        job = jobs.submit("https://www.youtube.com/@jawed")
+        job.done.wait(5)
+        self.assertEqual((job.status, job.error), ("failed", "Channel has no videos."))
+
+        jobs.submit("https://www.youtube.com/@jawed").done.wait(5)
+        self.assertIsNone(jobs.get(job.job_id))
+
+    def test_invalid_url_rejected(self):
+        with self.assertRaises(ValueError):
+            ScrapeJobs(max_workers=1).submit("https://example.com")
+
+    @patch('scrape.init_publisher')
+    @patch('scrape.PUBLISHER')
+    def test_publish_in_batches(self, mock_publisher, _):
+        self.assertEqual(publish_video_ids([str(index) for index in range(7)], batch_size=3), 3)
+        messages = [json.loads(call.kwargs["data"]) for call in mock_publisher.publish.call_args_list]
+        self.assertEqual(messages, [["0", "1", "2"], ["3", "4", "5"], ["6"]])
+
+class TestIngestState(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.state = IngestState(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_mark_and_unseen(self):
+        self.assertEqual(self.state.unseen("UC1", ["b", "a"]), ["b", "a"])
+        self.state.mark("UC1", ["b", "a"])
+        self.state.mark("UC1", ["d", "c"])
+
+        reloaded = IngestState(self.directory.name)
+        self.assertEqual(reloaded.unseen("UC1", ["e", "d", "b", "z"]), ["e", "z"])
+        self.assertEqual(reloaded.unseen("UC2", ["d"]), ["d"])
+
+    @patch('scrape.init_probe_client')
+    @patch('scrape.get_channel_videos')
+    def test_stops_at_known_videos(self, mock_channel, _):
+        self.state.mark("UC1", ["c", "b", "a"])
+        mock_channel.return_value = ("UC1", ["e", "d", "c", "b", "a"])
+        with patch('scrape.INGEST_STATE', self.state):
+            self.assertEqual(get_new_channel_videos("https://www.youtube.com/@jawed"), ("UC1", ["e", "d"]))
+        mock_channel.assert_called_once()
+
+    @patch('scrape.init_probe_client')
+    @patch('scrape.get_channel_videos')
+    def test_walks_channel_without_known_videos(self, mock_channel, _):
+        probe = [str(index) for index in range(INGEST_PROBE_SIZE)]
+        mock_channel.side_effect = [("UC1", probe), ("UC1", probe + ["old"])]
+        with patch('scrape.INGEST_STATE', self.state):
+            self.assertEqual(get_new_channel_videos("https://www.youtube.com/@jawed")[1], probe + ["old"])
+        self.assertEqual(mock_channel.call_count, 2)
+
+class TestStartup(TestCase):
+    def test_main_defers_scrape_dependencies(self):
+        modules = {name for name, _, _ in import_times("main")}
+        self.assertIn("search", modules)
+        self.assertNotIn("scrape", modules)
+        self.assertNotIn("yt_dlp", modules)
+        self.assertNotIn("google.cloud.pubsub_v1", modules)
+        self.assertNotIn("typesense_gateway", modules)
+        self.assertNotIn("typesense", modules)
+
+    def test_main_defers_numpy(self):
+        modules = {name for name, _, _ in import_times("main")}
+        self.assertNotIn("batch_matcher", modules)
+        self.assertNotIn("phrase_index", modules)
+        self.assertNotIn("numpy", modules)
+
+class TestTranscriptApi(TestCase):
+    app = Flask(__name__)
+
+    def call(self, payload):
+        with self.app.test_request_context(json=payload):
+            response, status, _ = transcript_api(flask_request)
+            return response.get_json(), status
+
+    def setUp(self):
+        RESULT_CACHE.clear()
+
+    @patch('main.run_search')
+    def test_search_is_cached(self, mock_search):
+        mock_search.return_value = [{"video_id": "a", "channel_id": "UC1", "matches": [{"snippet": "<mark>game</mark>", "timestamp": 0}]}]
+
+        first, status = self.call({"query": "game", "channel_id": "UC1"})
+        second, _ = self.call({"query": "Game", "channel_id": "UC1"})
+        self.assertEqual(status, 200)
+        self.assertEqual(first["hits"], second["hits"])
+        mock_search.assert_called_once()
+
+    @patch('main.run_search')
+    def test_stream_ndjson(self, mock_search):
+        hits = [{"video_id": "a", "channel_id": "UC1", "upload_date": 2, "matches": []},
+                {"video_id": "b", "channel_id": "UC1", "upload_date": 1, "matches": []}]
+        mock_search.return_value = iter(hits)
+
+        with self.app.test_request_context(json={"query": "game", "stream": True}):
+            response, status, _ = transcript_api(flask_request)
+            lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+        self.assertEqual(status, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(lines[:2], hits)
+        self.assertEqual(lines[2]["MAX_QUERY_WORD_LIMIT"], MAX_QUERY_WORD_LIMIT)
+        self.assertIn("time", lines[2])
+        self.assertEqual(RESULT_CACHE.get(result_cache_key("game", None, None, 1))["hits"], hits)
+
+    @patch('main.run_search')
+    def test_timings_and_metrics(self, mock_search):
+        mock_search.return_value = []
+        data, _ = self.call({"query": "game", "timings": True})
+        self.assertIn("json_parse", data["timings"])
+        self.assertIn("query_validation", data["timings"])
+        self.assertIsNone(self.call({"query": "other"})[0]["timings"])
+
+        with self.app.test_request_context("/metrics"):
+            response, status, _ = transcript_api(flask_request)
+        self.assertEqual(status, 200)
+        self.assertIn('phase="json_parse"', response.get_data(as_text=True))
+
+    @patch('main.search_typesense')
+    def test_paginated_search(self, mock_search):
+        def search(query_params, pagination, summary, query):
+            summary["found"] = 45
+            return [{"video_id": "a", "channel_id": "UC1", "upload_date": 1, "matches": []}]
+        mock_search.side_effect = search
+
+        first, _ = self.call({"query": "game", "page_size": 20, "max_snippets": 3})
+        query_params, pagination, _, _ = mock_search.call_args.args
+        self.assertEqual((query_params["page"], query_params["per_page"]), (1, 20))
+        self.assertEqual(pagination.max_snippets, 3)
+        self.assertEqual((first["found"], first["page"]), (45, 1))
+
+        second, _ = self.call({"query": "game", "cursor": first["next_cursor"]})
+        third, _ = self.call({"query": "game", "cursor": second["next_cursor"]})
+        self.assertEqual(second["page"], 2)
+        self.assertEqual(third["page"], 3)
+        self.assertIsNone(third["next_cursor"])
+
+    def test_invalid_pagination(self):
+        _, status = self.call({"query": "game", "page_size": 0})
+        self.assertEqual(status, 400)
+        _, status = self.call({"query": "game", "cursor": "not-a-cursor"})
+        self.assertEqual(status, 400)
+
+    @patch('scrape_jobs.process_url')
+    def test_async_scrape(self, mock_process):
+        mock_process.return_value = {"channel_id": None, "video_ids": ["jNQXAC9IVRw"]}
+        body, status = self.call({"url": "https://www.youtube.com/watch?v=jNQXAC9IVRw", "async": True})
+        self.assertEqual(status, 200)
+        self.assertIn(body["job"]["status"], ("queued", "running", "done"))
+
+        from scrape_jobs import SCRAPE_JOBS
+        SCRAPE_JOBS.get(body["job"]["job_id"]).done.wait(5)
+        with self.app.test_request_context(f"/jobs/{body['job']['job_id']}"):
+            response, status, _ = transcript_api(flask_request)
+        self.assertEqual((status, response.get_json()["video_ids"]), (200, ["jNQXAC9IVRw"]))
+
+        with self.app.test_request_context("/jobs/unknown"):
+            _, status, _ = transcript_api(flask_request)
+        self.assertEqual(status, 404)
+
+    @patch('scrape.record_ingest')
+    @patch('scrape.publish_video_ids')
+    @patch('scrape.get_playlist_videos')
+    @patch('scrape.get_channel_videos')
+    @patch('scrape.init_ydl_client')
+    def test_bulk_ingest(self, _, mock_channel, mock_playlist, mock_publish, mock_record):
+        mock_channel.return_value = ("UC1", ["jNQXAC9IVRw", "aaaaaaaaaaa"])
+        mock_playlist.side_effect = ValueError("Playlist is private.")
+        body, status = self.call({"urls": [
+            "https://www.youtube.com/@jawed",
+            "youtube.com/@Jawed/videos",
+            "https://youtu.be/jNQXAC9IVRw",
+            "https://www.youtube.com/playlist?list=PL1",
+            "https://example.com",
+        ]})
+
+        self.assertEqual(status, 200)
+        self.assertEqual([summary["status"] for summary in body["urls"]], ["ok", "duplicate", "ok", "failed", "invalid"])
+        self.assertEqual(body["urls"][0]["video_count"], 2)
+        self.assertEqual(body["video_ids"], ["jNQXAC9IVRw", "aaaaaaaaaaa"])
+        mock_channel.assert_called_once()
+        mock_publish.assert_called_once_with(["jNQXAC9IVRw", "aaaaaaaaaaa"])
+        mock_record.assert_any_call("UC1", ["jNQXAC9IVRw", "aaaaaaaaaaa"])
+
+    def test_bulk_ingest_limit(self):
+        _, status = self.call({"urls": ["https://youtu.be/jNQXAC9IVRw"] * (MAX_BULK_URLS + 1)})
+        self.assertEqual(status, 400)
+
+    @patch('main.run_search')
+    def test_query_too_long(self, mock_search):
+        _, status = self.call({"query": "one two three four five six"})
+        self.assertEqual(status, 500)
+        mock_search.assert_not_called()
+
+    @patch('search.TYPESENSE_CLIENT')
+    def test_batch_search(self, mock_client):
+        document = {"id": "a", "channel_id": "UC1", "channel_name": "c", "title": "t", "duration": 9, "upload_date": 1,
+                    "transcript": ["a game", "the end"], "timestamps": [0, 5]}
+        mock_client.multi_search.return_value = {"results": [
+            {"found": 1, "hits": [{"document": document}]},
+            {"error": "Could not find a field named `channel_id`.", "code": 400},
+        ]}
+
+        body, status = self.call({"searches": [
+            {"query": "Game", "channel_id": "UC1"},
+            {"query": "end", "channel_id": "bad id"},
+            {"query": "???"},
+            {"query": "one two three four five six"},
+        ]})
+        self.assertEqual(status, 200)
+        results = body["results"]
+        self.assertEqual([result["status"] for result in results], [200, 400, 400, 400])
+        self.assertEqual(results[0]["hits"][0]["matches"], [{"snippet": "a <mark>game</mark>", "timestamp": 0}])
+        self.assertIn("channel_id", results[1]["error"])
+        mock_client.multi_search.assert_called_once()
+        searches = mock_client.multi_search.call_args[0][0]["searches"]
+        self.assertEqual([search["filter_by"] for search in searches], ["channel_id:UC1", "channel_id:bad id"])
+
+        # The successful search is now cached, so only the other is sent again
+        body, _ = self.call({"searches": [{"query": "game", "channel_id": "UC1"}, {"query": "end", "channel_id": "bad id"}]})
+        self.assertEqual(body["results"][0]["hits"], results[0]["hits"])
+        self.assertEqual(len(mock_client.multi_search.call_args[0][0]["searches"]), 1)
+
+    @patch('search.TYPESENSE_CLIENT')
+    def test_batch_search_timeout(self, mock_client):
+        mock_client.multi_search.side_effect = TypesenseUnavailable("down")
+        body, status = self.call({"searches": [{"query": "game"}, {"query": ""}]})
+        self.assertEqual(status, 200)
+        self.assertEqual([result["status"] for result in body["results"]], [408, 400])
+
+    def test_batch_search_limit(self):
+        _, status = self.call({"searches": [{"query": "game"}] * (MAX_BATCH_SEARCHES + 1)})
+        self.assertEqual(status, 400)
+
 class TestSearch(TestCase):
     @patch('search.search_typesense')
     def test_search_single_no_filter(self, mocktype):
@@ -0,0 +1,258 @@
+"""
+This module holds a local, read-optimized store of transcripts used to locate snippets without
+pulling transcripts back through Typesense.
+
+The store is a directory of four files:
+- `sentences.bin`: The UTF-8 text of every sentence, concatenated.
+- `offsets.bin`: The byte offset where each sentence ends in `sentences.bin`, as packed int64.
+- `timestamps.bin`: The timestamp of each sentence, as packed int32.
+- `index.json`: Maps each video id to its first sentence, its sentence count and its upload date.
+
+The binary files are memory-mapped on first use, so a cold start does not read them, and sentences are
+decoded one at a time from zero-copy slices. The store is built from the same `TranscriptDoc` JSON that
+`go-upsert-typesense` imports, and new documents are appended to the end of the files. A re-ingested video
+points the index at its new sentences.
+
+Usage:
+    python transcript_store.py <store directory> <TranscriptDoc JSON or JSON lines file>...
+
+Classes:
+- StoredSentences: Read-only sequence of the sentences of one video, decoded on access.
+- TranscriptStore: The memory-mapped transcript store.
+
+Functions:
+- load_documents(path: str) -> list[dict]: Reads TranscriptDoc JSON, either an array or one document per line.
+
+Global Variables:
+- TRANSCRIPT_STORE: The store at settings.TRANSCRIPT_STORE_PATH, or None when no store is configured.
+
+Dependencies:
+- mmap: Maps the binary files without reading them.
+- settings.TRANSCRIPT_STORE_PATH: The directory of the store.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from array import array
+from collections.abc import Iterable, Sequence
+from json import dump, load, loads
+from mmap import mmap, ACCESS_READ
+from os import makedirs, path as os_path, replace
+from sys import argv
+from threading import Lock
+
+# File System Imports
+from settings import TRANSCRIPT_STORE_PATH
+
+SENTENCES_FILE = "sentences.bin"
+OFFSETS_FILE = "offsets.bin"
+TIMESTAMPS_FILE = "timestamps.bin"
+INDEX_FILE = "index.json"
+
+class StoredSentences(Sequence):
+    """Read-only sequence of the sentences of one video, decoded from the mapped blob on access.
+
+    Args:
+        blob (memoryview): The mapped sentence text of the whole store.
+        ends (memoryview): The mapped end offsets of every sentence of the store.
+        first (int): The index of the first sentence of the video.
+        count (int): The number of sentences of the video.
+    """
+
+    def __init__(self, blob: memoryview, ends: memoryview, first: int, count: int) -> None:
+        self._blob = blob
+        self._ends = ends
+        self._first = first
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int|slice) -> str|list[str]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("sentence index out of range")
+
+        position = self._first + index
+        start = self._ends[position - 1] if position else 0
+        return str(self._blob[start:self._ends[position]], "utf-8")
+
+class TranscriptStore:
+    """The memory-mapped transcript store.
+
+    Nothing is read from disk until the first lookup.
+
+    Args:
+        directory (str): The directory holding the store files.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._index: dict[str, list[int]]|None = None
+        self._maps: list[mmap] = []
+        self._blob = memoryview(b"")
+        self._ends = memoryview(b"").cast("q")
+        self._timestamps = memoryview(b"").cast("i")
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        self._open()
+        return len(self._index)
+
+    def __contains__(self, video_id: str) -> bool:
+        self._open()
+        return video_id in self._index
+
+    def get(self, video_id: str, upload_date: int|None = None) -> tuple[StoredSentences, memoryview]|None:
+        """Gets the sentences and timestamps of a video.
+
+        Args:
+            video_id (str): The id of the video.
+            upload_date (int|None): The upload date the caller expects, so a stale copy is never returned.
+
+        Returns:
+            tuple[StoredSentences, memoryview]|None: The sentences and timestamps of the video,
+            or None if it is not stored.
+        """
+        self._open()
+        entry = self._index.get(video_id)
+        if entry is None:
+            return None
+
+        first, count, stored_date = entry
+        if upload_date is not None and stored_date != upload_date:
+            return None
+        return StoredSentences(self._blob, self._ends, first, count), self._timestamps[first:first + count]
+
+    def append(self, documents: Iterable[dict]) -> int:
+        """Appends TranscriptDoc documents to the end of the store.
+
+        Args:
+            documents (Iterable[dict]): The documents, with `id`, `upload_date`, `transcript` and `timestamps`.
+
+        Returns:
+            int: The number of documents appended.
+        """
+        with self._lock:
+            makedirs(self.directory, exist_ok=True)
+            index = self._read_index()
+            sentence_count = os_path.getsize(self._file(OFFSETS_FILE)) // 8 if index else 0
+            blob_size = os_path.getsize(self._file(SENTENCES_FILE)) if index else 0
+
+            appended = 0
+            mode = "ab" if index else "wb"
+            with (open(self._file(SENTENCES_FILE), mode) as sentences_file,
+                  open(self._file(OFFSETS_FILE), mode) as offsets_file,
+                  open(self._file(TIMESTAMPS_FILE), mode) as timestamps_file):
+                for document in documents:
+                    transcript, timestamps = document["transcript"], document["timestamps"]
+                    if len(transcript) != len(timestamps):
+                        raise ValueError(f"Video {document['id']} has {len(transcript)} sentences "
+                                         f"but {len(timestamps)} timestamps.")
+
+                    ends = []
+                    for sentence in transcript:
+                        encoded = sentence.encode("utf-8")
+                        sentences_file.write(encoded)
+                        blob_size += len(encoded)
+                        ends.append(blob_size)
+                    offsets_file.write(array("q", ends).tobytes())
+                    timestamps_file.write(array("i", timestamps).tobytes())
+
+                    index[document["id"]] = [sentence_count, len(transcript), document["upload_date"]]
+                    sentence_count += len(transcript)
+                    appended += 1
+
+            temporary = self._file(INDEX_FILE + ".tmp")
+            with open(temporary, "w", encoding="utf-8") as index_file:
+                dump(index, index_file)
+            replace(temporary, self._file(INDEX_FILE))
+
+            self._close()
+        return appended
+
+    def close(self) -> None:
+        """Unmaps the store files. The next lookup maps them again."""
+        with self._lock:
+            self._close()
+
+    def _open(self) -> None:
+        """Maps the store files and loads the index, on first use."""
+        if self._index is not None:
+            return
+
+        with self._lock:
+            if self._index is not None:
+                return
+            index = self._read_index()
+            if index:
+                self._blob = self._map(SENTENCES_FILE)
+                self._ends = self._map(OFFSETS_FILE).cast("q")
+                self._timestamps = self._map(TIMESTAMPS_FILE).cast("i")
+            self._index = index
+
+    def _map(self, name: str) -> memoryview:
+        """Memory-maps a store file read-only.
+
+        Args:
+            name (str): The name of the file.
+
+        Returns:
+            memoryview: A zero-copy view of the file.
+        """
+        if not os_path.getsize(self._file(name)):
+            return memoryview(b"")
+        with open(self._file(name), "rb") as file:
+            mapped = mmap(file.fileno(), 0, access=ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped)
+
+    def _close(self) -> None:
+        """Drops the index and the mappings. Mappings still referenced by a lookup stay open until released."""
+        self._index = None
+        self._blob = memoryview(b"")
+        self._ends = memoryview(b"").cast("q")
+        self._timestamps = memoryview(b"").cast("i")
+        self._maps = []
+
+    def _read_index(self) -> dict[str, list[int]]:
+        """Reads the index of the store.
+
+        Returns:
+            dict[str, list[int]]: The first sentence, sentence count and upload date of each video.
+        """
+        if not os_path.exists(self._file(INDEX_FILE)):
+            return {}
+        with open(self._file(INDEX_FILE), encoding="utf-8") as index_file:
+            return load(index_file)
+
+    def _file(self, name: str) -> str:
+        return os_path.join(self.directory, name)
+
+def load_documents(path: str) -> list[dict]:
+    """Reads TranscriptDoc JSON, either an array of documents or one document per line.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        list[dict]: The documents.
+    """
+    with open(path, encoding="utf-8") as file:
+        text = file.read().strip()
+    if text.startswith("["):
+        return loads(text)
+    return [loads(line) for line in text.splitlines() if line.strip()]
+
+TRANSCRIPT_STORE: TranscriptStore|None = TranscriptStore(TRANSCRIPT_STORE_PATH) if TRANSCRIPT_STORE_PATH else None
+
+if __name__ == "__main__":
+    if len(argv) < 3:
+        raise SystemExit("Usage: python transcript_store.py <store directory> <TranscriptDoc JSON file>...")
+    store = TranscriptStore(argv[1])
+    for document_path in argv[2:]:
+        print(f"Appended {store.append(load_documents(document_path))} documents from {document_path}")
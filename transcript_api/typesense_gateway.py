@@ -0,0 +1,363 @@
+"""
+This module manages access to the Typesense cluster for the transcript api.
+
+Every node gets its own client, tried nearest first, all sharing one pooled keep-alive HTTP session.
+A request still waiting on its node past the p95 latency of recent requests is hedged with a duplicate
+sent to the next node, and whichever answers first is used. Failed attempts move on to the next node, or
+back to a node already tried once every node has been, limited by a retry budget shared by every Typesense
+call of the same user request. A node failing repeatedly is skipped by its circuit breaker until it has had
+time to recover.
+
+Classes:
+- TypesenseUnavailable: Raised when no node can serve a request within the retry budget.
+- TypesenseConfigError: Raised when the gateway is built without any node.
+- RetryBudget: The retries and hedges left to a user request.
+- CircuitBreaker: Skips a node after consecutive failures, then lets a single trial request through.
+- LatencyTracker: Rolling window of request latencies, giving the delay before hedging.
+- TypesenseGateway: The managed access layer used in place of a single `typesense.Client`.
+
+Functions:
+- new_retry_budget(retries: int) -> RetryBudget: Starts the retry budget of a user request.
+- node_config(node: str) -> dict[str, str|int]: Parses a node from `host`, `host:port` or a URL.
+
+Dependencies:
+- typesense: The client used for each node
+- requests.adapters.HTTPAdapter: The connection pool shared by every node
+- settings: The nodes, timeouts, pool size, retry budget, hedging and circuit breaker settings
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from threading import Lock
+from time import monotonic, perf_counter
+from urllib.parse import urlsplit
+
+# Third-Party Imports
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError, ReadTimeout, Timeout
+from typesense import Client, api_call
+from typesense.exceptions import HTTPStatus0Error, ServerError, ServiceUnavailable
+
+# File System Imports
+from helpers import debug
+from settings import (TYPESENSE_API_KEY, TYPESENSE_NODES, TYPESENSE_NEAREST_NODE, TYPESENSE_CONNECTION_TIMEOUT_SECONDS,
+                      TYPESENSE_POOL_SIZE, TYPESENSE_RETRY_BUDGET, TYPESENSE_HEDGE_PERCENTILE,
+                      TYPESENSE_HEDGE_MIN_DELAY_SECONDS, TYPESENSE_BREAKER_FAILURES, TYPESENSE_BREAKER_RESET_SECONDS)
+
+RETRYABLE_ERRORS = (Timeout, RequestsConnectionError, HTTPStatus0Error, ServerError, ServiceUnavailable)
+
+class TypesenseUnavailable(ReadTimeout):
+    """Raised when no node can serve a request within the retry budget.
+
+    It is a `ReadTimeout`, so it reaches the user as the same 408 a timed out search always has.
+    """
+
+class TypesenseConfigError(RuntimeError):
+    """Raised when the gateway is built without any node.
+
+    It is not a `ValueError`, so a deployment error reaches the user as a 500 rather than a 400.
+    """
+
+class RetryBudget:
+    """The retries and hedges left to a user request.
+
+    Args:
+        retries (int): The number of extra attempts the request may make.
+    """
+
+    def __init__(self, retries: int) -> None:
+        self.remaining = retries
+        self._lock = Lock()
+
+    def spend(self) -> bool:
+        """Takes one attempt from the budget.
+
+        Returns:
+            bool: True if the budget allowed the attempt.
+        """
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    def refund(self) -> None:
+        """Gives back an attempt that was never sent."""
+        with self._lock:
+            self.remaining += 1
+
+_CURRENT_BUDGET: ContextVar[RetryBudget|None] = ContextVar("retry_budget", default=None)
+
+def new_retry_budget(retries: int = TYPESENSE_RETRY_BUDGET) -> RetryBudget:
+    """Starts the retry budget of a user request, shared by every Typesense call it makes.
+
+    Args:
+        retries (int): The number of extra attempts the request may make.
+
+    Returns:
+        RetryBudget: The budget, now current.
+    """
+    budget = RetryBudget(retries)
+    _CURRENT_BUDGET.set(budget)
+    return budget
+
+class CircuitBreaker:
+    """Skips a node after consecutive failures, then lets a single trial request through once it may have recovered.
+
+    Args:
+        failures (int): The number of consecutive failures that open the breaker.
+        reset_seconds (float): The number of seconds the breaker stays open before a trial request.
+    """
+
+    def __init__(self, failures: int, reset_seconds: float) -> None:
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: float|None = None
+        self._trial = False
+        self._lock = Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Checks whether a request may be sent to the node.
+
+        Returns:
+            bool: True if the breaker is closed, or open long enough to let a trial request through.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._trial and monotonic() - self.opened_at >= self.reset_seconds:
+                self._trial = True
+                return True
+            return False
+
+    def success(self) -> None:
+        """Closes the breaker after a successful request."""
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        """Counts a failed request, opening the breaker once there are too many in a row."""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self._trial or self.consecutive_failures >= self.failures:
+                self.opened_at = monotonic()
+            self._trial = False
+
+class LatencyTracker:
+    """Rolling window of request latencies, giving the delay before a request is hedged.
+
+    Args:
+        percentile (float): The percentile of recent latencies to wait before hedging.
+        min_delay (float): The shortest delay, also used until enough latencies are known.
+        window (int): The number of recent latencies kept.
+    """
+
+    def __init__(self, percentile: float, min_delay: float, window: int = 256) -> None:
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = Lock()
+
+    def observe(self, seconds: float) -> None:
+        """Records the latency of a successful request."""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self) -> float:
+        """Gets the delay before a request is hedged.
+
+        Returns:
+            float: The configured percentile of recent latencies, at least the minimum delay.
+        """
+        with self._lock:
+            if len(self._latencies) < 20:
+                return self.min_delay
+            ordered = sorted(self._latencies)
+        return max(self.min_delay, ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))])
+
+def node_config(node: str) -> dict[str, str|int]:
+    """Parses a node from `host`, `host:port` or a URL such as `http://localhost:8108`.
+
+    Args:
+        node (str): The node.
+
+    Returns:
+        dict[str, str|int]: The host, port and protocol of the node, defaulting to HTTPS on port 443.
+    """
+    parts = urlsplit(node if "://" in node else f"https://{node}")
+    return {"host": parts.hostname, "port": parts.port or (443 if parts.scheme == "https" else 80), "protocol": parts.scheme}
+
+class TypesenseGateway:
+    """The managed access layer used in place of a single `typesense.Client`.
+
+    Args:
+        nodes (list[str]): The nodes of the cluster.
+        api_key (str|None): The Typesense API key.
+        nearest_node (str|None): The node tried first, usually the one in the same region.
+        timeout (float): The connection and read timeout of a single attempt, in seconds.
+        client_factory (Callable[[dict], Client]): Builds the client of a node from its configuration.
+    """
+
+    def __init__(self, nodes: list[str], api_key: str|None, nearest_node: str|None = None,
+                 timeout: float = TYPESENSE_CONNECTION_TIMEOUT_SECONDS,
+                 client_factory: Callable[[dict], Client] = Client) -> None:
+        ordered = ([nearest_node] if nearest_node else []) + [node for node in nodes if node != nearest_node]
+        if not ordered:
+            raise TypesenseConfigError("At least one Typesense node is required, set TYPESENSE_NODES or TYPESENSE_HOST.")
+
+        self.nodes = ordered
+        self.clients = [client_factory({
+            "nodes": [node_config(node)],
+            "api_key": api_key,
+            "connection_timeout_seconds": timeout,
+            "num_retries": 0,  # Retries are made here, on the next node or the same one
+        }) for node in ordered]
+        self.breakers = [CircuitBreaker(TYPESENSE_BREAKER_FAILURES, TYPESENSE_BREAKER_RESET_SECONDS) for _ in ordered]
+        self.latency = LatencyTracker(TYPESENSE_HEDGE_PERCENTILE, TYPESENSE_HEDGE_MIN_DELAY_SECONDS)
+        self.hedges = 0
+        self.retries = 0
+        self._counter_lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2 * TYPESENSE_POOL_SIZE, thread_name_prefix="typesense-node")
+
+    def search(self, query_params: dict[str, object], collection: str = "transcripts") -> dict:
+        """Searches a collection.
+
+        Args:
+            query_params (dict[str, object]): The search parameters.
+            collection (str): The collection to search.
+
+        Returns:
+            dict: The Typesense response.
+        """
+        return self._call(lambda client: client.collections[collection].documents.search(query_params))
+
+    def multi_search(self, search_requests: dict[str, list[dict]], common_params: dict[str, object]) -> dict:
+        """Sends several searches in one request.
+
+        Args:
+            search_requests (dict[str, list[dict]]): The searches, under `searches`.
+            common_params (dict[str, object]): The parameters shared by every search.
+
+        Returns:
+            dict: The Typesense response, with the result of each search under `results`.
+        """
+        return self._call(lambda client: client.multi_search.perform(search_requests, common_params))
+
+    def is_healthy(self) -> bool:
+        """Checks the health of the first node, opening a pooled connection to it.
+
+        Returns:
+            bool: True if the node reports it is healthy.
+        """
+        return self._call(lambda client: client.operations.is_healthy())
+
+    def stats(self) -> dict[str, object]:
+        """Gets the counters of the gateway.
+
+        Returns:
+            dict[str, object]: The hedges and retries sent, the hedge delay and the nodes with an open breaker.
+        """
+        with self._counter_lock:
+            hedges, retries = self.hedges, self.retries
+        return {
+            "hedges": hedges,
+            "retries": retries,
+            "hedge_delay": self.latency.hedge_delay(),
+            "open_nodes": [node for node, breaker in zip(self.nodes, self.breakers) if breaker.is_open],
+        }
+
+    def _attempt(self, index: int, operation: Callable[[Client], object]) -> object:
+        """Sends a request to one node, updating its breaker and the latency window.
+
+        Args:
+            index (int): The index of the node.
+            operation (Callable[[Client], object]): The request, given the client of the node.
+
+        Returns:
+            object: The response of the node.
+        """
+        start = perf_counter()
+        try:
+            result = operation(self.clients[index])
+        except RETRYABLE_ERRORS:
+            self.breakers[index].failure()
+            raise
+        self.breakers[index].success()
+        self.latency.observe(perf_counter() - start)
+        return result
+
+    def _call(self, operation: Callable[[Client], object]) -> object:
+        """Sends a request, hedging slow attempts and retrying failed ones on the next node.
+
+        Retries and hedges go to the nodes tried the fewest times, so with a single node they go back to it,
+        as long as the retry budget lasts and its breaker lets them through.
+
+        Args:
+            operation (Callable[[Client], object]): The request, given the client of a node.
+
+        Returns:
+            object: The first successful response.
+        """
+        budget = _CURRENT_BUDGET.get() or RetryBudget(TYPESENSE_RETRY_BUDGET)
+        attempts = [0] * len(self.nodes)
+        pending: dict[Future, int] = {}
+        last_error: Exception|None = None
+
+        def launch(spend: bool = False) -> bool:
+            """Sends an attempt to the allowed node idle and tried the fewest times, nearest first."""
+            if spend and not budget.spend():
+                return False
+            busy = set(pending.values())
+            for index in sorted(range(len(self.nodes)), key=lambda index: (index in busy, attempts[index], index)):
+                if self.breakers[index].allow():
+                    attempts[index] += 1
+                    pending[self._executor.submit(self._attempt, index, operation)] = index
+                    return True
+            if spend:
+                budget.refund()
+            return False
+
+        if not launch():
+            raise TypesenseUnavailable("Every Typesense node is unavailable, please try again.")
+
+        while pending:
+            timeout = self.latency.hedge_delay() if len(pending) == 1 else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done: # The only attempt is slower than usual, so race it against the next node
+                if launch(spend=True):
+                    with self._counter_lock:
+                        self.hedges += 1
+                    debug(f"Hedging Typesense request to {self.nodes[pending[list(pending)[-1]]]}")
+                else:
+                    wait(pending, return_when=FIRST_COMPLETED)
+                continue
+
+            for future in done:
+                pending.pop(future)
+                try:
+                    return future.result()
+                except RETRYABLE_ERRORS as e:
+                    last_error = e
+
+            if not pending and launch(spend=True):
+                with self._counter_lock:
+                    self.retries += 1
+
+        raise TypesenseUnavailable(f"Typesense request failed: {last_error}") from last_error
+
+# Keep connections to every node alive in one pool, sized for the concurrent playlist shards and hedges
+api_call.session.mount("https://", HTTPAdapter(pool_connections=len(TYPESENSE_NODES) or 1, pool_maxsize=TYPESENSE_POOL_SIZE))
+api_call.session.mount("http://", HTTPAdapter(pool_connections=len(TYPESENSE_NODES) or 1, pool_maxsize=TYPESENSE_POOL_SIZE))
@@ -0,0 +1,184 @@
+"""
+This module classifies YouTube URLs and extracts their identifiers in a single pass.
+
+A URL is split with `urllib.parse`, and the first segment of its path picks the parser for the rest, so
+each URL is read once rather than scanned by one regex per URL type. Video ids are read straight from the
+URL, so a video needs no YT-DLP request. Every URL of a type is rewritten to the same canonical form,
+so duplicates can be found by comparing canonical URLs.
+
+Classes:
+- URLType: Enum for URL types (VIDEO, PLAYLIST, CHANNEL).
+- ParsedURL: The type, identifier and canonical form of a URL.
+
+Functions:
+- parse_url(url: str) -> ParsedURL: Classifies a URL and extracts its identifier.
+- parse_urls(urls: Iterable[str]) -> list[ParsedURL|ValueError]: Classifies many URLs, keeping an error
+  for each invalid one.
+
+Dependencies:
+- urllib.parse: Splits the URLs and their query strings.
+"""
+
+from __future__ import annotations
+
+# Standard Library Imports
+from collections.abc import Callable, Iterable
+from enum import Enum
+from re import compile
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+VIDEO_ID = compile(r"[\w\-]{11}")
+PLAYLIST_ID = compile(r"[\w\-]+")
+CHANNEL_ID = compile(r"[\w\-]+")
+CHANNEL_NAME = compile(r"[\w\-\.]+")
+HANDLE = compile(r"@[\w\-\.]{3,30}")
+
+YOUTUBE_HOSTS = frozenset({"youtube.com", "www.youtube.com", "m.youtube.com"})
+SHORT_HOSTS = frozenset({"youtu.be", "www.youtu.be"})
+CHANNEL_TABS = frozenset({"videos", "featured"})
+RESERVED_PATHS = frozenset({"results", "feed", "hashtag", "account", "premium", "signin", "logout"})
+
+class URLType(Enum):
+    """Enum for URL types."""
+    VIDEO = 1
+    PLAYLIST = 2
+    CHANNEL = 3
+
+class ParsedURL(NamedTuple):
+    """The type, identifier and canonical form of a URL.
+
+    Attributes:
+        url_type (URLType): The type of the URL.
+        identifier (str): The video id, the playlist id, or the channel path
+            (`channel/<id>`, `@<handle>`, `c/<name>`, `user/<name>` or a bare `<name>`).
+        url (str): The canonical URL.
+    """
+    url_type: URLType
+    identifier: str
+    url: str
+
+def _video(video_id: str) -> ParsedURL|None:
+    """Builds a video URL, or None if the video id is malformed."""
+    if not VIDEO_ID.fullmatch(video_id):
+        return None
+    return ParsedURL(URLType.VIDEO, video_id, f"https://www.youtube.com/watch?v={video_id}")
+
+def _playlist(playlist_id: str) -> ParsedURL|None:
+    """Builds a playlist URL, or None if the playlist id is malformed."""
+    if not PLAYLIST_ID.fullmatch(playlist_id):
+        return None
+    return ParsedURL(URLType.PLAYLIST, playlist_id, f"https://www.youtube.com/playlist?list={playlist_id}")
+
+def _channel(path: str, rest: list[str]) -> ParsedURL|None:
+    """Builds the URL of a channel's videos, or None if the path goes on past the channel tab."""
+    if rest and (len(rest) > 1 or rest[0] not in CHANNEL_TABS):
+        return None
+    return ParsedURL(URLType.CHANNEL, path, f"https://www.youtube.com/{path}/videos")
+
+def _first(query: dict[str, list[str]], name: str) -> str|None:
+    """Gets the first value of a query string parameter."""
+    values = query.get(name)
+    return values[0] if values else None
+
+def _parse_watch(segments: list[str], query: dict[str, list[str]]) -> ParsedURL|None:
+    """Parses `/watch?v=<id>`, or `/watch?list=<id>` without a video."""
+    if _first(query, "v"):
+        return _video(_first(query, "v"))
+    return _playlist(_first(query, "list")) if _first(query, "list") else None
+
+def _parse_path_video(segments: list[str], query: dict[str, list[str]]) -> ParsedURL|None:
+    """Parses video URLs with the id in the path, such as `/embed/<id>` and `/shorts/<id>`."""
+    return _video(segments[1]) if len(segments) == 2 else None
+
+def _parse_playlist(segments: list[str], query: dict[str, list[str]]) -> ParsedURL|None:
+    """Parses `/playlist?list=<id>`."""
+    return _playlist(_first(query, "list")) if len(segments) == 1 and _first(query, "list") else None
+
+def _parse_channel_id(segments: list[str], query: dict[str, list[str]]) -> ParsedURL|None:
+    """Parses `/channel/<id>`."""
+    if len(segments) < 2 or not CHANNEL_ID.fullmatch(segments[1]):
+        return None
+    return _channel(f"channel/{segments[1]}", segments[2:])
+
+def _parse_custom_name(segments: list[str], query: dict[str, list[str]]) -> ParsedURL|None:
+    """Parses `/c/<name>` and `/user/<name>`."""
+    if len(segments) < 2 or not CHANNEL_NAME.fullmatch(segments[1]):
+        return None
+    return _channel(f"{segments[0]}/{segments[1]}", segments[2:])
+
+# The parser of a youtube.com URL, by the first segment of its path
+PATH_PARSERS: dict[str, Callable[[list[str], dict[str, list[str]]], ParsedURL|None]] = {
+    "watch": _parse_watch,
+    "embed": _parse_path_video,
+    "v": _parse_path_video,
+    "shorts": _parse_path_video,
+    "live": _parse_path_video,
+    "playlist": _parse_playlist,
+    "channel": _parse_channel_id,
+    "c": _parse_custom_name,
+    "user": _parse_custom_name,
+}
+
+def parse_url(url: str) -> ParsedURL:
+    """Classifies a URL and extracts its identifier.
+
+    Args:
+        url (str): The URL, with or without its scheme.
+
+    Returns:
+        ParsedURL: The type, identifier and canonical form of the URL.
+
+    Raises:
+        ValueError: If the URL is not a YouTube video, playlist or channel URL.
+    """
+    stripped = url.strip()
+    if stripped.startswith("//"):
+        stripped = f"https:{stripped}"
+    elif "://" not in stripped:
+        stripped = f"https://{stripped}"
+
+    try:
+        parts = urlsplit(stripped)
+        host = parts.hostname
+    except ValueError:
+        host = None
+    if host is None or parts.scheme not in ("http", "https"):
+        raise ValueError(f"Invalid URL: {url}")
+
+    segments = [segment for segment in parts.path.split("/") if segment]
+    parsed = None
+    if host in SHORT_HOSTS:
+        parsed = _video(segments[0]) if len(segments) == 1 else None
+    elif host in YOUTUBE_HOSTS and segments:
+        parser = PATH_PARSERS.get(segments[0])
+        if parser is not None:
+            parsed = parser(segments, parse_qs(parts.query))
+        elif HANDLE.fullmatch(segments[0]):
+            parsed = _channel(segments[0].lower(), segments[1:])
+        elif _first(parse_qs(parts.query), "list"): # Any other page of a playlist, such as its first video
+            parsed = _playlist(_first(parse_qs(parts.query), "list"))
+        elif CHANNEL_NAME.fullmatch(segments[0]) and segments[0] not in RESERVED_PATHS:
+            # A bare name may be a custom URL, a legacy username or a vanity URL, so it is kept as it is
+            parsed = _channel(segments[0], segments[1:])
+
+    if parsed is None:
+        raise ValueError(f"Invalid URL: {url}")
+    return parsed
+
+def parse_urls(urls: Iterable[str]) -> list[ParsedURL|ValueError]:
+    """Classifies many URLs, such as a list pasted for ingest.
+
+    Args:
+        urls (Iterable[str]): The URLs.
+
+    Returns:
+        list[ParsedURL|ValueError]: The parsed form of each URL, or the error explaining why it is invalid.
+    """
+    parsed: list[ParsedURL|ValueError] = []
+    for url in urls:
+        try:
+            parsed.append(parse_url(url))
+        except ValueError as e:
+            parsed.append(e)
+    return parsed